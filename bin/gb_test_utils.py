@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+#helpers shared by the test scripts
+import os
+import shutil
+import sys
+import tempfile
+
+#types registered when parsing the test headers
+std_types = ['std::map','std::set','std::size_t','std::string','std::vector']
+
+def describe(value):
+  '''Returns value with tokens replaced by tuples of their class and
+  attributes, so token trees can be compared with =='''
+  if isinstance(value, (list, tuple)):
+    return tuple([describe(item) for item in value])
+  if not hasattr(value, 'token_type'):
+    return value
+  attributes = dict(getattr(value, '__dict__', dict()))
+  for token_class in type(value).__mro__:
+    for slot in getattr(token_class, '__slots__', ()):
+      if hasattr(value, slot):
+        attributes[slot] = getattr(value, slot)
+  return (type(value).__name__, tuple(sorted([(name, describe(attribute))
+      for (name, attribute) in attributes.items()])))
+
+class TempDirectory:
+  '''Temporary directory removed on exit, with headers written into it'''
+
+  def __enter__(self):
+    self.path = tempfile.mkdtemp(prefix='gb_test_')
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    shutil.rmtree(self.path)
+
+  def write(self, name, text):
+    '''Writes text to file name in the directory and returns its path'''
+    filename = os.path.join(self.path, name)
+    with open(filename, 'w') as output_file:
+      output_file.write(text)
+    return filename
+
+def run_tests(module_globals):
+  '''Runs the test_ functions of a test script in order, returns exit code'''
+  failures = 0
+  for name in sorted(module_globals):
+    if name.startswith('test_') and callable(module_globals[name]):
+      try:
+        module_globals[name]()
+        print('passed '+name)
+      except Exception as exc:
+        failures += 1
+        print('FAILED '+name+': '+repr(exc))
+  return failures
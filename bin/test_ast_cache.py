@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#tests that the binary AST cache returns the parsed tree and rebuilds bad
+#entries
+from gb_test_utils import *
+import gb_ast_cache
+import gb_cpp_parser
+import gb_lexer
+import os
+
+#constants
+header = '''#include <string>
+namespace ns {
+  class Hist {
+  public:
+    Hist(int nbins, double low = 0.5);
+    std::string Name() const;
+  };
+  enum class Kind { one, two };
+}
+int free_function(int a, const char * b);
+'''
+
+def parse_plain(filename):
+  '''Returns tree of filename parsed without the cache'''
+  parser = gb_cpp_parser.CppParser(gb_lexer.tokenize_file_cpp(filename),
+      True)
+  parser.add_types(std_types)
+  return parser.evaluate()
+
+def test_cache_hit():
+  with TempDirectory() as directory:
+    filename = directory.write('header.hpp', header)
+    ast_cache = gb_ast_cache.AstCache(os.path.join(directory.path, 'cache'))
+    with ast_cache.parse_file(filename, std_types, True) as cached_ast:
+      assert describe(cached_ast.get_global()) == describe(
+          parse_plain(filename))
+    cache_filename = ast_cache.get_cache_filename(filename)
+    mtime = os.stat(cache_filename).st_mtime_ns
+    with ast_cache.parse_file(filename, std_types, True) as cached_ast:
+      assert sorted(cached_ast.names()) == ['free_function','ns','ns::Hist',
+          'ns::Kind']
+      assert describe(cached_ast.get('ns::Hist')) == describe(
+          parse_plain(filename).members[0].members[0])
+    assert os.stat(cache_filename).st_mtime_ns == mtime
+
+def test_corrupted_entry_rebuilt():
+  with TempDirectory() as directory:
+    filename = directory.write('header.hpp', header)
+    ast_cache = gb_ast_cache.AstCache(os.path.join(directory.path, 'cache'))
+    ast_cache.parse_file(filename, std_types, True).close()
+    cache_filename = ast_cache.get_cache_filename(filename)
+    with open(cache_filename, 'rb') as cache_file:
+      data = bytearray(cache_file.read())
+    #flip a byte in each section, the header stays valid
+    (strings_offset, index_offset, nodes_offset) = (
+        gb_ast_cache.header_fields_struct.unpack_from(data, 0)[7:10])
+    for position in (strings_offset+4, index_offset+1, len(data)-2):
+      corrupted = bytearray(data)
+      corrupted[position] ^= 0xff
+      with open(cache_filename, 'wb') as cache_file:
+        cache_file.write(corrupted)
+      with ast_cache.parse_file(filename, std_types, True) as cached_ast:
+        assert 'ns::Hist' in cached_ast.names()
+        assert describe(cached_ast.get_global()) == describe(
+            parse_plain(filename))
+      #the entry was replaced
+      with gb_ast_cache.CachedAst(cache_filename) as cached_ast:
+        cached_ast.verify()
+
+def test_stale_entry_rebuilt():
+  with TempDirectory() as directory:
+    filename = directory.write('header.hpp', header)
+    ast_cache = gb_ast_cache.AstCache(os.path.join(directory.path, 'cache'))
+    ast_cache.parse_file(filename, std_types, True).close()
+    directory.write('header.hpp', header.replace('int a,', 'long a,'))
+    with ast_cache.parse_file(filename, std_types, True) as cached_ast:
+      assert describe(cached_ast.get_global()) == describe(
+          parse_plain(filename))
+
+def test_partial_parse_not_cached():
+  with TempDirectory() as directory:
+    filename = directory.write('header.hpp', header+'int x(;\n')
+    ast_cache = gb_ast_cache.AstCache(os.path.join(directory.path, 'cache'))
+    with ast_cache.parse_file(filename, std_types, True) as cached_ast:
+      assert describe(cached_ast.get_global()) == describe(
+          parse_plain(filename))
+    assert not os.path.exists(ast_cache.get_cache_filename(filename))
+
+if __name__ == '__main__':
+  sys.exit(run_tests(globals()))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+#tests the wrappers written by generate_bindings for small headers
+from gb_test_utils import *
+import gb_binding_ir
+import gb_parallel
+import gb_reachability
+import gb_symbol_index
+import generate_bindings
+import os
+import shutil
+import subprocess
+
+#constants
+header = '''#include <string>
+#include <vector>
+namespace ns {
+  class Axis {
+  public:
+    Axis(int nbins);
+    Axis(int nbins, double low, double high = 1.0);
+    Axis & operator=(const Axis &other);
+    int Nbins() const;
+    double Low(int bin) const;
+    double Low(double x) const;
+    std::string Title() const;
+    std::vector<double> Edges() const;
+    void SetTitle(const std::string &title);
+  };
+  class Hist {
+  public:
+    Hist(const Axis &axis);
+    Axis GetAxis() const;
+  };
+  class Unused {
+  public:
+    int Get() const;
+  };
+  double integral(const Hist &hist, int first = 0);
+}
+'''
+extra_class = '''namespace ns {
+  class Extra {
+  public:
+    int Get() const;
+  };
+}
+'''
+
+def parse_header(directory, text):
+  '''Returns tree of header text written to directory'''
+  return gb_parallel.parse_files([directory.write('header.hpp', text)], 1,
+      generate_bindings.std_types+generate_bindings.drawpico_types)
+
+def read_files(filenames):
+  '''Returns list of the contents of filenames'''
+  contents = []
+  for filename in filenames:
+    with open(filename) as input_file:
+      contents.append(input_file.read())
+  return contents
+
+def get_entries(binding_module, scope):
+  '''Returns dict of C name to entry for the entries of class scope'''
+  return dict([(entry.c_name, entry) for entry in binding_module.entries
+      if entry.scope == scope])
+
+def test_python_compiles():
+  with TempDirectory() as directory:
+    tree = parse_header(directory, header)
+    py_filename = os.path.join(directory.path, 'bindings.py')
+    generate_bindings.write_binding_files(tree, os.path.join(directory.path,
+        'bindings.cxx'), py_filename)
+    compile(read_files([py_filename])[0], py_filename, 'exec')
+
+def test_cpp_compiles():
+  if (shutil.which('g++') == None):
+    print('skipping test_cpp_compiles, g++ not found')
+    return
+  with TempDirectory() as directory:
+    tree = parse_header(directory, header)
+    #stand-ins for the headers included by the wrappers
+    os.mkdir(os.path.join(directory.path, 'core'))
+    directory.write('TError.h', 'extern int gErrorIgnoreLevel;\n')
+    directory.write('core/axis.hpp', '#include "../header.hpp"\n')
+    directory.write('core/named_func.hpp', '')
+    cpp_filename = os.path.join(directory.path, 'bindings.cxx')
+    generate_bindings.write_binding_files(tree, cpp_filename,
+        os.path.join(directory.path, 'bindings.py'))
+    assert subprocess.run(['g++','-std=c++17','-fsyntax-only',
+        '-I'+directory.path, cpp_filename]).returncode == 0
+
+def test_overloads():
+  with TempDirectory() as directory:
+    tree = parse_header(directory, header)
+  (binding_module, statistics) = generate_bindings.lower_bindings(tree,
+      gb_symbol_index.SymbolIndex(tree))
+  entries = get_entries(binding_module, 'ns::Axis')
+  #operator= is not wrapped, the pointer constructor comes first
+  assert sorted(entries) == ['nsAxisEdges','nsAxisLow','nsAxisLow2',
+      'nsAxisNbins','nsAxisSetTitle','nsAxisTitle','nsAxis__init__',
+      'nsAxis__init__2','nsAxis__init__3']
+  assert ([entries[c_name].overload_index for c_name in ('nsAxis__init__',
+      'nsAxis__init__2','nsAxis__init__3','nsAxisNbins','nsAxisLow',
+      'nsAxisLow2')] == [0, 2, 3, 0, 1, 2])
+  assert entries['nsAxis__init__3'].args[2].default == '1.0'
+  assert entries['nsAxisEdges'].result.marshal == 'vector'
+  assert binding_module.vector_types == [('double','double')]
+  hist_entries = get_entries(binding_module, 'ns::Hist')
+  assert hist_entries['nsHistGetAxis'].result.cpp_type == 'ns::Axis'
+  assert ([arg.default for arg
+      in get_entries(binding_module, 'ns')['nsintegral'].args]
+      == [None, '0'])
+
+def test_ir_round_trip():
+  with TempDirectory() as directory:
+    tree = parse_header(directory, header)
+    (binding_module, statistics) = generate_bindings.lower_bindings(tree,
+        gb_symbol_index.SymbolIndex(tree))
+    serialized = gb_binding_ir.dumps(binding_module)
+    assert gb_binding_ir.dumps(gb_binding_ir.loads(serialized)) == serialized
+    ir_filename = os.path.join(directory.path, 'bindings.json')
+    assert gb_binding_ir.save(binding_module, ir_filename)
+    assert not gb_binding_ir.save(binding_module, ir_filename)
+    assert read_files([ir_filename]) == [serialized+'\n']
+
+def test_shards_deterministic():
+  with TempDirectory() as directory:
+    cpp_filename = os.path.join(directory.path, 'bindings.cxx')
+    py_filename = os.path.join(directory.path, 'bindings.py')
+    cpp_filenames = generate_bindings.get_cpp_filenames(cpp_filename, 4)
+    for shard_by in ('class','size'):
+      outputs = []
+      for run_idx in range(2):
+        generate_bindings.write_binding_files(parse_header(directory,
+            header), cpp_filename, py_filename, 4, shard_by)
+        outputs.append(read_files(cpp_filenames+[py_filename]))
+      assert outputs[0] == outputs[1]
+
+def test_shard_by_class_stable():
+  with TempDirectory() as directory:
+    cpp_filename = os.path.join(directory.path, 'bindings.cxx')
+    py_filename = os.path.join(directory.path, 'bindings.py')
+    cpp_filenames = generate_bindings.get_cpp_filenames(cpp_filename, 4)
+    shards = []
+    for text in (header, header+extra_class):
+      generate_bindings.write_binding_files(parse_header(directory, text),
+          cpp_filename, py_filename, 4, 'class')
+      contents = read_files(cpp_filenames)
+      #shard of each class of the first header
+      shards.append([[shard_idx for shard_idx in range(len(contents))
+          if c_name+'(' in contents[shard_idx]] for c_name
+          in ('nsAxisNbins','nsHistGetAxis','nsUnusedGet')])
+    assert shards[0] == shards[1]
+    assert all([len(shard_idxs) == 1 for shard_idxs in shards[0]])
+
+def test_shake():
+  with TempDirectory() as directory:
+    tree = parse_header(directory, header)
+  symbol_index = gb_symbol_index.SymbolIndex(tree)
+  (binding_module, statistics) = generate_bindings.lower_bindings(tree,
+      symbol_index)
+  (shaken_module, report) = gb_reachability.shake_bindings(
+      binding_module, ['Hist'], symbol_index)
+  assert report.kept_classes == ['ns::Axis','ns::Hist']
+  assert report.pruned_classes == ['ns::Unused']
+  assert report.pruned_functions == ['nsintegral']
+  assert ([entry.c_name for entry in shaken_module.entries]
+      == [entry.c_name for entry in binding_module.entries
+      if entry.scope in ('ns::Axis','ns::Hist')])
+
+if __name__ == '__main__':
+  sys.exit(run_tests(globals()))
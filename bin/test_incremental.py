@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#tests incremental reparsing against parsing the edited header whole
+from gb_test_utils import *
+import gb_cpp_parser
+import gb_incremental
+import gb_lexer
+import gb_type_scanner
+
+#constants
+header = '''namespace ns {
+  class Hist {
+  public:
+    Hist(int nbins);
+    int Nbins() const;
+    double Low() const;
+  private:
+    int nbins_;
+  };
+  void fill(Hist &hist, double value);
+}
+int free_function(int a);
+'''
+
+def parse_text(text):
+  '''Returns (tokens, tree) of header text'''
+  with TempDirectory() as directory:
+    tokens = gb_lexer.tokenize_file_cpp(directory.write('header.hpp', text))
+  parser = gb_cpp_parser.CppParser(tokens)
+  parser.add_types(std_types+gb_type_scanner.scan_types(tokens))
+  return (tokens, parser.evaluate())
+
+def check_edit(old_text, new_text):
+  '''Returns changed names of reparsing the edit from old_text to new_text,
+  checking the tree against a full parse and that the old tree is kept'''
+  (old_tokens, old_ast) = parse_text(old_text)
+  old_description = describe(old_ast)
+  (new_tokens, new_ast) = parse_text(new_text)
+  (reparsed_ast, changed) = gb_incremental.reparse(old_ast, old_tokens,
+      new_tokens, std_types)
+  assert describe(reparsed_ast) == describe(new_ast)
+  assert describe(old_ast) == old_description
+  return changed
+
+def test_no_edit():
+  (tokens, ast) = parse_text(header)
+  assert gb_incremental.reparse(ast, tokens, list(tokens), std_types) == (
+      ast, [])
+
+def test_member_edit():
+  assert check_edit(header, header.replace('int Nbins() const;',
+      'int Nbins(int axis) const;')) == ['ns::Hist::Nbins']
+
+def test_member_added():
+  assert check_edit(header, header.replace('double Low() const;',
+      'double Low() const;\n    double High() const;')) == [
+      'ns::Hist::High']
+
+def test_free_function_edit():
+  assert check_edit(header, header.replace('int free_function(int a);',
+      'long free_function(int a);')) == ['free_function']
+
+def test_type_declared():
+  changed = check_edit(header, header.replace('int free_function',
+      'class Axis {};\nint free_function'))
+  assert 'Axis' in changed
+
+if __name__ == '__main__':
+  sys.exit(run_tests(globals()))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#tests that generated files are only replaced when their contents change
+from gb_test_utils import *
+import gb_output
+import os
+
+def write_output(filename, text, manifest=None):
+  '''Writes text to filename through an OutputFile, returns true if it was
+  replaced'''
+  output_file = gb_output.OutputFile(filename, manifest)
+  output_file.write(text)
+  return output_file.close()
+
+def test_unchanged_untouched():
+  with TempDirectory() as directory:
+    filename = os.path.join(directory.path, 'wrapper.py')
+    assert write_output(filename, 'a = 1\n')
+    mtime = os.stat(filename).st_mtime_ns
+    assert not write_output(filename, 'a = 1\n')
+    assert os.stat(filename).st_mtime_ns == mtime
+    assert write_output(filename, 'a = 2\n')
+    with open(filename) as output_file:
+      assert output_file.read() == 'a = 2\n'
+    assert os.listdir(directory.path) == ['wrapper.py']
+
+def test_manifest():
+  with TempDirectory() as directory:
+    filename = os.path.join(directory.path, 'wrapper.py')
+    manifest_filename = os.path.join(directory.path, 'manifest.json')
+    manifest = gb_output.Manifest(manifest_filename)
+    assert write_output(filename, 'a = 1\n', manifest)
+    manifest.save()
+    manifest = gb_output.Manifest(manifest_filename)
+    assert (manifest.get_digest(filename)
+        == gb_output.get_file_digest(filename))
+    mtime = os.stat(filename).st_mtime_ns
+    assert not write_output(filename, 'a = 1\n', manifest)
+    assert os.stat(filename).st_mtime_ns == mtime
+    #an output edited outside the generator is rewritten
+    directory.write('wrapper.py', 'a = 3\n')
+    assert write_output(filename, 'a = 1\n', manifest)
+
+def test_discard():
+  with TempDirectory() as directory:
+    filename = directory.write('wrapper.py', 'a = 1\n')
+    output_file = gb_output.OutputFile(filename)
+    output_file.write('a = 2\n')
+    output_file.discard()
+    assert not output_file.close()
+    with open(filename) as output_file:
+      assert output_file.read() == 'a = 1\n'
+    assert os.listdir(directory.path) == ['wrapper.py']
+
+def test_depfile():
+  with TempDirectory() as directory:
+    filename = os.path.join(directory.path, 'wrapper.py.d')
+    assert gb_output.write_depfile(filename, 'wrapper.py',
+        ['my header.hpp'], phony_targets=True)
+    with open(filename) as depfile:
+      assert depfile.read() == (
+          'wrapper.py: \\\n  my\\ header.hpp\n\nmy\\ header.hpp:\n')
+    assert not gb_output.write_depfile(filename, 'wrapper.py',
+        ['my header.hpp'], phony_targets=True)
+
+if __name__ == '__main__':
+  sys.exit(run_tests(globals()))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+#tests parallel and split parsing against parsing each header whole
+from gb_test_utils import *
+import gb_lexer
+import gb_parallel
+import gb_type_scanner
+
+#constants
+first_header = '''namespace ns {
+  class Hist {
+  public:
+    Hist(int nbins);
+    int Nbins() const;
+  };
+}
+int free_function(int a);
+namespace ns {
+  int count(int a);
+}
+'''
+second_header = '''namespace ns {
+  class Axis {
+  public:
+    double Low() const;
+  };
+  void use(const Hist &hist);
+}
+'''
+split_header = '''#include <string>
+namespace ns {
+  class Empty {};
+  namespace inner {}
+  class Big {
+  public:
+    Big(int a);
+    int f(int a);
+    double g(double b) const;
+    std::string h(const std::string &s);
+  private:
+    int a_;
+    double b_;
+  };
+  enum class Kind { one, two };
+  void free_in_ns(int a, double b = 0.5);
+  int x(int a);
+  int y(int a);
+}
+int global_function(const char * name);
+double global_variable = 3.0;
+'''
+
+def test_parse_files_single_header():
+  with TempDirectory() as directory:
+    filename = directory.write('first.hpp', first_header)
+    type_list = std_types+gb_type_scanner.scan_header_types([filename])
+    assert (describe(gb_parallel.parse_files([filename], 1, std_types))
+        == describe(gb_parallel.parse_file(filename, type_list)))
+
+def test_parse_files_jobs():
+  with TempDirectory() as directory:
+    filenames = [directory.write('first.hpp', first_header),
+        directory.write('second.hpp', second_header)]
+    serial = gb_parallel.parse_files(filenames, 1, std_types)
+    parallel = gb_parallel.parse_files(filenames, 2, std_types)
+    assert describe(serial) == describe(parallel)
+    #namespaces are merged into the first one of an earlier header, keeping
+    #spans of each header
+    assert ([member.name for member in serial.members]
+        == ['ns','free_function','ns'])
+    assert ([member.name for member in serial.members[0].members]
+        == ['Hist','Axis','use'])
+    type_list = std_types+gb_type_scanner.scan_header_types(filenames)
+    assert (serial.members[0].members[1].span == gb_parallel.parse_file(
+        filenames[1], type_list).members[0].members[0].span)
+
+def parse_plain(filename):
+  '''Returns tree of filename parsed whole with its types registered'''
+  tokens = gb_lexer.tokenize_file_cpp(filename)
+  return gb_parallel.parse_tokens(tokens,
+      std_types+gb_type_scanner.scan_types(tokens))
+
+def test_split_matches_plain():
+  with TempDirectory() as directory:
+    filename = directory.write('split.hpp', split_header)
+    plain = describe(parse_plain(filename))
+    for target_size in (1, 5, 20, 1000):
+      for jobs in (1, 2):
+        assert plain == describe(gb_parallel.parse_file_split(filename, jobs,
+            std_types, target_size))
+
+def test_split_chunk_error():
+  with TempDirectory() as directory:
+    filename = directory.write('split_error.hpp',
+        split_header.replace('int x(int a);', 'int x(;'))
+    assert (describe(parse_plain(filename))
+        == describe(gb_parallel.parse_file_split(filename, 1, std_types, 5)))
+
+if __name__ == '__main__':
+  sys.exit(run_tests(globals()))
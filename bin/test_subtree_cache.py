@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#tests that declarations reused from a SubtreeCache give the parsed tree
+from gb_test_utils import *
+import gb_cpp_parser
+import gb_lexer
+import gb_subtree_cache
+import os
+
+#constants
+header = '''#include <string>
+class Hist {
+public:
+  Hist(int nbins, double low = 0.5);
+  std::string Name() const;
+  enum class Kind { one, two };
+private:
+  int nbins_;
+};
+class Axis {
+public:
+  Axis(int nbins, double low = 0.5);
+  std::string Name() const;
+};
+int free_function(int a, const char * b);
+'''
+
+def parse_tokens(tokens, subtree_cache=None):
+  '''Returns tree parsed from tokens with subtree_cache'''
+  parser = gb_cpp_parser.CppParser(tokens, True,
+      subtree_cache=subtree_cache)
+  parser.add_types(std_types)
+  return parser.evaluate()
+
+def test_hits():
+  with TempDirectory() as directory:
+    tokens = gb_lexer.tokenize_file_cpp(directory.write('header.hpp',
+        header))
+  plain = describe(parse_tokens(tokens))
+  subtree_cache = gb_subtree_cache.SubtreeCache()
+  assert describe(parse_tokens(tokens, subtree_cache)) == plain
+  #Name of Axis is the same statement as in Hist
+  assert subtree_cache.hits == 1
+  misses = subtree_cache.misses
+  assert describe(parse_tokens(tokens, subtree_cache)) == plain
+  assert subtree_cache.misses == misses
+
+def test_saved():
+  with TempDirectory() as directory:
+    tokens = gb_lexer.tokenize_file_cpp(directory.write('header.hpp',
+        header))
+    cache_filename = os.path.join(directory.path, 'subtrees.cache')
+    subtree_cache = gb_subtree_cache.SubtreeCache(cache_filename)
+    plain = describe(parse_tokens(tokens, subtree_cache))
+    subtree_cache.save()
+    subtree_cache = gb_subtree_cache.SubtreeCache(cache_filename)
+    assert describe(parse_tokens(tokens, subtree_cache)) == plain
+    assert subtree_cache.misses == 0
+
+if __name__ == '__main__':
+  sys.exit(run_tests(globals()))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#tests incremental updates of the symbol database
+from gb_test_utils import *
+import gb_symbol_db
+import os
+
+#constants
+hist_header = '''namespace ns {
+  class Hist {
+  public:
+    Hist(int nbins);
+    int Nbins() const;
+  };
+}
+'''
+axis_header = '''namespace ns {
+  class Axis : public Hist {
+  public:
+    double Low() const;
+  };
+  void fill(Hist &hist, double value);
+}
+'''
+
+def test_update():
+  with TempDirectory() as directory:
+    filenames = [directory.write('hist.hpp', hist_header),
+        directory.write('axis.hpp', axis_header)]
+    symbol_db = gb_symbol_db.SymbolDatabase(':memory:')
+    assert symbol_db.update_headers(filenames, std_types) == ['ns',
+        'ns::Axis','ns::Axis::Low','ns::Hist','ns::Hist::Nbins',
+        'ns::Hist::__init__','ns::fill']
+    assert symbol_db.update_headers(filenames, std_types) == []
+    assert symbol_db.get_subclasses('Hist') == ['ns::Axis']
+    assert symbol_db.get_classes_using('Hist') == ['ns::Axis','ns::Hist']
+    directory.write('hist.hpp', hist_header.replace('int Nbins() const;',
+        'int Nbins(int axis) const;'))
+    assert symbol_db.update_headers(filenames, std_types) == [
+        'ns::Hist::Nbins']
+    assert ([row['signature'] for row
+        in symbol_db.get_declarations('ns::Hist::Nbins')]
+        == ['int Nbins(int)'])
+    symbol_db.close()
+
+def test_remove():
+  with TempDirectory() as directory:
+    filenames = [directory.write('hist.hpp', hist_header),
+        directory.write('free.hpp', 'int free_function(int a);\n')]
+    symbol_db = gb_symbol_db.SymbolDatabase(':memory:')
+    symbol_db.update_headers(filenames, std_types)
+    assert symbol_db.update_headers(filenames[1:], std_types) == [
+        'ns','ns::Hist','ns::Hist::Nbins','ns::Hist::__init__']
+    assert symbol_db.get_headers() == filenames[1:]
+    assert symbol_db.get_declarations('ns::Hist') == []
+    assert len(symbol_db.get_declarations('free_function')) == 1
+    symbol_db.close()
+
+def test_partial_parse_retried():
+  with TempDirectory() as directory:
+    filename = directory.write('hist.hpp', hist_header+'int x(;\n')
+    db_filename = os.path.join(directory.path, 'symbols.db')
+    symbol_db = gb_symbol_db.SymbolDatabase(db_filename)
+    assert symbol_db.update_headers([filename], std_types) != []
+    #reparsed although unchanged, and gives the same declarations
+    assert symbol_db.update_headers([filename], std_types) == []
+    assert symbol_db.connection.execute('SELECT content_hash FROM headers'
+        ).fetchone()[0] == ''
+    directory.write('hist.hpp', hist_header)
+    symbol_db.update_headers([filename], std_types)
+    assert symbol_db.update_headers([filename], std_types) == []
+    assert symbol_db.connection.execute('SELECT content_hash FROM headers'
+        ).fetchone()[0] == gb_symbol_db.get_file_hash(filename)
+    symbol_db.close()
+
+if __name__ == '__main__':
+  sys.exit(run_tests(globals()))
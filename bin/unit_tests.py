@@ -2,7 +2,9 @@
 #testing script for generate_bindings package
 import gb_lexer
 import gb_cpp_parser
+import gb_type_scanner
 import enum
+import glob
 import re
 
 #types needed for DrawPico
@@ -12,15 +14,9 @@ std_types = ['const_iterator', 'std::function', 'std::map',
     'std::vector']
 otherlib_types = ['TCanvas','TGraph','TGraphAsymmErrors','TH1D','TLatex','TLegend',
     'TLine','TPad','TString']
-drawpico_types = ['Axis','Baby','DataSample','Figure','FigureComponent',
-    'Hist1D','NamedFunc','Palette','PlotOpt','Process','ProcessList',
-    'SampleLoader','SingleHist1D','Figure::FigureComponent',
-    'NamedFunc::ScalarType','NamedFunc::VectorType',
-    'NamedFunc::ScalarFunc','NamedFunc::VectorFunc',
-    'PlotOptTypes::BottomType',
-    'PlotOptTypes::YAxisType','PlotOptTypes::TitleType',
-    'PlotOptTypes::StackType','PlotOptTypes::OverflowType','Process::Type']
-all_types = std_types+otherlib_types+drawpico_types
+#DrawPico types are found by scanning its headers
+drawpico_headers = sorted(glob.glob('../draw_pico/inc/core/*.hpp'))
+all_types = std_types+otherlib_types
 
 if __name__ == '__main__':
   #print(gb_lexer.tokenize_file_cpp('../draw_pico/inc/core/axis.hpp'))
@@ -32,6 +28,7 @@ if __name__ == '__main__':
   my_tokens = gb_lexer.tokenize_file_cpp('../draw_pico/inc/core/plot_maker.hpp')
   my_parser = gb_cpp_parser.CppParser(my_tokens)
   my_parser.add_types(all_types)
+  my_parser.add_types(gb_type_scanner.scan_header_types(drawpico_headers))
   print(my_parser.tokens)
   #print(my_parser.eval_token_regex_string(r'( test <name> ) | ( test2 <name> )'))
   #print('\n\n')
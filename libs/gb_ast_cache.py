@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+#implements an on-disk cache of parsed C++ syntax trees
+from gb_utils import *
+from gb_cpp_parser import *
+import gb_cpp_parser
+import gb_lexer
+import gb_parser
+import gb_type_scanner
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+#constants
+CACHE_MAGIC = b'GBAST\x00'
+CACHE_VERSION = 4
+#magic, version, key, payload length, crc32 of the strings, index, and node
+#sections, strings offset, index offset, nodes offset, root node offset,
+#followed by the crc32 of these fields
+header_fields_struct = struct.Struct('<6sH32sQIIIQQQQ')
+header_crc_struct = struct.Struct('<I')
+header_size = header_fields_struct.size+header_crc_struct.size
+string_offset_struct = struct.Struct('<I')
+#token types with a span, see gb_cpp_parser
+declaration_token_types = frozenset((TokenType.cpp_class, 
+    TokenType.cpp_function, TokenType.cpp_namespace, TokenType.cpp_variable,
+    TokenType.cpp_enum, TokenType.cpp_opaque))
+
+class CacheError(Exception):
+  '''Raised when a cache file is corrupted, stale, or from another version'''
+  pass
+
+def hash_strings(strings):
+  '''Returns sha256 digest of a sequence of strings'''
+  hasher = hashlib.sha256()
+  for string in strings:
+    hasher.update(string.encode('utf-8'))
+    hasher.update(b'\x00')
+  return hasher.digest()
+
+def grammar_repr(regex_list):
+  '''Returns a string describing a compiled regex list, with handler methods
+  replaced by their names so the result is stable between runs'''
+  if isinstance(regex_list, (list, tuple)):
+    return '('+','.join([grammar_repr(element) for element in regex_list])+')'
+  if callable(regex_list):
+    return regex_list.__name__
+  return repr(regex_list)
+
+def grammar_hash(parser):
+  '''Returns sha256 digest of the compiled grammar of parser and the source
+  of the modules that interpret it'''
+  grammar_strings = []
+  for token_type in parser.grammar_token_types:
+    grammar_strings.append(token_type)
+    grammar_strings.append(grammar_repr(parser.get_grammar(token_type)))
+  for module in (gb_parser, gb_cpp_parser):
+    with open(module.__file__, 'rb') as module_file:
+      grammar_strings.append(hashlib.sha256(module_file.read()).hexdigest())
+  return hash_strings(grammar_strings)
+
+def get_cache_key(parser):
+  '''Returns cache key for a parser whose types have been registered: a hash
+  of its token stream, grammar, and sorted available types'''
+  return hash_strings([hash_strings(parser.tokens).hex(),
+      grammar_hash(parser).hex(),
+      hash_strings(sorted(parser.available_types)).hex()])
+
+#-----------------------------------------------------------------------------
+#                                  encoding
+#-----------------------------------------------------------------------------
+
+def encode_varint(buffer, value):
+  '''Appends unsigned LEB128 encoding of value to buffer'''
+  while value >= 0x80:
+    buffer.append((value & 0x7f) | 0x80)
+    value >>= 7
+  buffer.append(value)
+
+class AstEncoder:
+  '''Serializes a token tree into the cache format'''
+
+  def __init__(self):
+    self.nodes = bytearray()
+    self.strings = []
+    self.string_indices = dict()
+    self.index = [] #[qualified name, token type value, node offset,
+                    #node length]
+
+  def add_string(self, string):
+    '''Appends reference to string in the string table'''
+    if string not in self.string_indices:
+      self.string_indices[string] = len(self.strings)
+      self.strings.append(string)
+    encode_varint(self.nodes, self.string_indices[string])
+
+  def add_string_list(self, string_list):
+    encode_varint(self.nodes, len(string_list))
+    for string in string_list:
+      self.add_string(string)
+
+  def add_span(self, span):
+    '''Appends span as start+1 and end, or 0 if span is None'''
+    if (span == None):
+      encode_varint(self.nodes, 0)
+    else:
+      encode_varint(self.nodes, span[0]+1)
+      encode_varint(self.nodes, span[1])
+
+  def add_node_list(self, token_list, scope_name=None):
+    encode_varint(self.nodes, len(token_list))
+    for token in token_list:
+      self.add_node(token, scope_name)
+
+  def add_node(self, token, scope_name=None):
+    '''Appends token and its subtree. If scope_name is not None, the token is
+    a member of a namespace and is added to the index'''
+    token_type = token.token_type
+    index_entry = None
+    if (scope_name != None and token_type != TokenType.unparsed):
+      name = getattr(token, 'name', '')
+      if (scope_name != ''):
+        name = scope_name+'::'+name
+      index_entry = [name, token_type.value, len(self.nodes), 0]
+      self.index.append(index_entry)
+    self.nodes.append(token_type.value)
+    if (token_type == TokenType.cpp_type):
+      self.add_string(token.base_type)
+      self.add_string(token.signed)
+      self.add_string(token.cv_qualifier)
+      self.add_node_list(token.templates)
+      self.add_node_list(token.argtypes)
+    elif (token_type == TokenType.cpp_class):
+      self.add_string(token.name)
+      self.add_string_list(token.parents)
+      self.add_string_list(token.parents_access)
+      self.add_node_list(token.members)
+      self.add_string_list(token.members_access)
+    elif (token_type == TokenType.cpp_namespace):
+      self.add_string(token.name)
+      member_scope = token.name
+      if (scope_name == None):
+        member_scope = ''
+      elif (scope_name != ''):
+        member_scope = scope_name+'::'+token.name
+      self.add_node_list(token.members, member_scope)
+    elif (token_type == TokenType.cpp_function):
+      self.add_string(token.name)
+      self.add_node(token.function_type)
+      self.add_node_list(token.args)
+      self.nodes.append(int(token.is_default))
+    elif (token_type == TokenType.cpp_variable):
+      self.add_string(token.name)
+      self.add_node(token.variable_type)
+      self.add_node(token.default)
+    elif (token_type == TokenType.cpp_expression):
+      self.add_string(token.literal_value)
+      self.nodes.append(token.expression_type.value)
+      self.add_node_list(token.subexpression)
+    elif (token_type == TokenType.cpp_enum):
+      self.add_string(token.name)
+      self.add_string_list(token.enums)
+      self.add_string_list(token.enum_values)
+      self.nodes.append(int(token.is_enum_class))
+    if (token_type in declaration_token_types):
+      self.add_span(token.span)
+    if (index_entry != None):
+      index_entry[3] = len(self.nodes)-index_entry[2]
+
+  def encode(self, global_token, key):
+    '''Returns bytes of a cache file holding global_token under key'''
+    self.add_node(global_token)
+    string_blob = bytearray()
+    string_table = bytearray(string_offset_struct.pack(len(self.strings)))
+    for string in self.strings:
+      string_table += string_offset_struct.pack(len(string_blob))
+      string_blob += string.encode('utf-8')
+    string_table += string_offset_struct.pack(len(string_blob))
+    string_table += string_blob
+    index = bytearray()
+    encode_varint(index, len(self.index))
+    nodes = memoryview(self.nodes)
+    for (name, token_type_value, node_offset, node_length) in self.index:
+      encoded_name = name.encode('utf-8')
+      encode_varint(index, len(encoded_name))
+      index += encoded_name
+      index.append(token_type_value)
+      encode_varint(index, node_offset)
+      encode_varint(index, node_length)
+      index += header_crc_struct.pack(zlib.crc32(
+          nodes[node_offset:node_offset+node_length]))
+    nodes.release()
+    strings_offset = header_size
+    index_offset = strings_offset+len(string_table)
+    nodes_offset = index_offset+len(index)
+    header = header_fields_struct.pack(CACHE_MAGIC, CACHE_VERSION, key,
+        len(string_table)+len(index)+len(self.nodes),
+        zlib.crc32(string_table), zlib.crc32(index), zlib.crc32(self.nodes),
+        strings_offset, index_offset, nodes_offset, 0)
+    return (header+header_crc_struct.pack(zlib.crc32(header))+string_table
+        +index+self.nodes)
+
+#-----------------------------------------------------------------------------
+#                                  decoding
+#-----------------------------------------------------------------------------
+
+class CachedAst:
+  '''Read-only view of a cache file. The file is memory mapped, and nodes and
+  strings are only decoded when requested. Opening checks only the header;
+  each section, and each indexed subtree read by get, is checked against its
+  crc32 the first time it is read, so a corrupted payload raises CacheError
+  from the method that reads it'''
+
+  def __init__(self, filename, key=None, data=None):
+    '''Opens cache file and validates its header. If data is given, it is
+    used as the contents of the file, which is not opened. Raises CacheError
+    if the header is corrupted, the file is truncated or from another format
+    version, or it is not stored under key'''
+    self.filename = filename
+    self.cache_file = None
+    if (data != None):
+      self.data = data
+    else:
+      self.cache_file = open(filename, 'rb')
+      try:
+        self.data = mmap.mmap(self.cache_file.fileno(), 0,
+            access=mmap.ACCESS_READ)
+      except ValueError:
+        self.cache_file.close()
+        raise CacheError('empty cache file '+filename)
+    self.strings = dict()
+    self.string_count = None #read with the strings section
+    self.index = None #read on first use
+    self.verified = set() #sections and node offsets whose crc32 matched
+    try:
+      self.validate(key)
+    except (CacheError, struct.error) as exc:
+      self.close()
+      raise CacheError('invalid cache file '+filename+': '+str(exc))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    if (self.cache_file != None):
+      self.data.close()
+      self.cache_file.close()
+
+  def validate(self, key):
+    '''Checks header, its checksum, and the section bounds'''
+    if (len(self.data) < header_size):
+      raise CacheError('truncated header')
+    (magic, version, self.key, payload_length, self.strings_crc,
+        self.index_crc, self.nodes_crc, self.strings_offset,
+        self.index_offset, self.nodes_offset,
+        self.root_offset) = header_fields_struct.unpack_from(self.data, 0)
+    if (magic != CACHE_MAGIC):
+      raise CacheError('bad magic')
+    if (version != CACHE_VERSION):
+      raise CacheError('format version '+str(version))
+    if (zlib.crc32(self.data[:header_fields_struct.size])
+        != header_crc_struct.unpack_from(self.data,
+        header_fields_struct.size)[0]):
+      raise CacheError('header checksum mismatch')
+    if (key != None and self.key != key):
+      raise CacheError('stale key')
+    if (len(self.data) != header_size+payload_length):
+      raise CacheError('truncated payload')
+    if not (header_size == self.strings_offset <= self.index_offset
+        <= self.nodes_offset <= len(self.data)):
+      raise CacheError('bad section offsets')
+
+  def check_section(self, section, start, end, crc):
+    '''Raises CacheError unless data[start:end] matches crc, computing the
+    checksum only on the first check of section'''
+    if section in self.verified:
+      return
+    if (end > len(self.data) or zlib.crc32(self.data[start:end]) != crc):
+      raise CacheError('invalid cache file '+self.filename+': checksum '
+          'mismatch in '+str(section))
+    self.verified.add(section)
+
+  def verify(self):
+    '''Checks every section at once, raising CacheError on a mismatch'''
+    self.check_section('strings', self.strings_offset, self.index_offset,
+        self.strings_crc)
+    self.check_section('index', self.index_offset, self.nodes_offset,
+        self.index_crc)
+    self.check_section('nodes', self.nodes_offset, len(self.data),
+        self.nodes_crc)
+
+  def read_varint(self, position):
+    '''Returns (value, next position) of varint at position'''
+    value = 0
+    shift = 0
+    while True:
+      byte = self.data[position]
+      position += 1
+      value |= (byte & 0x7f) << shift
+      if (byte < 0x80):
+        return value, position
+      shift += 7
+
+  def read_index(self):
+    '''Checks and reads qualified name index of namespace members'''
+    self.check_section('index', self.index_offset, self.nodes_offset,
+        self.index_crc)
+    index = dict()
+    (entry_count, position) = self.read_varint(self.index_offset)
+    for entry_idx in range(entry_count):
+      (name_length, position) = self.read_varint(position)
+      name = bytes(self.data[position:position+name_length]).decode('utf-8')
+      position += name_length
+      token_type_value = self.data[position]
+      (node_offset, position) = self.read_varint(position+1)
+      (node_length, position) = self.read_varint(position)
+      node_crc = header_crc_struct.unpack_from(self.data, position)[0]
+      position += header_crc_struct.size
+      if name not in index:
+        index[name] = (TokenType(token_type_value), node_offset,
+            node_length, node_crc)
+    self.index = index
+
+  def read_strings(self):
+    '''Checks the strings section and reads the number of strings'''
+    self.check_section('strings', self.strings_offset, self.index_offset,
+        self.strings_crc)
+    self.string_count = string_offset_struct.unpack_from(self.data,
+        self.strings_offset)[0]
+    self.string_blob_offset = (self.strings_offset
+        +string_offset_struct.size*(self.string_count+2))
+
+  def get_string(self, string_idx):
+    '''Returns string string_idx of the string table, decoding on first use'''
+    if string_idx not in self.strings:
+      if (self.string_count == None):
+        self.read_strings()
+      if (string_idx >= self.string_count):
+        raise IndexError('string index out of range')
+      (start, end) = struct.unpack_from('<II', self.data, self.strings_offset
+          +string_offset_struct.size*(string_idx+1))
+      self.strings[string_idx] = bytes(self.data[self.string_blob_offset
+          +start:self.string_blob_offset+end]).decode('utf-8')
+    return self.strings[string_idx]
+
+  def read_span(self, position):
+    '''Returns (span, next position) of span at position'''
+    (start, position) = self.read_varint(position)
+    if (start == 0):
+      return None, position
+    (end, position) = self.read_varint(position)
+    return (start-1, end), position
+
+  def read_string(self, position):
+    (string_idx, position) = self.read_varint(position)
+    return self.get_string(string_idx), position
+
+  def read_string_list(self, position):
+    (length, position) = self.read_varint(position)
+    string_list = []
+    for list_idx in range(length):
+      (string, position) = self.read_string(position)
+      string_list.append(string)
+    return string_list, position
+
+  def read_node_list(self, position):
+    (length, position) = self.read_varint(position)
+    token_list = []
+    for list_idx in range(length):
+      (token, position) = self.read_node(position)
+      token_list.append(token)
+    return token_list, position
+
+  def read_node(self, position):
+    '''Returns (token, next position) for node at position in node section'''
+    token_type = TokenType(self.data[position])
+    position += 1
+    if (token_type == TokenType.cpp_type):
+      (base_type, position) = self.read_string(position)
+      (signed, position) = self.read_string(position)
+      (cv_qualifier, position) = self.read_string(position)
+      (templates, position) = self.read_node_list(position)
+      (argtypes, position) = self.read_node_list(position)
+      token = make_type(base_type, signed, cv_qualifier, templates, argtypes)
+    elif (token_type == TokenType.cpp_class):
+      token = ClassToken()
+      (token.name, position) = self.read_string(position)
+      (token.parents, position) = self.read_string_list(position)
+      (token.parents_access, position) = self.read_string_list(position)
+      (token.members, position) = self.read_node_list(position)
+      (token.members_access, position) = self.read_string_list(position)
+    elif (token_type == TokenType.cpp_namespace):
+      token = NamespaceToken()
+      (token.name, position) = self.read_string(position)
+      (token.members, position) = self.read_node_list(position)
+    elif (token_type == TokenType.cpp_function):
+      token = FunctionToken()
+      (token.name, position) = self.read_string(position)
+      (token.function_type, position) = self.read_node(position)
+      (token.args, position) = self.read_node_list(position)
+      token.is_default = (self.data[position] != 0)
+      position += 1
+    elif (token_type == TokenType.cpp_variable):
+      token = VariableToken()
+      (token.name, position) = self.read_string(position)
+      (token.variable_type, position) = self.read_node(position)
+      (token.default, position) = self.read_node(position)
+      if (token.default.token_type == TokenType.unparsed):
+        token.default = no_default
+    elif (token_type == TokenType.cpp_expression):
+      token = ExpressionToken()
+      (token.literal_value, position) = self.read_string(position)
+      token.expression_type = ExpressionType(self.data[position])
+      (token.subexpression, position) = self.read_node_list(position+1)
+    elif (token_type == TokenType.cpp_enum):
+      token = EnumToken()
+      (token.name, position) = self.read_string(position)
+      (token.enums, position) = self.read_string_list(position)
+      (token.enum_values, position) = self.read_string_list(position)
+      token.is_enum_class = (self.data[position] != 0)
+      position += 1
+    elif (token_type == TokenType.cpp_opaque):
+      token = OpaqueToken()
+    else:
+      token = no_type
+    if (token_type in declaration_token_types):
+      (token.span, position) = self.read_span(position)
+    return token, position
+
+  def get_global(self):
+    '''Decodes and returns the whole tree'''
+    try:
+      self.check_section('nodes', self.nodes_offset, len(self.data),
+          self.nodes_crc)
+      return self.read_node(self.nodes_offset+self.root_offset)[0]
+    except (struct.error, IndexError, ValueError) as exc:
+      raise CacheError('invalid cache file '+self.filename+': '+str(exc))
+
+  def names(self):
+    '''Returns qualified names of all namespace members in the file'''
+    try:
+      if (self.index == None):
+        self.read_index()
+      return list(self.index)
+    except (struct.error, IndexError, ValueError) as exc:
+      raise CacheError('invalid cache file '+self.filename+': '+str(exc))
+
+  def get(self, qualified_name):
+    '''Decodes and returns only the namespace member named qualified_name,
+    ex. a class, or None if there is no such member. Only the bytes of that
+    member are checksummed'''
+    try:
+      if (self.index == None):
+        self.read_index()
+      if qualified_name not in self.index:
+        return None
+      (token_type, node_offset, node_length,
+          node_crc) = self.index[qualified_name]
+      if 'nodes' not in self.verified:
+        self.check_section(node_offset, self.nodes_offset+node_offset,
+            self.nodes_offset+node_offset+node_length, node_crc)
+      return self.read_node(self.nodes_offset+node_offset)[0]
+    except (struct.error, IndexError, ValueError) as exc:
+      raise CacheError('invalid cache file '+self.filename+': '+str(exc))
+
+#-----------------------------------------------------------------------------
+#                                    cache
+#-----------------------------------------------------------------------------
+
+class AstCache:
+  '''Directory of cache files, one per header'''
+
+  def __init__(self, cache_dir):
+    self.cache_dir = cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+
+  def get_cache_filename(self, filename):
+    '''Returns cache file used for header filename'''
+    path_hash = hashlib.sha256(os.path.abspath(filename).encode('utf-8'))
+    return os.path.join(self.cache_dir, path_hash.hexdigest()[:32]+'.gbast')
+
+  def store(self, filename, global_token, key):
+    '''Writes cache file for header filename'''
+    cache_filename = self.get_cache_filename(filename)
+    temp_filename = cache_filename+'.tmp'+str(os.getpid())
+    with open(temp_filename, 'wb') as cache_file:
+      cache_file.write(AstEncoder().encode(global_token, key))
+    os.replace(temp_filename, cache_filename)
+
+  def invalidate(self, filename):
+    '''Removes the cache entry of header filename, if any'''
+    cache_filename = self.get_cache_filename(filename)
+    if os.path.exists(cache_filename):
+      os.remove(cache_filename)
+
+  def load(self, filename, key):
+    '''Returns CachedAst for header filename stored under key, or None if
+    there is no valid entry'''
+    cache_filename = self.get_cache_filename(filename)
+    if not os.path.exists(cache_filename):
+      return None
+    try:
+      return CachedAst(cache_filename, key)
+    except CacheError as exc:
+      debug('rebuilding AST cache entry: '+str(exc))
+      return None
+
+  def parse_file(self, filename, type_list=None, prescan_types=False):
+    '''Returns RebuildingAst for header filename, parsing the header and
+    replacing the cache entry if it is missing, stale, or corrupted. A
+    header that cannot be parsed completely is not cached, and its partial
+    tree is only kept in memory'''
+    if (type_list == None):
+      type_list = []
+    parser = CppParser(gb_lexer.tokenize_file_cpp(filename), prescan_types)
+    parser.add_types(type_list)
+    if (parser.prescan_types):
+      parser.add_types(gb_type_scanner.scan_types(parser.tokens))
+      parser.prescan_types = False
+    key = get_cache_key(parser)
+    cached_ast = self.load(filename, key)
+    if (cached_ast == None):
+      global_token = parser.evaluate()
+      if (parser.position == len(parser.tokens)):
+        self.store(filename, global_token, key)
+        cached_ast = CachedAst(self.get_cache_filename(filename), key)
+      else:
+        debug('not caching '+filename+', unable to parse past token '
+            +str(parser.position)+' of '+str(len(parser.tokens)))
+        cached_ast = CachedAst(self.get_cache_filename(filename), key,
+            AstEncoder().encode(global_token, key))
+    return RebuildingAst(self, filename, type_list, prescan_types, 
+        cached_ast)
+
+class RebuildingAst:
+  '''CachedAst of a header returned by AstCache.parse_file. Sections are 
+  checked when first read, see CachedAst, and if one is corrupted, the entry
+  is rebuilt by parsing the header again and the read is repeated'''
+
+  def __init__(self, ast_cache, filename, type_list, prescan_types, 
+      cached_ast):
+    self.ast_cache = ast_cache
+    self.filename = filename
+    self.type_list = type_list
+    self.prescan_types = prescan_types
+    self.cached_ast = cached_ast
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    self.cached_ast.close()
+
+  def read(self, method, *args):
+    '''Returns method of CachedAst called with args, rebuilding the entry 
+    once if it raises CacheError'''
+    try:
+      return method(self.cached_ast, *args)
+    except CacheError as exc:
+      debug('rebuilding AST cache entry: '+str(exc))
+      self.cached_ast.close()
+      self.ast_cache.invalidate(self.filename)
+      self.cached_ast = self.ast_cache.parse_file(self.filename, 
+          self.type_list, self.prescan_types).cached_ast
+      return method(self.cached_ast, *args)
+
+  def verify(self):
+    '''Checks every section, rebuilding the entry if one is corrupted'''
+    self.read(CachedAst.verify)
+
+  def get_global(self):
+    '''Decodes and returns the whole tree'''
+    return self.read(CachedAst.get_global)
+
+  def names(self):
+    '''Returns qualified names of all namespace members in the file'''
+    return self.read(CachedAst.names)
+
+  def get(self, qualified_name):
+    '''Decodes and returns only the namespace member named qualified_name,
+    or None if there is no such member'''
+    return self.read(CachedAst.get, qualified_name)
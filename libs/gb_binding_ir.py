@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+#implements the flat binding IR between the parse tree and the wrapper emitters
+from gb_utils import *
+import gb_output
+import json
+
+#constants
+BINDING_IR_VERSION = 1
+
+class ValuePlan:
+  '''How a function argument or return value is passed between Python, C,
+  and C++, with its types resolved. marshal is one of
+    void    - no value, return only
+    value   - C type passed as is
+    pointer - passed as a C pointer or void*, cast to cpp_type in C++
+    object  - class passed as void*, dereferenced as cpp_type in C++, or
+              copied to the heap when returned
+    string  - std::string returned as const char*, return only
+    vector  - passed as a C array and a length, or returned as a pointer to
+              a std::vector, cpp_type is the element type
+    set     - like vector, converted from or to a std::set in C++
+  wrapper_class is the Python class wrapping the value, or each element of a
+  vector or set, if any. default is the Python expression of the default
+  argument, without the =, or None'''
+  __slots__ = ('name','marshal','cpp_type','c_type','pyc_type','py_type',
+      'element_pyc_type','wrapper_class','default')
+
+  def __init__(self, name='', marshal='value', cpp_type='', c_type='',
+      pyc_type='', py_type='', element_pyc_type='', wrapper_class='',
+      default=None):
+    self.name = name
+    self.marshal = marshal
+    self.cpp_type = cpp_type
+    self.c_type = c_type
+    self.pyc_type = pyc_type
+    self.py_type = py_type
+    self.element_pyc_type = element_pyc_type
+    self.wrapper_class = wrapper_class
+    self.default = default
+
+  def to_list(self):
+    return [getattr(self, slot) for slot in self.__slots__]
+
+def value_plan_from_list(fields):
+  return ValuePlan(*fields)
+
+class BindingEntry:
+  '''One exported C function of the wrapper library. kind is one of
+  pointer_constructor, constructor, destructor, method, or function. name is
+  the C++ name of the function, c_name its unique name in the library. scope
+  is the qualified name of the enclosing class, or namespace for functions,
+  and outer_class that of the outermost enclosing class, or empty for
+  functions. overload_index numbers public overloads of a class member in
+  Python, or is 0 if the member is not overloaded'''
+  __slots__ = ('kind','c_name','name','scope','outer_class','access',
+      'overload_index','args','result')
+
+  def __init__(self, kind='function', c_name='', name='', scope='',
+      outer_class='', access='', overload_index=0, args=None, result=None):
+    self.kind = kind
+    self.c_name = c_name
+    self.name = name
+    self.scope = scope
+    self.outer_class = outer_class
+    self.access = access
+    self.overload_index = overload_index
+    self.args = [] #ValuePlans
+    if (args != None):
+      self.args = args
+    self.result = result
+    if (result == None):
+      self.result = ValuePlan(marshal='void')
+
+  def to_list(self):
+    return ([getattr(self, slot) for slot in self.__slots__[:-2]]
+        +[[arg.to_list() for arg in self.args], self.result.to_list()])
+
+def binding_entry_from_list(fields):
+  return BindingEntry(*fields[:-2],
+      [value_plan_from_list(arg) for arg in fields[-2]],
+      value_plan_from_list(fields[-1]))
+
+class BindingModule:
+  '''Entry points of the wrapper library in the order they are written'''
+
+  def __init__(self):
+    self.entries = [] #BindingEntries
+    self.vector_types = [] #(C++ type, C type) of vector element types
+                           #needing access functions, sorted by C++ type
+
+  def get_classes(self):
+    '''Returns dict of qualified name to ClassBindings for each class not
+    nested in another class, in order'''
+    classes = dict()
+    for entry in self.entries:
+      if (entry.outer_class != '' and entry.scope == entry.outer_class):
+        if entry.scope not in classes:
+          classes[entry.scope] = ClassBindings(entry.scope)
+        classes[entry.scope].add_entry(entry)
+    return classes
+
+class ClassBindings:
+  '''Entries of one class, grouped for writing its Python wrapper'''
+
+  def __init__(self, name):
+    self.name = name
+    self.pointer_constructor = None
+    self.entries = [] #BindingEntries other than the pointer constructor
+    self.overloads = dict() #name to overloaded BindingEntries, in order
+
+  def add_entry(self, entry):
+    if (entry.kind == 'pointer_constructor'):
+      self.pointer_constructor = entry
+      return
+    self.entries.append(entry)
+    if (entry.overload_index != 0):
+      if entry.name not in self.overloads:
+        self.overloads[entry.name] = []
+      self.overloads[entry.name].append(entry)
+
+def dumps(binding_module):
+  '''Returns compact JSON serialization of binding_module, with entries and
+  value plans as lists of their fields'''
+  return json.dumps({'version' : BINDING_IR_VERSION,
+      'entries' : [entry.to_list() for entry in binding_module.entries],
+      'vector_types' : binding_module.vector_types}, separators=(',',':'))
+
+def loads(string):
+  '''Returns BindingModule serialized by dumps'''
+  serialized = json.loads(string)
+  if (serialized.get('version') != BINDING_IR_VERSION):
+    error('unsupported binding IR version '+str(serialized.get('version')))
+    return None
+  binding_module = BindingModule()
+  binding_module.entries = [binding_entry_from_list(fields)
+      for fields in serialized['entries']]
+  binding_module.vector_types = [tuple(vector_type)
+      for vector_type in serialized['vector_types']]
+  return binding_module
+
+def save(binding_module, filename, manifest=None):
+  '''Writes binding_module to filename if it changed, returns true if it was
+  written'''
+  output_file = gb_output.OutputFile(filename, manifest)
+  output_file.write(dumps(binding_module)+'\n')
+  return output_file.close()
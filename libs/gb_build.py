@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#implements compile commands for the generated wrapper library
+from gb_utils import *
+import gb_output
+import json
+import multiprocessing.pool
+import os
+import subprocess
+
+def get_object_filename(cpp_filename):
+  '''Returns name of the object file compiled from cpp_filename'''
+  return os.path.splitext(cpp_filename)[0]+'.o'
+
+def get_compile_commands(cpp_filenames, pch_filename=None, compiler='g++',
+    flags=None):
+  '''Returns commands compiling cpp_filenames in the compile_commands.json
+  format, dicts with directory, arguments, file, and output. If pch_filename
+  is given, the first command compiles it to pch_filename.gch, which g++
+  then loads in place of parsing the header in the other commands. A
+  precompiled header is only loaded if compiled with the same flags, so
+  every command gets flags'''
+  if (flags == None):
+    flags = []
+  directory = os.getcwd()
+  commands = []
+  if (pch_filename != None):
+    commands.append({'directory' : directory,
+        'arguments' : [compiler]+flags+['-x','c++-header',pch_filename,'-o',
+        pch_filename+'.gch'],
+        'file' : pch_filename, 'output' : pch_filename+'.gch'})
+  for cpp_filename in cpp_filenames:
+    arguments = [compiler]+flags
+    if (pch_filename != None):
+      arguments.append('-Winvalid-pch')
+    arguments += ['-c',cpp_filename,'-o',get_object_filename(cpp_filename)]
+    commands.append({'directory' : directory, 'arguments' : arguments,
+        'file' : cpp_filename,
+        'output' : get_object_filename(cpp_filename)})
+  return commands
+
+def get_link_command(object_filenames, library_filename, 
+    version_script_filename=None, compiler='g++', flags=None):
+  '''Returns command linking object_filenames into shared library
+  library_filename, in the format of get_compile_commands. If 
+  version_script_filename is given, only the symbols it lists are exported,
+  see output_version_script'''
+  if (flags == None):
+    flags = []
+  arguments = [compiler,'-shared']+list(object_filenames)
+  if (version_script_filename != None):
+    arguments.append('-Wl,--version-script='+version_script_filename)
+  arguments += flags+['-o',library_filename]
+  return {'directory' : os.getcwd(), 'arguments' : arguments,
+      'file' : library_filename, 'output' : library_filename}
+
+def output_version_script(output_file, exported_names):
+  '''Writes GNU ld version script to output_file that exports the functions
+  exported_names and makes every other symbol local, so template 
+  instantiations and inline functions from the wrapped headers stay out of
+  the dynamic symbol table'''
+  output_file.write('{\n  global:\n')
+  for name in exported_names:
+    output_file.write('    '+name+';\n')
+  output_file.write('  local:\n    *;\n};\n')
+
+def write_compile_commands(filename, commands, manifest=None):
+  '''Writes commands to JSON file filename if they changed, returns true if
+  it was written'''
+  output_file = gb_output.OutputFile(filename, manifest)
+  output_file.write(json.dumps(commands, indent=2)+'\n')
+  return output_file.close()
+
+def run_command(command):
+  '''Runs compile command, returns its exit status'''
+  debug(' '.join(command['arguments']))
+  return subprocess.call(command['arguments'], cwd=command['directory'])
+
+def run_compile_commands(commands, jobs=1):
+  '''Runs commands from get_compile_commands, compiling the precompiled
+  header, if any, before the translation units, which are compiled jobs at
+  a time. Returns true if every command succeeded'''
+  pending = list(commands)
+  if (len(pending) > 0 and pending[0]['file'].endswith('.hpp')):
+    if (run_command(pending.pop(0)) != 0):
+      return False
+  with multiprocessing.pool.ThreadPool(max(jobs, 1)) as pool:
+    statuses = pool.map(run_command, pending, chunksize=1)
+  return all([status == 0 for status in statuses])
@@ -2,8 +2,11 @@
 #implements a basic C++ parser
 from gb_utils import *
 from gb_parser import Parser
+import gb_type_scanner
+import gb_visitor
 import copy
 import enum
+import fnmatch
 import re
 
 #constants
@@ -26,6 +29,26 @@ operator_names = {'+' : '__add__', '-' : '__sub__', '*' : '__mul__',
 half_operator_names = {'(' : '__parentheses__', '[' : '__brackets__'
     } #split when tokenizing
 
+# callback validators
+access_modifiers = frozenset(('public','protected','private'))
+cv_qualifiers = frozenset(('const','volatile'))
+function_defaults = frozenset(('default','delete'))
+function_type_qualifiers = frozenset(('inline','virtual','explicit','friend',
+    'constexpr'))
+long_type_names = {'int' : 'long', 'long' : 'long long', 
+    'double' : 'long double'}
+pass_qualifiers = frozenset(('&','&&'))
+storage_qualifiers = frozenset(('static','thread_local','extern','mutable'))
+vert_specifiers = frozenset(('final','override'))
+# statements not kept in a subtree cache, since parsing them changes the 
+# available types or the parse context
+uncached_statements = frozenset(('class','namespace','using','}')
+    ) | access_modifiers
+name_regex = re.compile(r'[a-zA-Z_]\w*(?:::[a-zA-Z_]\w*)*')
+char_literal_regex = re.compile('\'.*\'')
+numeric_literal_regex = re.compile(r'\d+(?:\.\d*)?(?:e(?:\+\-)?\d+)?')
+string_literal_regex = re.compile(r'".*"')
+
 #implement C++ tokens
 
 class TokenType(enum.Enum):
@@ -37,6 +60,11 @@ class TokenType(enum.Enum):
   cpp_variable = 5
   cpp_expression = 6
   cpp_enum = 7
+  cpp_opaque = 8
+
+#types of declarations that may be kept in a subtree cache
+cacheable_token_types = frozenset((TokenType.cpp_function, 
+    TokenType.cpp_variable, TokenType.cpp_enum))
 
 class ExpressionType(enum.Enum):
   unimplemented = 0
@@ -46,399 +74,822 @@ class ExpressionType(enum.Enum):
   char_literal = 4
 
 class Token:
-  def __init__(self):
-    self.token_type = TokenType.unparsed
+  __slots__ = ()
+  token_type = TokenType.unparsed
+
+#shared placeholders for absent subtokens, compare token_type to detect them
+no_type = Token()
+no_default = Token()
+
+#declaration tokens have a span (start, end) covering the tokens of the 
+#statement that declared them, counted from the first token of the enclosing
+#class or namespace, or from the start of the file for top-level 
+#declarations. Declarations in one statement, ex. int a, b; share a span. 
+#span is None for tokens not declared by a statement, ex. function arguments
 
 class ClassToken(Token):
+  __slots__ = ('name','parents','parents_access','members','members_access',
+      'span')
+  token_type = TokenType.cpp_class
+
   def __init__(self):
     self.name = ''
     self.parents = []
     self.parents_access = []
     self.members = [] #list of tokens
     self.members_access = []
-    self.token_type = TokenType.cpp_class
-    self.current_access = 'public' #access assigned to new members
-    self.current_type = Token() #type assigned to new vars
+    self.span = None
+
+class LazyClassToken(ClassToken):
+  '''ClassToken whose body is parsed on first access to members or 
+  members_access. Created by CppParser with lazy_classes set'''
+  __slots__ = ('body_tokens','body_types','parser_options')
+
+  def __init__(self):
+    ClassToken.__init__(self)
+    self.body_tokens = None #tokens of the unparsed class definition
+    self.body_types = None #TypeRegistry at the class definition
+    self.parser_options = None #CppParser keyword arguments
+
+  def expand(self):
+    '''Parses the class body and sets members and members_access'''
+    parser = CppParser(self.body_tokens, **self.parser_options)
+    parser.available_types = self.body_types
+    self.body_tokens = None
+    self.body_types = None
+    class_token = ClassToken()
+    parser.push_scope(class_token)
+    matched = parser.eval_parser(parser.get_grammar('class'), class_token)
+    parser.pop_scope(class_token, matched)
+    if (not matched or parser.position != len(parser.tokens)):
+      error('unable to parse body of class '+self.name)
+    ClassToken.members.__set__(self, class_token.members)
+    ClassToken.members_access.__set__(self, class_token.members_access)
+
+  @property
+  def members(self):
+    if (self.body_tokens != None):
+      self.expand()
+    return ClassToken.members.__get__(self)
+
+  @members.setter
+  def members(self, members):
+    ClassToken.members.__set__(self, members)
+
+  @property
+  def members_access(self):
+    if (self.body_tokens != None):
+      self.expand()
+    return ClassToken.members_access.__get__(self)
+
+  @members_access.setter
+  def members_access(self, members_access):
+    ClassToken.members_access.__set__(self, members_access)
+
+class OpaqueToken(Token):
+  '''Class member that was skipped without parsing, see CppParser 
+  skip_nonpublic'''
+  __slots__ = ('span',)
+  token_type = TokenType.cpp_opaque
+
+  def __init__(self):
+    self.span = None
 
 class FunctionToken(Token):
+  __slots__ = ('name','function_type','args','is_default','span')
+  token_type = TokenType.cpp_function
+
   def __init__(self):
     self.name = ''
-    self.function_type = Token() #type token
+    self.function_type = no_type #type token
     self.args = [] #list of variable tokens
     self.is_default = False
-    self.token_type = TokenType.cpp_function
-    self.current_type = Token() #type assigned to new vars
+    self.span = None
 
 class NamespaceToken(Token):
+  __slots__ = ('name','members','span')
+  token_type = TokenType.cpp_namespace
+
   def __init__(self):
     self.name = ''
     self.members = [] #list of tokens
-    self.token_type = TokenType.cpp_namespace
-    self.current_type = Token() #type assigned to new vars
+    self.span = None
 
 class TypeToken(Token):
+  __slots__ = ('base_type','signed','cv_qualifier','templates','argtypes',
+      'key')
+  token_type = TokenType.cpp_type
+
   def __init__(self):
     self.base_type = 'int' #default ex. signed
     self.signed = ''
     self.cv_qualifier = ''
     self.templates = [] #list of type tokens
     self.argtypes = [] #list of type tokens
-    self.token_type = TokenType.cpp_type
+    self.key = None #set for canonical instances, see intern_type
+
+  def __reduce__(self):
+    '''Pickled and copied types are (re)interned'''
+    return (make_type, (self.base_type, self.signed, self.cv_qualifier,
+        tuple(self.templates), tuple(self.argtypes)))
+
+  def wrap(self, base_type):
+    '''Makes this token base_type<previous type>. The previous type is moved to
+    a new child node that shares its template and argument subtrees rather 
+    than copying them, so completed type nodes must not be modified'''
+    inner_type = TypeToken()
+    inner_type.base_type = self.base_type
+    inner_type.signed = self.signed
+    inner_type.cv_qualifier = self.cv_qualifier
+    inner_type.templates = self.templates
+    inner_type.argtypes = self.argtypes
+    self.base_type = base_type
+    self.signed = ''
+    self.cv_qualifier = ''
+    self.templates = [inner_type]
+    self.argtypes = []
+
+#canonical TypeToken instances by structure
+type_table = dict()
+
+def make_type(base_type, signed='', cv_qualifier='', templates=(), 
+    argtypes=()):
+  '''Returns the canonical TypeToken with the given fields. templates and 
+  argtypes must hold canonical TypeTokens. Canonical types are shared and 
+  must not be modified; they compare equal only if they are identical'''
+  key = (base_type, signed, cv_qualifier, tuple(templates), tuple(argtypes))
+  type_token = type_table.get(key)
+  if (type_token == None):
+    type_token = TypeToken()
+    type_token.base_type = base_type
+    type_token.signed = signed
+    type_token.cv_qualifier = cv_qualifier
+    type_token.templates = key[3]
+    type_token.argtypes = key[4]
+    type_token.key = key
+    type_table[key] = type_token
+  return type_token
+
+def intern_type(type_token):
+  '''Returns the canonical TypeToken structurally identical to type_token'''
+  if (type_token.key != None):
+    return type_token
+  return make_type(type_token.base_type, type_token.signed, 
+      type_token.cv_qualifier, 
+      [intern_type(template) for template in type_token.templates],
+      [intern_type(argtype) for argtype in type_token.argtypes])
 
 class VariableToken(Token):
+  __slots__ = ('name','variable_type','default','span')
+  token_type = TokenType.cpp_variable
+
   def __init__(self):
     self.name = ''
-    self.variable_type = Token() #type token
-    self.default = Token() #expression token
-    self.token_type = TokenType.cpp_variable
+    self.variable_type = no_type #type token
+    self.default = no_default #expression token
+    self.span = None
 
 class ExpressionToken(Token):
+  __slots__ = ('subexpression','literal_value','expression_type')
+  token_type = TokenType.cpp_expression
+
   def __init__(self):
     self.subexpression = [] #list of expression tokens
     self.literal_value = ''
     self.expression_type = ExpressionType.unimplemented
-    self.token_type = TokenType.cpp_expression
 
 class EnumToken(Token):
+  __slots__ = ('name','enums','enum_values','is_enum_class','span')
+  token_type = TokenType.cpp_enum
+
   def __init__(self):
     self.name = ''
     self.enums = []
     self.enum_values = []
     self.is_enum_class = False
-    self.token_type = TokenType.cpp_enum
+    self.span = None
+
+class ParseContext:
+  '''Parse-time state of a class, function, or namespace being parsed, kept
+  by the parser rather than in the token tree'''
+  __slots__ = ('current_type','current_access','start','statement_start',
+      'pending_key','pending_end','scope_name')
+
+  def __init__(self, start=0):
+    self.current_type = no_type #type assigned to new vars
+    self.current_access = 'public' #access assigned to new class members
+    self.start = start #index of first token, spans are counted from here
+    self.statement_start = start #index of first token of current statement
+    self.pending_key = None #subtree cache key of current statement
+    self.pending_end = 0 #expected end of current statement
+    self.scope_name = '' #qualified name of class or namespace body
+
+def get_type_string(type_token):
+  '''Returns debugging string for a type token'''
+  type_string = ''
+  if (type_token.signed == 'unsigned'):
+    type_string += 'unsigned '
+  type_string += type_token.base_type
+  if len(type_token.templates)>0:
+    type_string += ('<'+''.join([get_type_string(template)+',' 
+        for template in type_token.templates])+'>')
+  if len(type_token.argtypes)>0:
+    type_string += ('('+''.join([get_type_string(argtype)+','
+        for argtype in type_token.argtypes])+')')
+  return type_string
+
+def get_expression_string(expression_token):
+  '''Returns debugging string for an expression token'''
+  return (expression_token.literal_value+'['+''.join([
+      get_expression_string(subexpression)+',' 
+      for subexpression in expression_token.subexpression])+']')
+
+def get_variable_string(variable_token):
+  '''Returns debugging string for a variable token'''
+  variable_string = 'variable '
+  if (variable_token.variable_type.token_type == TokenType.cpp_type):
+    variable_string += get_type_string(variable_token.variable_type)
+  variable_string += ' '+variable_token.name
+  if (variable_token.default.token_type == TokenType.cpp_expression):
+    variable_string += ' = '+get_expression_string(variable_token.default)
+  return variable_string
 
 def traverse_token(token):
   '''Debugging function that traverses a token tree with top-level token and 
   prints structure'''
-  if (token.token_type == TokenType.cpp_class):
-    print('class '+token.name)
-    subtoken_idx = 0
-    for subtoken in token.members:
-      print(token.members_access[subtoken_idx],end=' ')
-      traverse_token(subtoken)
-      print(', ')
-      subtoken_idx += 1
-    print('] (end class '+token.name+')')
-  elif (token.token_type == TokenType.cpp_enum):
-    print('enum ', end='')
-    if (token.is_enum_class):
-      print('class ',end='')
-    print('[', end='')
-    for enum in token.enums:
-      print(','+enum)
-    print(']')
-  elif (token.token_type == TokenType.cpp_function):
-    print('function '+token.name)
-    print('type: ',end='')
-    traverse_token(token.function_type)
-    print(', args: [')
-    for subtoken in token.args:
-      traverse_token(subtoken)
-      print(', ',end='')
-    print(']')
-  elif (token.token_type == TokenType.cpp_namespace):
-    print('namespace '+token.name)
-    print('members: [')
-    for subtoken in token.members:
-      traverse_token(subtoken)
-      print(', ')
-    print('] (end namespace '+token.name+')')
-  elif (token.token_type == TokenType.cpp_type):
-    if (token.signed == 'unsigned'):
-      print('unsigned ',end='')
-    print(token.base_type, end='')
-    if len(token.templates)>0:
-      print('<',end='')
-      for subtoken in token.templates:
-        traverse_token(subtoken)
-        print(',',end='')
-      print('>',end='')
-    if len(token.argtypes)>0:
-      print('(',end='')
-      for subtoken in token.argtypes:
-        traverse_token(subtoken)
-        print(',',end='')
-      print(')',end='')
-  elif (token.token_type == TokenType.cpp_variable):
-    print('variable ',end='')
-    traverse_token(token.variable_type)
-    print(' '+token.name,end='')
-    if token.default.token_type == TokenType.cpp_expression:
-      print(' = ',end='')
-      traverse_token(token.default)
-  elif (token.token_type == TokenType.cpp_expression):
-    print(token.literal_value+'[',end='')
-    for subtoken in token.subexpression:
-      traverse_token(token.subexpression)
-    print(']',end='')
-  else:
-    print('{unknown token}',end='')
+  gb_visitor.TokenPrinter().walk(token)
+
+class TypeRegistry:
+  '''Set of C++ type names recognized by the parser. Supports O(1) lookup, 
+  lookup of names by enclosing namespace for using directives, and nested 
+  scopes that share their parent's contents until a type is added'''
+
+  def __init__(self, type_list=None):
+    self.types = set()
+    self.namespace_index = dict() #namespace -> frozenset of relative names
+    self.defined = [] #names declared in current scope
+    self.owned = True #false until current scope copies its parent's contents
+    self.scope_stack = []
+    if (type_list != None):
+      self.add_types(type_list)
+
+  def __contains__(self, type_name):
+    return type_name in self.types
+
+  def __iter__(self):
+    return iter(self.types)
+
+  def __len__(self):
+    return len(self.types)
+
+  def copy_on_write(self):
+    '''Copies contents shared with the enclosing scope before modification'''
+    if (not self.owned):
+      self.types = set(self.types)
+      self.namespace_index = dict(self.namespace_index)
+      self.owned = True
+
+  def add(self, type_name, declared=True):
+    '''Add a type name to the current scope. Declared names are requalified 
+    into the enclosing scope when the current scope is popped'''
+    if (declared):
+      self.defined.append(type_name)
+    if (type_name in self.types):
+      return
+    self.copy_on_write()
+    self.types.add(type_name)
+    split_name = type_name.split('::')
+    for split_idx in range(1,len(split_name)):
+      namespace = '::'.join(split_name[:split_idx])
+      self.namespace_index[namespace] = (self.namespace_index.get(namespace,
+          frozenset()) | {'::'.join(split_name[split_idx:])})
+
+  def add_types(self, type_list):
+    '''Add a list of type names to the current scope'''
+    for type_name in type_list:
+      self.add(type_name)
+
+  def use_namespace(self, namespace):
+    '''Make names in namespace visible without qualification in the current 
+    scope'''
+    for type_name in self.namespace_index.get(namespace, frozenset()):
+      self.add(type_name, False)
+
+  def push_scope(self):
+    '''Enter a new scope, ex. a namespace or class body'''
+    self.scope_stack.append((self.types, self.namespace_index, self.defined,
+        self.owned))
+    self.defined = []
+    self.owned = False
+
+  def snapshot(self):
+    '''Returns a registry of the names currently visible that shares contents
+    with this one until either is modified'''
+    registry = TypeRegistry()
+    registry.types = self.types
+    registry.namespace_index = self.namespace_index
+    registry.owned = False
+    self.owned = False
+    self.scope_stack = [(types, namespace_index, defined, 
+        owned and types is not self.types) for (types, namespace_index, 
+        defined, owned) in self.scope_stack]
+    return registry
+
+  def pop_scope(self, qualifier=''):
+    '''Leave current scope, discarding its names. If qualifier is not empty, 
+    names declared in the scope are added to the enclosing scope as 
+    qualifier::name'''
+    defined = self.defined
+    (self.types, self.namespace_index, self.defined, 
+        self.owned) = self.scope_stack.pop()
+    if (qualifier != ''):
+      for type_name in defined:
+        self.add(qualifier+'::'+type_name)
+    return defined
+
+def find_closing_bracket(tokens, position):
+  '''Returns index of the bracket closing the (, [, or { at position, or 
+  len(tokens) if it is not closed'''
+  depth = 0
+  for token_idx in range(position, len(tokens)):
+    token = tokens[token_idx]
+    if (token == '(' or token == '[' or token == '{'):
+      depth += 1
+    elif (token == ')' or token == ']' or token == '}'):
+      depth -= 1
+      if (depth == 0):
+        return token_idx
+  return len(tokens)
 
 class CppParser(Parser):
   '''Class implementing a basic C++ parser'''
 
-  def __init__(self, token_list):
-    '''See Parser.__init__'''
+  scoped_token_types = frozenset(('class','function','namespace'))
+  grammar_token_types = ('class','declaration','enum','expression',
+      'function','global','namespace','type','variable')
+
+  def __init__(self, token_list, prescan_types=False, lazy_classes=False,
+      class_filter=None, skip_nonpublic=False, subtree_cache=None):
+    '''See Parser.__init__. If prescan_types is true, types declared in 
+    token_list are registered before evaluation. If lazy_classes is true, 
+    class bodies are skipped and parsed on first access to their members. 
+    class_filter may then list class names or glob patterns; bodies of other
+    classes are never parsed and their members stay empty. If 
+    skip_nonpublic is true, private and protected class members are not 
+    parsed and are recorded as OpaqueTokens. subtree_cache may be a
+    gb_subtree_cache.SubtreeCache from which function, variable, and enum
+    declarations are reused'''
     self.inner_parentheses = 0
-    self.available_types = ['bool','char','short','int','long','long long',
-        'float','double','void']
+    self.available_types = TypeRegistry(['bool','char','short','int','long',
+        'long long','float','double','void'])
+    self.context_stack = [] #ParseContext of each class/function/namespace
+    self.prescan_types = prescan_types
+    self.lazy_classes = lazy_classes
+    self.class_filter = class_filter
+    self.skip_nonpublic = skip_nonpublic
+    self.subtree_cache = subtree_cache
+    #options passed on to parsers of lazy class bodies
+    self.class_body_options = {'lazy_classes' : True, 
+        'class_filter' : class_filter, 'skip_nonpublic' : skip_nonpublic,
+        'subtree_cache' : subtree_cache}
+    self.released_tokens = 0 #tokens dropped by iter_declarations
     Parser.__init__(self, token_list)
 
   def add_types(self, type_list):
     '''Add additional C++ types to be recognized'''
-    self.available_types += type_list
+    self.available_types.add_types(type_list)
+
+  def finish_token(self, py_token):
+    '''Replace completed types with their canonical instance'''
+    if (py_token.token_type == TokenType.cpp_type):
+      return intern_type(py_token)
+    return py_token
+
+  def push_scope(self, py_token):
+    '''Open parse context for a class, function, or namespace and a type 
+    scope for a class or namespace body'''
+    self.context_stack.append(ParseContext(self.get_token_index()))
+    if (py_token.token_type != TokenType.cpp_function):
+      self.available_types.push_scope()
+
+  def pop_scope(self, py_token, matched):
+    '''Close parse context and type scope, keeping type aliases of a class or
+    namespace body visible as qualified names if the body was parsed'''
+    self.context_stack.pop()
+    if (py_token.token_type == TokenType.cpp_function):
+      return
+    if (matched):
+      self.available_types.pop_scope(py_token.name)
+    else:
+      self.available_types.pop_scope()
+
+  def get_token_index(self):
+    '''Returns index of the current token in the original token list'''
+    return self.released_tokens+self.position
+
+  def end_statement(self, py_token, end):
+    '''Ends statement of the current class or namespace before token index 
+    end, setting the span of members of py_token declared by it'''
+    context = self.context_stack[-1]
+    span = (context.statement_start-context.start, end-context.start)
+    member_idx = len(py_token.members)-1
+    while (member_idx >= 0 and py_token.members[member_idx].span == None):
+      py_token.members[member_idx].span = span
+      member_idx -= 1
+    context.statement_start = end
+    if (context.pending_key != None):
+      members = tuple(py_token.members[member_idx+1:])
+      if (end == context.pending_end and all([member.token_type in 
+          cacheable_token_types for member in members])):
+        self.subtree_cache.store(context.pending_key, members)
+      context.pending_key = None
+
+  def find_statement_end(self):
+    '''Returns index of the last token of the statement starting at the 
+    current position, a ; or a closing brace not followed by ;, using a 
+    balanced bracket scan. Returns len(self.tokens) if there is none'''
+    depth = 0
+    end_idx = self.position
+    while (end_idx < len(self.tokens)):
+      token = self.tokens[end_idx]
+      if (token == '(' or token == '[' or token == '{'):
+        depth += 1
+      elif (token == ')' or token == ']' or token == '}'):
+        depth -= 1
+        if (depth < 0):
+          return len(self.tokens)
+        if (depth == 0 and token == '}' 
+            and string_at_or_empty(self.tokens, end_idx+1) != ';'):
+          return end_idx
+      elif (depth == 0 and token == ';'):
+        return end_idx
+      end_idx += 1
+    return end_idx
 
   def exec_callback(self, py_token, param_name, param_value):
     '''Set parameter of token and return true, or return false if param_value
     incompatible with param_name'''
-    if (param_name == 'accessmodifier'):
-      if (param_value == 'public' or param_value == 'protected' 
-          or param_value == 'private'):
-        py_token.current_access = param_value
-        return True
-      return False
-    elif (param_name == 'arg'):
-      param_value.variable_type = py_token.current_type
-      py_token.args.append(param_value)
-      return True
-    elif (param_name == 'argtype'):
-      py_token.argtypes.append(param_value)
+    return self.get_callback(param_name)(py_token, param_value)
+
+  def get_callback(self, param_name):
+    '''Returns the callback_<param_name> method handling param_name'''
+    callback = getattr(self, 'callback_'+param_name, None)
+    if (callback == None):
+      error('unknown parameter name '+param_name)
+      return self.callback_unknown
+    return callback
+
+  def callback_unknown(self, py_token, param_value):
+    return False
+
+  def callback_accessmodifier(self, py_token, param_value):
+    if (param_value in access_modifiers):
+      self.context_stack[-1].current_access = param_value
       return True
-    elif (param_name == 'charliteral'):
-      if (re.fullmatch('\'.*\'',param_value) != None):
-        py_token.literal_value = param_value
-        py_token.expression_type = ExpressionType.char_literal
-        return True
+    return False
+
+  def callback_arg(self, py_token, param_value):
+    param_value.variable_type = self.context_stack[-1].current_type
+    py_token.args.append(param_value)
+    return True
+
+  def callback_argtype(self, py_token, param_value):
+    py_token.argtypes.append(param_value)
+    return True
+
+  def callback_cachedstatement(self, py_token, param_value):
+    if (self.subtree_cache == None or param_value in uncached_statements):
       return False
-    elif (param_name == 'constructor'):
-      if (param_value in self.available_types):
-        py_token.name = '__init__'
-        init_type = TypeToken()
-        init_type.variable_type = param_value
-        py_token.function_type = init_type
-        return True
+    end_idx = self.find_statement_end()
+    if (end_idx == len(self.tokens)):
       return False
-    elif (param_name == 'cvqualifier'):
-      if (param_value == 'const' or param_value == 'volatile'):
-        py_token.cv_qualifier = param_value
-        return True
+    statement = self.tokens[self.position:end_idx+1]
+    key = self.subtree_cache.get_key(py_token.token_type.name, statement,
+        [token in self.available_types for token in statement])
+    members = self.subtree_cache.get(key)
+    context = self.context_stack[-1]
+    end = self.get_token_index()+end_idx+1-self.position
+    if (members == None):
+      #parse normally and store the result in end_statement
+      context.pending_key = key
+      context.pending_end = end
       return False
-    elif (param_name == 'default'):
-      py_token.default = param_value
+    for member in members:
+      member = copy.copy(member)
+      member.span = None
+      py_token.members.append(member)
+      if (py_token.token_type == TokenType.cpp_class):
+        py_token.members_access.append(context.current_access)
+    self.end_statement(py_token, end)
+    #skip to the last token of the statement, which the parser then moves past
+    self.position = end_idx
+    return True
+
+  def callback_charliteral(self, py_token, param_value):
+    if (char_literal_regex.fullmatch(param_value) != None):
+      py_token.literal_value = param_value
+      py_token.expression_type = ExpressionType.char_literal
       return True
-    elif (param_name == 'destructor'):
-      if (param_value in self.available_types):
-        py_token.name = '__del__'
-        destructor_type = TypeToken()
-        destructor_type.base_type = 'void'
-        py_token.function_type = destructor_type
-        return True
-      return False
-    elif (param_name == 'enum'):
-      if (re.fullmatch(r'[a-zA-Z_]\w*(?:::[a-zA-Z_]\w*)*',param_value) != None):
-        py_token.enums.append(param_value)
-        py_token.enum_values.append('')
-        return True
-      return False
-    elif (param_name == 'enumdefault'):
-      py_token.enum_values[-1] = param_value
+    return False
+
+  def callback_constructor(self, py_token, param_value):
+    if (param_value in self.available_types):
+      py_token.name = '__init__'
+      py_token.function_type = make_type(param_value)
       return True
-    elif (param_name == 'functionbody'):
-      if (param_value != ';'):
-        return True
-      return False
-    elif (param_name == 'functionconst'):
-      if (param_value == 'const'):
-        return True
-      return False
-    elif (param_name == 'functiondefault'):
-      if (param_value == 'default' or param_value == 'delete'):
-        py_token.is_default = True
-        return True
-      return False
-    elif (param_name == 'functiontypequalifier'):
-      if (param_value == 'inline' or param_value == 'virtual' or 
-          param_value == 'explicit' or param_value == 'friend' or
-          param_value == 'constexpr'):
-        return True
-      return False
-    elif (param_name == 'functiontype'):
-      py_token.function_type = param_value
+    return False
+
+  def callback_cvqualifier(self, py_token, param_value):
+    if (param_value in cv_qualifiers):
+      py_token.cv_qualifier = param_value
       return True
-    elif (param_name == 'initlist'):
-      py_token.subexpression.append(param_value)
-      py_token.expression_type = ExpressionType.initializer_list
+    return False
+
+  def callback_default(self, py_token, param_value):
+    py_token.default = param_value
+    return True
+
+  def callback_destructor(self, py_token, param_value):
+    if (param_value in self.available_types):
+      py_token.name = '__del__'
+      py_token.function_type = make_type('void')
       return True
-    elif (param_name == 'isenumclass'):
-      if (param_value == 'class'):
-        py_token.is_enum_class = True
-        return True
-      return False
-    elif (param_name == 'longtypename'):
-      if (param_value == 'int'):
-        py_token.base_type = 'long'
-        return True
-      elif (param_value == 'long'):
-        py_token.base_type = 'long long'
-        return True
-      elif (param_value == 'double'):
-        py_token.base_type = 'long double'
-        return True
-      return False
-    elif (param_name == 'member'):
-      if (py_token.token_type == TokenType.cpp_class):
-        py_token.members_access.append(py_token.current_access)
-      py_token.members.append(param_value)
+    return False
+
+  def callback_endaccessmodifier(self, py_token, param_value):
+    if (param_value == ':'):
+      self.end_statement(py_token, self.get_token_index()+1)
       return True
-    elif (param_name == 'membervar'):
-      param_value.variable_type = py_token.current_type
-      if (py_token.token_type == TokenType.cpp_class):
-        py_token.members_access.append(py_token.current_access)
-      py_token.members.append(param_value)
+    return False
+
+  def callback_endstatement(self, py_token, param_value):
+    if (param_value == ';'):
+      self.end_statement(py_token, self.get_token_index()+1)
       return True
-    elif (param_name == 'name'):
-      if (re.fullmatch(r'[a-zA-Z_]\w*(?:::[a-zA-Z_]\w*)*',param_value) != None):
-        py_token.name = param_value
-        return True
-      return False
-    elif (param_name == 'namelessarg'):
-      new_arg = VariableToken()
-      new_arg.variable_type = param_value
-      new_arg.name = '__nameless__'
-      py_token.args.append(new_arg)
+    return False
+
+  def callback_enum(self, py_token, param_value):
+    if (name_regex.fullmatch(param_value) != None):
+      py_token.enums.append(param_value)
+      py_token.enum_values.append('')
       return True
-    elif (param_name == 'numericliteral'):
-      if (re.fullmatch(r'\d+(?:\.\d*)?(?:e(?:\+\-)?\d+)?',param_value) != None):
-        py_token.literal_value = param_value
-        py_token.expression_type = ExpressionType.numeric_literal
-        return True
-      return False
-    elif (param_name == 'operatorname'):
-      if (param_value in operator_names):
-        py_token.name = operator_names[param_value]
-        return True
-      elif (param_value in half_operator_names):
-        py_token.name = half_operator_names[param_value]
-        return True
-      return False
-    elif (param_name == 'operatornametwo'):
-      if (py_token.name == '__parentheses__'):
-        if (param_value == ')'):
-          return True
-      elif (py_token.name == '__brackets__'):
-        if (param_value == ']'):
-          return True
-      elif (py_token.name == '__arrow__'):
-        if (param_value == '*'):
-          py_token.name = '__arrowref__'
-          return True
-      elif (py_token.name == '__gt__'):
-        if (param_value == '>'):
-          py_token.name = '__rshift__'
-          return True
-      return False
-    elif (param_name == 'parentaccess'):
-      py_token.parents_access.append(param_value)
+    return False
+
+  def callback_enumdefault(self, py_token, param_value):
+    py_token.enum_values[-1] = param_value
+    return True
+
+  def callback_functionbody(self, py_token, param_value):
+    return (param_value != ';')
+
+  def callback_functionconst(self, py_token, param_value):
+    return (param_value == 'const')
+
+  def callback_functiondefault(self, py_token, param_value):
+    if (param_value in function_defaults):
+      py_token.is_default = True
       return True
-    elif (param_name == 'parent'):
-      py_token.parents.append(param_value)
+    return False
+
+  def callback_functiontypequalifier(self, py_token, param_value):
+    return (param_value in function_type_qualifiers)
+
+  def callback_functiontype(self, py_token, param_value):
+    py_token.function_type = param_value
+    return True
+
+  def callback_initlist(self, py_token, param_value):
+    py_token.subexpression.append(param_value)
+    py_token.expression_type = ExpressionType.initializer_list
+    return True
+
+  def callback_isenumclass(self, py_token, param_value):
+    if (param_value == 'class'):
+      py_token.is_enum_class = True
       return True
-    elif (param_name == 'passqualifier'):
-      if (param_value == '&' or param_value == '&&'):
-        return True
+    return False
+
+  def callback_lazyclassbody(self, py_token, param_value):
+    if (param_value != '{' or type(py_token) is not LazyClassToken):
       return False
-    elif (param_name == 'pointer'):
-      if (param_value == '*'):
-        new_py_token = copy.deepcopy(py_token)
-        py_token.base_type = 'pointer'
-        py_token.cv_qualifier = ''
-        py_token.signed = ''
-        py_token.templates = [new_py_token]
-        py_token.argtypes = []
-        return True
+    close_idx = find_closing_bracket(self.tokens, self.position)
+    if (close_idx == len(self.tokens)):
       return False
-    elif (param_name == 'signedqualifier'):
-      if (param_value == 'signed'):
-        return True
-      if (param_value == 'unsigned'):
-        py_token.signed = 'unsigned'
-        return True
-      return False
-    elif (param_name == 'shorttypename'):
-      if (param_value == 'int'):
-        py_token.base_type = 'short'
+    #types declared in the body are still visible as ClassName::type
+    self.available_types.add_types(gb_type_scanner.scan_types(
+        self.tokens[self.position+1:close_idx]))
+    if (self.class_filter == None or any([fnmatch.fnmatchcase(py_token.name, 
+        pattern) for pattern in self.class_filter])):
+      class_start = self.context_stack[-1].start-self.released_tokens
+      py_token.body_tokens = self.tokens[class_start:close_idx+1]
+      py_token.body_types = self.available_types.snapshot()
+      py_token.parser_options = self.class_body_options
+    #skip to the closing brace, which the parser then moves past
+    self.position = close_idx
+    return True
+
+  def callback_longtypename(self, py_token, param_value):
+    if (param_value in long_type_names):
+      py_token.base_type = long_type_names[param_value]
+      return True
+    return False
+
+  def callback_member(self, py_token, param_value):
+    if (py_token.token_type == TokenType.cpp_class):
+      py_token.members_access.append(self.context_stack[-1].current_access)
+    py_token.members.append(param_value)
+    if (param_value.token_type == TokenType.cpp_namespace):
+      #namespace definitions are not followed by ;
+      self.end_statement(py_token, self.get_token_index())
+    return True
+
+  def callback_membervar(self, py_token, param_value):
+    param_value.variable_type = self.context_stack[-1].current_type
+    if (py_token.token_type == TokenType.cpp_class):
+      py_token.members_access.append(self.context_stack[-1].current_access)
+    py_token.members.append(param_value)
+    return True
+
+  def callback_name(self, py_token, param_value):
+    if (name_regex.fullmatch(param_value) != None):
+      py_token.name = param_value
+      return True
+    return False
+
+  def callback_namelessarg(self, py_token, param_value):
+    new_arg = VariableToken()
+    new_arg.variable_type = param_value
+    new_arg.name = '__nameless__'
+    py_token.args.append(new_arg)
+    return True
+
+  def callback_numericliteral(self, py_token, param_value):
+    if (numeric_literal_regex.fullmatch(param_value) != None):
+      py_token.literal_value = param_value
+      py_token.expression_type = ExpressionType.numeric_literal
+      return True
+    return False
+
+  def callback_openbody(self, py_token, param_value):
+    if (param_value == '{'):
+      context = self.context_stack[-1]
+      context.statement_start = self.get_token_index()+1
+      #types declared in the body are registered qualified, ex. by 
+      #gb_type_scanner, and visible unqualified only within it
+      context.scope_name = py_token.name
+      if (len(self.context_stack) > 1 
+          and self.context_stack[-2].scope_name != ''):
+        context.scope_name = (self.context_stack[-2].scope_name+'::'
+            +py_token.name)
+      self.available_types.use_namespace(context.scope_name)
+      return True
+    return False
+
+  def callback_operatorname(self, py_token, param_value):
+    if (param_value in operator_names):
+      py_token.name = operator_names[param_value]
+      return True
+    elif (param_value in half_operator_names):
+      py_token.name = half_operator_names[param_value]
+      return True
+    return False
+
+  def callback_operatornametwo(self, py_token, param_value):
+    if (py_token.name == '__parentheses__'):
+      if (param_value == ')'):
         return True
-      return False
-    elif (param_name == 'storagequalifier'):
-      if (param_value == 'static' or param_value == 'thread_local' or
-          param_value == 'extern' or param_value == 'mutable'):
+    elif (py_token.name == '__brackets__'):
+      if (param_value == ']'):
         return True
-      return False
-    elif (param_name == 'stringliteral'):
-      if (re.fullmatch(r'".*"',param_value) != None):
-        py_token.literal_value = param_value
-        py_token.expression_type = ExpressionType.string_literal
+    elif (py_token.name == '__arrow__'):
+      if (param_value == '*'):
+        py_token.name = '__arrowref__'
         return True
-      return False
-    elif (param_name == 'subtype'):
-      if (param_value in self.available_types):
-        new_py_token = copy.deepcopy(py_token)
-        py_token.base_type = param_value
-        py_token.cv_qualifier = ''
-        py_token.signed = ''
-        py_token.templates = [new_py_token]
-        py_token.argtypes = []
+    elif (py_token.name == '__gt__'):
+      if (param_value == '>'):
+        py_token.name = '__rshift__'
         return True
-      return False
-    elif (param_name == 'template'):
-      py_token.templates.append(param_value)
+    return False
+
+  def callback_parentaccess(self, py_token, param_value):
+    py_token.parents_access.append(param_value)
+    return True
+
+  def callback_parent(self, py_token, param_value):
+    py_token.parents.append(param_value)
+    return True
+
+  def callback_passqualifier(self, py_token, param_value):
+    return (param_value in pass_qualifiers)
+
+  def callback_pointer(self, py_token, param_value):
+    if (param_value == '*'):
+      py_token.wrap('pointer')
       return True
-    elif (param_name == 'typealias'):
-      if (re.fullmatch(r'[a-zA-Z_]\w*(?:::[a-zA-Z_]\w*)*',param_value) != None):
-        self.available_types.append(param_value)
-        return True
+    return False
+
+  def callback_signedqualifier(self, py_token, param_value):
+    if (param_value == 'signed'):
+      return True
+    if (param_value == 'unsigned'):
+      py_token.signed = 'unsigned'
+      return True
+    return False
+
+  def callback_shorttypename(self, py_token, param_value):
+    if (param_value == 'int'):
+      py_token.base_type = 'short'
+      return True
+    return False
+
+  def callback_storagequalifier(self, py_token, param_value):
+    return (param_value in storage_qualifiers)
+
+  def callback_skipmember(self, py_token, param_value):
+    if (not self.skip_nonpublic 
+        or self.context_stack[-1].current_access == 'public'
+        or param_value in access_modifiers or param_value == 'using'
+        or param_value == '}'):
       return False
-    elif (param_name == 'typename'):
-      if (param_value in self.available_types):
-        py_token.base_type = param_value
-        return True
+    end_idx = self.find_statement_end()
+    if (end_idx == len(self.tokens)):
       return False
-    elif (param_name == 'unknownexpression'):
-      if (param_value == '('):
-        self.inner_parentheses += 1
-        return True
-      if (param_value != ';'):
-        if (param_value == ',' and self.inner_parentheses == 0):
+    #types declared by skipped members, ex. private nested classes
+    self.available_types.add_types(gb_type_scanner.scan_types(
+        self.tokens[self.position:end_idx+1]))
+    py_token.members.append(OpaqueToken())
+    py_token.members_access.append(self.context_stack[-1].current_access)
+    self.end_statement(py_token, self.get_token_index()+end_idx+1
+        -self.position)
+    #skip to the last token of the member, which the parser then moves past
+    self.position = end_idx
+    return True
+
+  def callback_stringliteral(self, py_token, param_value):
+    if (string_literal_regex.fullmatch(param_value) != None):
+      py_token.literal_value = param_value
+      py_token.expression_type = ExpressionType.string_literal
+      return True
+    return False
+
+  def callback_subtype(self, py_token, param_value):
+    if (param_value in self.available_types):
+      py_token.wrap(param_value)
+      return True
+    return False
+
+  def callback_template(self, py_token, param_value):
+    py_token.templates.append(param_value)
+    return True
+
+  def callback_typealias(self, py_token, param_value):
+    if (name_regex.fullmatch(param_value) != None):
+      self.available_types.add(param_value)
+      return True
+    return False
+
+  def callback_typename(self, py_token, param_value):
+    if (param_value in self.available_types):
+      py_token.base_type = param_value
+      return True
+    return False
+
+  def callback_unknownexpression(self, py_token, param_value):
+    if (param_value == '('):
+      self.inner_parentheses += 1
+      return True
+    if (param_value != ';'):
+      if (param_value == ',' and self.inner_parentheses == 0):
+        return False
+      if (param_value == ')'):
+        if (self.inner_parentheses == 0):
           return False
-        if (param_value == ')'):
-          if (self.inner_parentheses == 0):
-            return False
-          else:
-            self.inner_parentheses -= 1
-        return True
-      return False
-    elif (param_name == 'usenamespace'):
-      if (re.fullmatch(r'[a-zA-Z_]\w*(?:::[a-zA-Z_]\w*)*',param_value) != None):
-        for typename in self.available_types:
-          if (re.fullmatch(param_value+'::.*',typename) != None):
-            self.available_types.append(typename[(len(param_value)+2):])
-        return True
-      return False
-    elif (param_name == 'usetype'):
+        else:
+          self.inner_parentheses -= 1
       return True
-    elif (param_name == 'vartype'):
-      py_token.current_type = param_value
+    return False
+
+  def callback_usenamespace(self, py_token, param_value):
+    if (name_regex.fullmatch(param_value) != None):
+      self.available_types.use_namespace(param_value)
       return True
-    elif (param_name == 'vertspecifier'):
-      if (param_value == 'final' or param_value == 'override'):
-        return True
-      return False
-    else:
-      error('unknown parameter name '+param_name)
+    return False
+
+  def callback_usetype(self, py_token, param_value):
+    return True
+
+  def callback_vartype(self, py_token, param_value):
+    self.context_stack[-1].current_type = param_value
+    return True
+
+  def callback_vertspecifier(self, py_token, param_value):
+    return (param_value in vert_specifiers)
  
   def make_token_by_type(self, token_type):
     '''Returns a new token of token_type'''
     if (token_type == 'class'):
+      if (self.lazy_classes):
+        return LazyClassToken()
       return ClassToken()
     elif (token_type == 'enum'):
       return EnumToken()
@@ -461,13 +912,15 @@ class CppParser(Parser):
     if (token_type == 'class'):
       return self.eval_token_regex_string(r'class <name> <vertspecifier> * '
           r'( : <parentaccess> '
-          r'<parent> ( , <parentaccess> <parent> ) * ) ? \{ ( ( '
-          r'<accessmodifier> : ) | ( [member:class] ; ) | ( '
-          r'[member:function] <vertspecifier> * ; ) | '
-          r'( [vartype:type] [membervar:variable] <vertspecifier> * ( , '
-          r'[membervar:variable] <vertspecifier> * '
-          r') * ; ) | ( [member:enum] ; ) | ( using <typealias> = '
-          r'[usetype:type] ; ) | ( using namespace <usenamespace> ; ) ) * \}')
+          r'<parent> ( , <parentaccess> <parent> ) * ) ? ( <lazyclassbody> | '
+          r'( <openbody> ( <skipmember> | <cachedstatement> | ( '
+          r'<accessmodifier> <endaccessmodifier> ) | ( [member:class] '
+          r'<endstatement> ) | ( [member:function] <vertspecifier> * '
+          r'<endstatement> ) | ( [vartype:type] [membervar:variable] '
+          r'<vertspecifier> * ( , [membervar:variable] <vertspecifier> * ) * '
+          r'<endstatement> ) | ( [member:enum] <endstatement> ) | ( using '
+          r'<typealias> = [usetype:type] <endstatement> ) | ( using namespace '
+          r'<usenamespace> <endstatement> ) ) * \} ) )')
     elif (token_type == 'enum'):
       return self.eval_token_regex_string(r'enum <isenumclass> ? <name> \{ '
           r'<enum> ( = <enumdefault> ) ? ( , <enum> ( = <enumdefault> ) ? ) * '
@@ -476,6 +929,15 @@ class CppParser(Parser):
       return self.eval_token_regex_string(r'<stringliteral> | <charliteral> | '
           r'<numericliteral> | ( \{ [initlist:expression] ? ( , '
           r'[initlist:expression] ) * \} )')
+    elif (token_type == 'declaration'):
+      return self.eval_token_regex_string(r'<cachedstatement> | '
+          r'[member:namespace] | ( [member:class] <endstatement> ) | ( '
+          r'[member:function] <endstatement> ) | ( [vartype:type] '
+          r'[membervar:variable] ( , [membervar:variable] ) * <endstatement> '
+          r') | ( [member:enum] <endstatement> )')
+    elif (token_type == 'global'):
+      #equivalent to ( declaration ) *
+      return [('any', [('block', self.get_grammar('declaration'))])]
     elif (token_type == 'function'):
       return self.eval_token_regex_string(r'( [functiontype:type] operator '
           r'<operatorname> <operatornametwo> ? ) | ( [functiontype:type] '
@@ -485,11 +947,13 @@ class CppParser(Parser):
           r'[namelessarg:type] ) * ) ? \) <functionconst> ? ( = '
           r'<functiondefault> ) ? ( \{ <functionbody> * \} ) ?')
     elif (token_type == 'namespace'):
-      return self.eval_token_regex_string(r'namespace <name> { ( '
-          r'[member:namespace] | ( [member:class] ; ) | ( [member:function] ; ) '
-          r'| ( [vartype:type] [membervar:variable] ( , [membervar:variable] ) '
-          r'* ; ) | ( [member:enum] ; ) | ( using <typealias> = [usetype:type] ; '
-          r') | ( using namespace <usenamespace> ; ) ) * }')
+      return self.eval_token_regex_string(r'namespace <name> <openbody> ( '
+          r'<cachedstatement> | [member:namespace] | ( [member:class] '
+          r'<endstatement> ) | ( [member:function] <endstatement> ) | ( '
+          r'[vartype:type] [membervar:variable] ( , [membervar:variable] ) * '
+          r'<endstatement> ) | ( [member:enum] <endstatement> ) | ( using '
+          r'<typealias> = [usetype:type] <endstatement> ) | ( using namespace '
+          r'<usenamespace> <endstatement> ) ) * }')
     elif (token_type == 'type'):
       return self.eval_token_regex_string(r'( ( <cvqualifier> | '
           r'<storagequalifier> | <signedqualifier> | <functiontypequalifier> '
@@ -507,13 +971,46 @@ class CppParser(Parser):
     error('Invalid token type received.')
     return []
 
+  def push_global_context(self):
+    '''Open parse context for top-level declarations, whose spans are counted
+    from the first token'''
+    context = ParseContext()
+    context.statement_start = self.get_token_index()
+    self.context_stack.append(context)
+
   def evaluate(self):
+    if (self.prescan_types):
+      self.add_types(gb_type_scanner.scan_types(self.tokens))
     global_token = NamespaceToken()
     global_token.name = 'Global'
-    global_regex = self.eval_token_regex_string(r'( '
-          r'[member:namespace] | ( [member:class] ; ) | ( [member:function] ; ) '
-          r'| ( [vartype:type] [membervar:variable] ( , [membervar:variable] ) * '
-          r'; ) | ( [member:enum] ; ) ) *')
-    self.eval_parser(global_regex, global_token)
+    self.push_global_context()
+    self.eval_parser(self.get_grammar('global'), global_token)
+    self.context_stack.pop()
     return global_token
 
+  def iter_declarations(self):
+    '''Generator that parses the tokens and yields each top-level class, 
+    function, enum, variable, or namespace as soon as it is complete, so no
+    global NamespaceToken is built. Tokens of completed declarations are
+    released from the parser once they make up half of its token list.
+    Stops at the end of the tokens or at the first declaration that can not
+    be parsed, where self.position is left'''
+    if (self.prescan_types):
+      self.add_types(gb_type_scanner.scan_types(self.tokens))
+    declaration_regex = self.get_grammar('declaration')
+    declaration_token = NamespaceToken()
+    self.push_global_context()
+    try:
+      while (self.position < len(self.tokens) 
+          and self.eval_parser(declaration_regex, declaration_token)):
+        if (self.position*2 >= len(self.tokens)):
+          self.released_tokens += self.position
+          self.tokens = self.tokens[self.position:]
+          self.position = 0
+        members = declaration_token.members
+        declaration_token.members = []
+        for member in members:
+          yield member
+    finally:
+      self.context_stack.pop()
+
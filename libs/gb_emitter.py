@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+#implements the destination that generated code is written to
+from gb_utils import *
+
+class Emitter:
+  '''Writes generated code straight to an open file, or collects it in a
+  list buffer if no file is given, so output is never copied while it is
+  being built'''
+
+  def __init__(self, output_file=None):
+    self.output_file = output_file
+    self.chunks = [] #list buffer, used if output_file is None
+    self.size = 0 #number of characters written
+
+  def write(self, *strings):
+    '''Appends strings to the output'''
+    string = ''.join(strings)
+    if (self.output_file != None):
+      self.output_file.write(string)
+    else:
+      self.chunks.append(string)
+    self.size += len(string)
+
+  def getvalue(self):
+    '''Returns contents of the list buffer'''
+    return ''.join(self.chunks)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+#implements incremental reparsing of edited C++ headers
+from gb_utils import *
+from gb_cpp_parser import CppParser, TokenType
+import gb_parallel
+import gb_type_scanner
+import copy
+
+def get_edit_bounds(old_tokens, new_tokens):
+  '''Returns (start, old end, new end) of the token range that differs
+  between old_tokens and new_tokens, or None if they are equal'''
+  min_length = min(len(old_tokens), len(new_tokens))
+  prefix = 0
+  while (prefix < min_length and old_tokens[prefix] == new_tokens[prefix]):
+    prefix += 1
+  if (prefix == len(old_tokens) and prefix == len(new_tokens)):
+    return None
+  suffix = 0
+  while (suffix < min_length-prefix
+      and old_tokens[-1-suffix] == new_tokens[-1-suffix]):
+    suffix += 1
+  return (prefix, len(old_tokens)-suffix, len(new_tokens)-suffix)
+
+def get_statements(scope_token):
+  '''Returns list of (span, first member index, end member index) for the
+  statements declaring the members of scope_token, or None if a member has
+  no span'''
+  statements = []
+  for member_idx in range(len(scope_token.members)):
+    span = scope_token.members[member_idx].span
+    if (span == None):
+      return None
+    if (len(statements) > 0 and statements[-1][0] == span):
+      statements[-1] = (span, statements[-1][1], member_idx+1)
+    else:
+      statements.append((span, member_idx, member_idx+1))
+  return statements
+
+def shift_span(token, delta):
+  '''Returns a shallow copy of token with its span moved by delta tokens'''
+  token = copy.copy(token)
+  token.span = (token.span[0]+delta, token.span[1]+delta)
+  return token
+
+class Reparser:
+  '''Reparses the declarations of an AST touched by one edit of its tokens'''
+
+  def __init__(self, old_tokens, new_tokens, edit_bounds, type_list):
+    self.old_tokens = old_tokens
+    self.new_tokens = new_tokens
+    (self.edit_start, self.old_edit_end, self.new_edit_end) = edit_bounds
+    self.delta = len(new_tokens)-len(old_tokens)
+    self.type_list = type_list
+    self.changed = [] #qualified names of changed declarations
+
+  def add_changed(self, scope_path, members):
+    '''Records names of members of the innermost scope in scope_path'''
+    prefix = ''.join([scope[0].name+'::' for scope in scope_path])
+    for member in members:
+      if (member.token_type == TokenType.cpp_opaque):
+        continue
+      name = prefix+member.name
+      if name not in self.changed:
+        self.changed.append(name)
+
+  def parse_region(self, scope_path, start, end, access):
+    '''Parses new_tokens[start:end] as members of the innermost scope in
+    scope_path, a list of (scope token, index of its first token) from the
+    outermost scope. Returns (members, members access) with spans relative
+    to the scope, or None if the region can not be parsed on its own'''
+    for region_span in gb_parallel.find_declaration_spans(self.new_tokens,
+        start, end):
+      if (self.new_tokens[region_span[0]] == 'using' 
+          or (region_span[1]-region_span[0] == 2 and self.new_tokens[
+          region_span[0]] in gb_parallel.access_modifiers)):
+        #directives that also apply to declarations after the region
+        return None
+    prefix = []
+    closer = []
+    wrappers = []
+    for scope_idx in range(len(scope_path)):
+      (scope_token, scope_start) = scope_path[scope_idx]
+      scope_span = (scope_start, scope_start+scope_token.span[1]
+          -scope_token.span[0]+self.delta)
+      scope_bounds = gb_parallel.get_scope_bounds(self.new_tokens, scope_span)
+      if (scope_bounds == None):
+        return None
+      (kind, name, open_idx, close_idx) = scope_bounds
+      if (scope_idx+1 < len(scope_path)):
+        body_end = scope_path[scope_idx+1][1]
+      else:
+        body_end = start
+      scope_prefix = self.new_tokens[scope_start:open_idx+1]
+      for body_span in gb_parallel.find_declaration_spans(self.new_tokens,
+          open_idx+1, body_end):
+        if (self.new_tokens[body_span[0]] == 'using'
+            and self.new_tokens[body_span[0]+1] == 'namespace'):
+          scope_prefix += self.new_tokens[body_span[0]:body_span[1]]
+      if (scope_idx+1 == len(scope_path) and kind == 'class'):
+        scope_prefix += [access, ':']
+      prefix += scope_prefix
+      closer = self.new_tokens[close_idx:scope_span[1]]+closer
+      wrappers.append((name, False, scope_span, len(scope_prefix)))
+    chunk_tokens = prefix+self.new_tokens[start:end]+closer
+    parser = CppParser(chunk_tokens)
+    parser.add_types(self.types)
+    chunk_token = parser.evaluate()
+    if (parser.position != len(chunk_tokens)):
+      return None
+    gb_parallel.fix_chunk_spans(chunk_token, start, wrappers)
+    for wrapper in wrappers:
+      if (len(chunk_token.members) != 1):
+        return None
+      chunk_token = chunk_token.members[0]
+    if (chunk_token.token_type == TokenType.cpp_class):
+      return chunk_token.members, chunk_token.members_access
+    return chunk_token.members, []
+
+  def find_region(self, scope_token, scope_start):
+    '''Returns (first member index, end member index, start, end, access 
+    member index) of the member declarations of scope_token, whose first 
+    token is at index scope_start, that cover the edit, or None if the edit 
+    touches tokens outside them. For an insertion between declarations, the 
+    range of members is empty and the access of the adjacent declaration 
+    applies to the inserted members'''
+    statements = get_statements(scope_token)
+    if (statements == None):
+      return None
+    spans = [(scope_start+statement[0][0], scope_start+statement[0][1])
+        for statement in statements]
+    if (self.edit_start == self.old_edit_end):
+      touched = [statement_idx for statement_idx in range(len(spans))
+          if (spans[statement_idx][0] < self.edit_start 
+          and spans[statement_idx][1] > self.edit_start)]
+      if (len(touched) == 0):
+        for statement_idx in range(len(spans)):
+          if (spans[statement_idx][1] == self.edit_start):
+            member_idx = statements[statement_idx][2]
+            return (member_idx, member_idx, self.edit_start, self.edit_start,
+                member_idx-1)
+          if (spans[statement_idx][0] == self.edit_start):
+            member_idx = statements[statement_idx][1]
+            return (member_idx, member_idx, self.edit_start, self.edit_start,
+                member_idx)
+        return None
+    else:
+      touched = [statement_idx for statement_idx in range(len(spans))
+          if (spans[statement_idx][0] < self.old_edit_end
+          and spans[statement_idx][1] > self.edit_start)]
+      if (len(touched) == 0):
+        return None
+    for statement_idx in touched[1:]:
+      if (spans[statement_idx-1][1] != spans[statement_idx][0]):
+        #edit covers tokens between declarations, ex. an access modifier
+        return None
+    region_start = spans[touched[0]][0]
+    region_end = spans[touched[-1]][1]
+    if (region_start > self.edit_start or region_end < self.old_edit_end):
+      return None
+    return (statements[touched[0]][1], statements[touched[-1]][2], 
+        region_start, region_end, statements[touched[0]][1])
+
+  def reparse_scope(self, scope_token, scope_start, scope_path):
+    '''Returns a copy of scope_token, whose first token is at index 
+    scope_start, with the declarations touched by the edit reparsed and other
+    members reused, or None if the edit is not within its member 
+    declarations'''
+    region = self.find_region(scope_token, scope_start)
+    if (region == None):
+      return None
+    (first_member, end_member, region_start, region_end, 
+        access_member) = region
+    new_scope_token = copy.copy(scope_token)
+    later_members = [shift_span(later_member, self.delta)
+        for later_member in scope_token.members[end_member:]]
+    if (end_member-first_member == 1 and region_start < self.edit_start
+        and self.old_edit_end < region_end):
+      #edit inside a single declaration, try reparsing a class or namespace 
+      #member by member
+      member = scope_token.members[first_member]
+      if (member.token_type in (TokenType.cpp_class, 
+          TokenType.cpp_namespace)):
+        new_member = self.reparse_scope(member, region_start, 
+            scope_path+[(member, region_start)])
+        if (new_member != None):
+          new_member.span = (member.span[0], member.span[1]+self.delta)
+          new_scope_token.members = (scope_token.members[:first_member]
+              +[new_member]+later_members)
+          return new_scope_token
+    is_class = (scope_token.token_type == TokenType.cpp_class)
+    access = ''
+    if (is_class):
+      access = scope_token.members_access[access_member]
+    parsed_region = self.parse_region(scope_path, region_start, 
+        region_end+self.delta, access)
+    if (parsed_region == None):
+      return None
+    (new_members, new_members_access) = parsed_region
+    self.add_changed(scope_path, scope_token.members[first_member:end_member])
+    self.add_changed(scope_path, new_members)
+    new_scope_token.members = (scope_token.members[:first_member]+new_members
+        +later_members)
+    if (is_class):
+      new_scope_token.members_access = (
+          scope_token.members_access[:first_member]+new_members_access
+          +scope_token.members_access[end_member:])
+    return new_scope_token
+
+  def reparse(self, old_ast):
+    '''Returns reparsed copy of old_ast'''
+    self.types = (self.type_list
+        +gb_type_scanner.scan_types(self.new_tokens))
+    new_ast = None
+    if (gb_type_scanner.scan_types(self.old_tokens)
+        == self.types[len(self.type_list):]):
+      new_ast = self.reparse_scope(old_ast, 0, [])
+    if (new_ast == None):
+      #edit changes declared types or is outside member declarations
+      parser = CppParser(self.new_tokens)
+      parser.add_types(self.types)
+      new_ast = parser.evaluate()
+      if (parser.position != len(self.new_tokens)):
+        error('unable to parse past token '+str(parser.position)+' of '
+            +str(len(self.new_tokens)))
+      self.add_changed([], old_ast.members)
+      self.add_changed([], new_ast.members)
+    return new_ast
+
+def reparse(old_ast, old_tokens, new_tokens, type_list=None):
+  '''Given the global NamespaceToken old_ast parsed from old_tokens, returns
+  (new AST, changed) for new_tokens, where changed lists the qualified names
+  of the declarations that were reparsed. Only the top-level or class member
+  declarations enclosing the edited tokens are reparsed; other subtrees of
+  old_ast are reused. old_ast is not modified. If the edit changes the
+  declared types or falls outside member declarations, ex. in an access
+  modifier, the enclosing scope or the whole header is reparsed instead'''
+  if (type_list == None):
+    type_list = []
+  edit_bounds = get_edit_bounds(old_tokens, new_tokens)
+  if (edit_bounds == None):
+    return old_ast, []
+  reparser = Reparser(old_tokens, new_tokens, edit_bounds, type_list)
+  new_ast = reparser.reparse(old_ast)
+  return new_ast, reparser.changed
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+#implements writing of generated files that leaves unchanged files untouched
+from gb_utils import *
+import hashlib
+import json
+import os
+import sys
+
+#constants
+MANIFEST_VERSION = 1
+
+def get_file_digest(filename):
+  '''Returns sha256 hex digest of the contents of filename, or None if it
+  does not exist'''
+  if not os.path.exists(filename):
+    return None
+  hasher = hashlib.sha256()
+  with open(filename, 'rb') as existing_file:
+    for block in iter(lambda: existing_file.read(1 << 16), b''):
+      hasher.update(block)
+  return hasher.hexdigest()
+
+class Manifest:
+  '''Record of the sha256 digest, size, and modification time of each output
+  file, saved as JSON. The recorded digest of a file is trusted while its size
+  and modification time are unchanged, so unchanged outputs need not be
+  reread'''
+
+  def __init__(self, filename=None):
+    '''If filename is not None, entries are loaded from and saved to it'''
+    self.filename = filename
+    self.entries = dict() #output filename -> dict with sha256, size, mtime_ns
+    if (filename != None and os.path.exists(filename)):
+      try:
+        with open(filename, 'r') as manifest_file:
+          manifest = json.load(manifest_file)
+        if (manifest.get('version') == MANIFEST_VERSION):
+          self.entries = manifest['outputs']
+      except Exception as exc:
+        debug('ignoring manifest '+filename+': '+str(exc))
+
+  def get_digest(self, filename):
+    '''Returns sha256 hex digest of output filename, or None if it does not
+    exist'''
+    entry = self.entries.get(filename)
+    if (entry != None and os.path.exists(filename)):
+      file_stat = os.stat(filename)
+      if (file_stat.st_size == entry['size']
+          and file_stat.st_mtime_ns == entry['mtime_ns']):
+        return entry['sha256']
+    return get_file_digest(filename)
+
+  def record(self, filename, digest):
+    '''Records digest of output filename as it is on disk'''
+    file_stat = os.stat(filename)
+    self.entries[filename] = {'sha256' : digest, 'size' : file_stat.st_size,
+        'mtime_ns' : file_stat.st_mtime_ns}
+
+  def save(self):
+    '''Writes entries to filename if they changed'''
+    if (self.filename == None):
+      return
+    output_file = OutputFile(self.filename)
+    output_file.write(json.dumps({'version' : MANIFEST_VERSION,
+        'outputs' : self.entries}, indent=2, sort_keys=True)+'\n')
+    output_file.close()
+
+class OutputFile:
+  '''File-like object for generated text. Contents are written to a temporary
+  file next to filename while being hashed; on close, filename is replaced
+  only if the contents differ, so its modification time is left alone when
+  the generated bytes are identical'''
+
+  def __init__(self, filename, manifest=None):
+    self.filename = filename
+    self.manifest = manifest
+    self.temp_filename = filename+'.tmp'+str(os.getpid())
+    self.temp_file = open(self.temp_filename, 'wb')
+    self.hasher = hashlib.sha256()
+    self.changed = None #set by close
+
+  def write(self, string):
+    data = string.encode('utf-8')
+    self.temp_file.write(data)
+    self.hasher.update(data)
+
+  def close(self):
+    '''Replaces filename if its contents changed, returns true if it was
+    replaced'''
+    if (self.changed != None):
+      return self.changed
+    self.temp_file.close()
+    digest = self.hasher.hexdigest()
+    if (self.manifest != None):
+      old_digest = self.manifest.get_digest(self.filename)
+    else:
+      old_digest = get_file_digest(self.filename)
+    self.changed = (digest != old_digest)
+    if self.changed:
+      os.replace(self.temp_filename, self.filename)
+    else:
+      os.remove(self.temp_filename)
+    if (self.manifest != None):
+      self.manifest.record(self.filename, digest)
+    return self.changed
+
+  def discard(self):
+    '''Removes the temporary file without touching filename'''
+    self.temp_file.close()
+    if os.path.exists(self.temp_filename):
+      os.remove(self.temp_filename)
+    self.changed = False
+
+def get_generator_sources():
+  '''Returns sorted paths of the loaded generator modules, which generated
+  files depend on along with the headers'''
+  libs_dir = os.path.dirname(os.path.abspath(__file__))
+  sources = set()
+  for module in list(sys.modules.values()):
+    module_file = getattr(module, '__file__', None)
+    if (module_file != None and module_file.endswith('.py') and 
+        os.path.dirname(os.path.abspath(module_file)) == libs_dir):
+      sources.add(os.path.abspath(module_file))
+  return sorted(sources)
+
+def escape_depfile_path(path):
+  '''Returns path escaped for a Makefile-syntax depfile'''
+  return path.replace('$','$$').replace('#','\\#').replace(' ','\\ ')
+
+def write_depfile(filename, target, dependencies, manifest=None, 
+    phony_targets=False):
+  '''Writes Makefile-syntax depfile filename, readable by make and ninja, 
+  stating that target depends on dependencies. If phony_targets, an empty
+  rule is added for each dependency, as with gcc -MP, so make does not fail
+  when one is removed. Leaves filename untouched if unchanged, returns true
+  if it was written'''
+  output_file = OutputFile(filename, manifest)
+  output_file.write(escape_depfile_path(target)+':')
+  for dependency in dependencies:
+    output_file.write(' \\\n  '+escape_depfile_path(dependency))
+  output_file.write('\n')
+  if phony_targets:
+    for dependency in dependencies:
+      output_file.write('\n'+escape_depfile_path(dependency)+':\n')
+  return output_file.close()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+#implements parsing of multiple C++ headers in parallel worker processes
+from gb_utils import *
+from gb_cpp_parser import CppParser, NamespaceToken, TokenType
+import gb_lexer
+import gb_type_scanner
+import multiprocessing
+
+#type names shared by all headers, set in each worker by init_worker
+worker_types = []
+
+def init_worker(type_list):
+  '''Pool initializer that receives the merged type list once per worker'''
+  global worker_types
+  worker_types = type_list
+
+def parse_tokens(tokens, type_list):
+  '''Parses a list of C++ tokens with type_list registered and returns the
+  global NamespaceToken'''
+  parser = CppParser(tokens)
+  parser.add_types(type_list)
+  global_token = parser.evaluate()
+  if (parser.position != len(tokens)):
+    error('unable to parse past token '+str(parser.position)+' of '
+        +str(len(tokens)))
+  return global_token
+
+def parse_file(filename, type_list=None):
+  '''Tokenizes and parses a header and returns the global NamespaceToken'''
+  if (type_list == None):
+    type_list = []
+  return parse_tokens(gb_lexer.tokenize_file_cpp(filename), type_list)
+
+def parse_file_worker(filename):
+  '''Worker function parsing filename with the types sent to init_worker'''
+  return parse_file(filename, worker_types)
+
+def merge_namespaces(namespace_tokens, header_indices=None, name='Global'):
+  '''Returns a NamespaceToken named name containing the members of 
+  namespace_tokens in order, where namespace_tokens[i] was parsed from header
+  header_indices[i], by default each from its own header. A namespace from a
+  later header is merged recursively into the first occurrence of a 
+  namespace with the same name from an earlier header. Namespaces repeated 
+  within one header are kept separate, as CppParser.evaluate leaves them, so
+  a single header gives exactly its own tree. Spans stay relative to the 
+  header each token was parsed from: a merged namespace has the span of its
+  first occurrence, while members merged into it from later headers have 
+  spans relative to the namespace in their own header'''
+  if (header_indices == None):
+    header_indices = list(range(len(namespace_tokens)))
+  if (len(namespace_tokens) == 1):
+    return namespace_tokens[0]
+  merged_token = NamespaceToken()
+  merged_token.name = name
+  merged_token.span = namespace_tokens[0].span
+  groups = [] #(position in merged_token.members, tokens, header indices)
+  first_groups = dict() #name -> first group of that name
+  for token_idx in range(len(namespace_tokens)):
+    header_idx = header_indices[token_idx]
+    for member in namespace_tokens[token_idx].members:
+      if (member.token_type == TokenType.cpp_namespace):
+        group = first_groups.get(member.name)
+        if (group == None or group[2][0] == header_idx):
+          group = (len(merged_token.members), [], [])
+          merged_token.members.append(None)
+          groups.append(group)
+          if member.name not in first_groups:
+            first_groups[member.name] = group
+        group[1].append(member)
+        group[2].append(header_idx)
+      else:
+        merged_token.members.append(member)
+  for (position, group_tokens, group_header_indices) in groups:
+    merged_token.members[position] = merge_namespaces(group_tokens,
+        group_header_indices, group_tokens[0].name)
+  return merged_token
+
+def parse_files(filenames, jobs=1, type_list=None):
+  '''Parses headers in filenames using jobs worker processes and returns a
+  single global NamespaceToken with the contents of every header in the order
+  of filenames. Types declared anywhere in filenames are collected in a
+  first pass and registered, along with type_list, for every header. 
+  Namespaces are merged across headers as in merge_namespaces, so spans are
+  only meaningful relative to the header a declaration came from. If jobs
+  is None, one worker per CPU is used'''
+  if (type_list == None):
+    type_list = []
+  all_types = type_list+gb_type_scanner.scan_header_types(filenames)
+  if (jobs == None):
+    jobs = multiprocessing.cpu_count()
+  if (jobs <= 1 or len(filenames) <= 1):
+    global_tokens = [parse_file(filename, all_types) for filename in filenames]
+  else:
+    with multiprocessing.Pool(min(jobs, len(filenames)),
+        initializer=init_worker, initargs=(all_types,)) as pool:
+      global_tokens = pool.map(parse_file_worker, filenames, chunksize=1)
+  return merge_namespaces(global_tokens)
+
+#access modifiers that end a declaration span when followed by :
+access_modifiers = frozenset(('public','protected','private'))
+
+def find_declaration_spans(tokens, start, end):
+  '''Makes one pass over tokens[start:end] tracking brace and parenthesis 
+  depth and returns a list of (start, end) index pairs of the declarations at
+  depth 0. Access modifiers such as public: are returned as separate spans'''
+  spans = []
+  brace_depth = 0
+  paren_depth = 0
+  span_start = start
+  for token_idx in range(start, end):
+    token = tokens[token_idx]
+    if (token == '('):
+      paren_depth += 1
+    elif (token == ')'):
+      paren_depth -= 1
+    elif (token == '{'):
+      brace_depth += 1
+    elif (token == '}'):
+      brace_depth -= 1
+      if (brace_depth == 0 and paren_depth == 0 
+          and string_at_or_empty(tokens, token_idx+1) != ';'):
+        #end of namespace or declaration without trailing ;
+        spans.append((span_start, token_idx+1))
+        span_start = token_idx+1
+    elif (brace_depth == 0 and paren_depth == 0):
+      if (token == ';'):
+        spans.append((span_start, token_idx+1))
+        span_start = token_idx+1
+      elif (token == ':' and token_idx == span_start+1 
+          and tokens[span_start] in access_modifiers):
+        spans.append((span_start, token_idx+1))
+        span_start = token_idx+1
+  if (span_start < end):
+    spans.append((span_start, end))
+  return spans
+
+def get_scope_bounds(tokens, span):
+  '''If span is a namespace or class definition, returns (kind, name, index 
+  of opening brace, index of closing brace), otherwise returns None'''
+  (span_start, span_end) = span
+  if (tokens[span_start] == 'namespace' and span_end-span_start > 3
+      and tokens[span_start+2] == '{' and tokens[span_end-1] == '}'):
+    return ('namespace', tokens[span_start+1], span_start+2, span_end-1)
+  if (tokens[span_start] == 'class' and span_end-span_start > 4
+      and tokens[span_end-2] == '}' and tokens[span_end-1] == ';'
+      and '{' in tokens[span_start:span_end]):
+    return ('class', tokens[span_start+1], 
+        tokens.index('{', span_start, span_end), span_end-2)
+  return None
+
+def split_declarations(tokens, spans, target_size):
+  '''Groups declaration spans into chunks of about target_size tokens, 
+  recursively splitting namespace and class definitions that are larger. 
+  Returns a list of chunks (start index, token list, wrappers), where 
+  wrappers lists (scope name, continued, scope span, body offset) for each 
+  scope the chunk was split out of. continued is true if an earlier chunk 
+  holds part of that scope, and body offset is the number of tokens 
+  preceding the chunk's declarations in the chunk's copy of the scope'''
+  chunks = []
+  group_start = -1
+  group_end = -1
+  for span in spans:
+    scope_bounds = None
+    if (span[1]-span[0] > target_size):
+      scope_bounds = get_scope_bounds(tokens, span)
+    if (scope_bounds != None or (group_start != -1 and 
+        span[1]-group_start > target_size)):
+      if (group_start != -1):
+        chunks.append((group_start, tokens[group_start:group_end], []))
+        group_start = -1
+    if (scope_bounds != None):
+      chunks += split_scope(tokens, span, scope_bounds, target_size)
+      continue
+    if (group_start == -1):
+      group_start = span[0]
+    group_end = span[1]
+  if (group_start != -1):
+    chunks.append((group_start, tokens[group_start:group_end], []))
+  return chunks
+
+def split_scope(tokens, span, scope_bounds, target_size):
+  '''Splits body of a namespace or class definition into chunks, wrapping 
+  each chunk in the scope's header and closing tokens. Chunks after the first
+  are preceded by the access modifier and using namespace directives in 
+  effect where they start'''
+  (kind, name, open_idx, close_idx) = scope_bounds
+  header = tokens[span[0]:open_idx+1]
+  closer = tokens[close_idx:span[1]]
+  body_spans = find_declaration_spans(tokens, open_idx+1, close_idx)
+  if (len(body_spans) == 0):
+    #nothing to split, ex. class Name { };
+    return [(span[0], tokens[span[0]:span[1]], [])]
+  directive_spans = [body_span for body_span in body_spans 
+      if (body_span[1]-body_span[0] == 2 
+      and tokens[body_span[0]] in access_modifiers)
+      or (tokens[body_span[0]] == 'using' 
+      and tokens[body_span[0]+1] == 'namespace')]
+  chunks = []
+  for (chunk_start, chunk_tokens, wrappers) in split_declarations(tokens, 
+      body_spans, target_size):
+    continued = (len(chunks) > 0)
+    prefix = []
+    if (continued):
+      access_prefix = []
+      for directive_span in directive_spans:
+        if (directive_span[0] >= chunk_start):
+          break
+        if (tokens[directive_span[0]] in access_modifiers):
+          access_prefix = tokens[directive_span[0]:directive_span[1]]
+        else:
+          prefix += tokens[directive_span[0]:directive_span[1]]
+      prefix = access_prefix+prefix
+    chunks.append((chunk_start, header+prefix+chunk_tokens+closer, 
+        [(name, continued, span, len(header)+len(prefix))]+wrappers))
+  return chunks
+
+def parse_tokens_worker(tokens):
+  '''Worker function parsing tokens with the types sent to init_worker'''
+  return parse_tokens(tokens, worker_types)
+
+def parse_chunk(tokens, type_list):
+  '''Parses a chunk from split_declarations, or a whole header, with 
+  type_list registered and returns (global NamespaceToken, true if every 
+  token was parsed)'''
+  parser = CppParser(tokens)
+  parser.add_types(type_list)
+  global_token = parser.evaluate()
+  return (global_token, parser.position == len(tokens))
+
+def parse_chunk_worker(tokens):
+  '''Worker function parsing a chunk with the types sent to init_worker'''
+  return parse_chunk(tokens, worker_types)
+
+def fix_chunk_spans(chunk_token, chunk_start, wrappers):
+  '''Converts declaration spans of a parsed chunk starting at token index 
+  chunk_start to spans in the split header'''
+  if (len(chunk_token.members) == 0):
+    return
+  scope_start = 0
+  body_offset = 0
+  for (name, continued, scope_span, body_offset) in wrappers:
+    chunk_token = chunk_token.members[0]
+    chunk_token.span = (scope_span[0]-scope_start, scope_span[1]-scope_start)
+    scope_start = scope_span[0]
+  offset = chunk_start-scope_start-body_offset
+  for member in chunk_token.members:
+    member.span = (member.span[0]+offset, member.span[1]+offset)
+
+def append_chunk(target_token, chunk_token, wrappers):
+  '''Appends members parsed from a chunk to target_token, descending into 
+  the last member of target_token for each continued scope in wrappers'''
+  if (len(chunk_token.members) == 0):
+    return
+  if (len(wrappers) > 0):
+    if (wrappers[0][1]):
+      append_chunk(target_token.members[-1], chunk_token.members[0], 
+          wrappers[1:])
+      return
+    members = chunk_token.members[:1]
+    if (chunk_token.token_type == TokenType.cpp_class):
+      members_access = chunk_token.members_access[:1]
+  else:
+    members = chunk_token.members
+    if (chunk_token.token_type == TokenType.cpp_class):
+      members_access = chunk_token.members_access
+  target_token.members += members
+  if (target_token.token_type == TokenType.cpp_class):
+    target_token.members_access += members_access
+
+def parse_file_split(filename, jobs=None, type_list=None, target_size=0):
+  '''Parses a single header by splitting it at declaration boundaries, 
+  including inside large namespace and class bodies, and parsing the chunks 
+  in jobs worker processes. Returns the global NamespaceToken with members in
+  source order. Types declared in the header are registered, along with 
+  type_list, for every chunk. If target_size is 0, the header is split into 
+  about four chunks per worker. If any chunk fails to parse, the header is
+  parsed again unsplit, so the result and error are those of parse_tokens'''
+  if (type_list == None):
+    type_list = []
+  tokens = gb_lexer.tokenize_file_cpp(filename)
+  all_types = type_list+gb_type_scanner.scan_types(tokens)
+  if (jobs == None):
+    jobs = multiprocessing.cpu_count()
+  if (target_size <= 0):
+    target_size = max(len(tokens)//(4*jobs), 1)
+  chunks = split_declarations(tokens, find_declaration_spans(tokens, 0, 
+      len(tokens)), target_size)
+  chunk_tokens = [chunk[1] for chunk in chunks]
+  if (jobs <= 1 or len(chunks) <= 1):
+    chunk_results = [parse_chunk(tokens, all_types) 
+        for tokens in chunk_tokens]
+  else:
+    with multiprocessing.Pool(min(jobs, len(chunks)),
+        initializer=init_worker, initargs=(all_types,)) as pool:
+      chunk_results = pool.map(parse_chunk_worker, chunk_tokens, 
+          chunksize=1)
+  #a chunk split out of a scope holds the scope, or the scope did not parse
+  for chunk_idx in range(len(chunks)):
+    (chunk_global_token, complete) = chunk_results[chunk_idx]
+    if (not complete or (len(chunks[chunk_idx][2]) > 0 
+        and len(chunk_global_token.members) == 0)):
+      #evaluate stops at the first declaration it can not parse, which can
+      #not be rebuilt from chunks, so reparse unsplit for the same tree and
+      #error
+      debug('chunk '+str(chunk_idx)+' of '+filename
+          +' did not parse, parsing unsplit')
+      return parse_tokens(tokens, all_types)
+  chunk_global_tokens = [chunk_result[0] for chunk_result in chunk_results]
+  global_token = NamespaceToken()
+  global_token.name = 'Global'
+  for chunk_idx in range(len(chunks)):
+    fix_chunk_spans(chunk_global_tokens[chunk_idx], chunks[chunk_idx][0],
+        chunks[chunk_idx][2])
+    append_chunk(global_token, chunk_global_tokens[chunk_idx], 
+        chunks[chunk_idx][2])
+  return global_token
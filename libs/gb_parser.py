@@ -7,10 +7,14 @@ import re
 class Parser:
   '''Class implementing skeleton of a basic parser'''
 
+  #token types whose evaluation is bracketed by push_scope/pop_scope
+  scoped_token_types = frozenset()
+
   def __init__(self, tokens):
     '''Initializes parser from tokens'''
     self.tokens = tokens
     self.position = 0
+    self.grammar = dict() #compiled regex lists by token type
 
   def eval_token_regex_split_string(self, split_string):
     '''Same as eval_token_regex_string but after str.split is called'''
@@ -52,13 +56,15 @@ class Parser:
       elif (string_at_or_empty(split_string[token_idx],0) == '<'):
         #method call
         method_string = split_string[token_idx]
-        regex_list.append(('callback',method_string[1:-1]))
+        regex_list.append(('callback',method_string[1:-1],
+            self.get_callback(method_string[1:-1])))
       elif (string_at_or_empty(split_string[token_idx],0) == '['):
         #subtoken
         method_string = split_string[token_idx]
         colon_idx = method_string.index(':')
         regex_list.append(('subtoken',method_string[1:colon_idx],
-            method_string[colon_idx+1:-1]))
+            method_string[colon_idx+1:-1],
+            self.get_callback(method_string[1:colon_idx])))
       else:
         #fixed name
         #add tuple ('fixedname', name)
@@ -94,12 +100,43 @@ class Parser:
     error('Invalid token type received.')
     return []
 
+  def get_grammar(self, token_type):
+    '''Returns compiled regex list for token_type, compiling it on first use'''
+    if (token_type not in self.grammar):
+      self.grammar[token_type] = self.get_regex_by_token_type(token_type)
+    return self.grammar[token_type]
+
+  def get_callback(self, param_name):
+    '''method to get the handler called for <param_name> and [param_name:...]
+    when a regex is compiled. Handlers take (py_token, param_value) and return
+    true if param_value is accepted. To be extended in derived classes'''
+    def callback(py_token, param_value):
+      return self.exec_callback(py_token, param_name, param_value)
+    return callback
+
   def make_token_by_type(token_type):
     '''method to make a python token object from a name of a token type. To be 
     extended in derived classes'''
     error('Invalid token type received.')
     return None
 
+  def finish_token(self, py_token):
+    '''method called with each successfully parsed subtoken, returning the 
+    token passed to the subtoken's callback. To be extended in derived 
+    classes'''
+    return py_token
+
+  def push_scope(self, py_token):
+    '''method called before evaluating a subtoken of a scoped token type. To
+    be extended in derived classes'''
+    pass
+
+  def pop_scope(self, py_token, matched):
+    '''method called after evaluating a subtoken of a scoped token type, 
+    matched is true if the subtoken was successfully parsed. To be extended in
+    derived classes'''
+    pass
+
   def eval_parser(self, regex_list, py_token=None):
     '''Evaluates tokens starting from current position, attempting to interpret
     them according to regex_list. If py_token is not none, any method calls
@@ -124,8 +161,7 @@ class Parser:
           self.position += 1
       elif (current_regex[0]=='callback'):
         #set py_token parameters based on token
-        if (not self.exec_callback(py_token, current_regex[1], 
-            self.tokens[self.position])):
+        if (not current_regex[2](py_token, self.tokens[self.position])):
           self.position = original_pos
           return False
         regex_pos += 1
@@ -138,12 +174,18 @@ class Parser:
         regex_pos += 1
       elif (current_regex[0]=='subtoken'):
         #recurse one time
-        subtoken_regex = self.get_regex_by_token_type(current_regex[2])
+        subtoken_regex = self.get_grammar(current_regex[2])
         new_token = self.make_token_by_type(current_regex[2])
-        if (not self.eval_parser(subtoken_regex, new_token)):
+        if (current_regex[2] in self.scoped_token_types):
+          self.push_scope(new_token)
+          matched = self.eval_parser(subtoken_regex, new_token)
+          self.pop_scope(new_token, matched)
+        else:
+          matched = self.eval_parser(subtoken_regex, new_token)
+        if (not matched):
           self.position = original_pos
           return False
-        self.exec_callback(py_token, current_regex[1], new_token)
+        current_regex[3](py_token, self.finish_token(new_token))
         regex_pos += 1
       elif (current_regex[0]=='optional'):
         #attempt to recurse one time
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#implements pruning of bindings to the classes reachable from a set of roots
+from gb_utils import *
+import gb_binding_ir
+import gb_symbol_index
+
+def get_referenced_classes(entry, class_names, symbol_index):
+  '''Returns qualified names of the classes in class_names named in the
+  argument and result types of entry, resolved with the 
+  gb_symbol_index.SymbolIndex symbol_index'''
+  referenced = []
+  for plan in entry.args+[entry.result]:
+    for name in gb_symbol_index.name_regex.findall(plan.cpp_type):
+      class_name = symbol_index.resolve_class(name, entry.scope)
+      if (class_name in class_names and class_name not in referenced):
+        referenced.append(class_name)
+  return referenced
+
+def find_root_classes(root_names, class_names):
+  '''Returns qualified names of the classes in class_names named by
+  root_names, either by qualified name or by a trailing part of it, ex.
+  Hist1D for ns::Hist1D. Unmatched names are reported'''
+  roots = []
+  for root_name in root_names:
+    matches = [class_name for class_name in class_names
+        if (class_name == root_name or class_name.endswith('::'+root_name))]
+    if (len(matches) == 0):
+      error('root class '+root_name+' not found')
+    for class_name in matches:
+      if class_name not in roots:
+        roots.append(class_name)
+  return roots
+
+class ShakeReport:
+  '''What was kept and pruned by shake_bindings'''
+
+  def __init__(self):
+    self.roots = [] #qualified names of root classes
+    self.kept_classes = [] #qualified names, in order
+    self.pruned_classes = [] #qualified names, in order
+    self.pruned_functions = [] #C names of pruned functions outside classes
+    self.entries_before = 0
+    self.entries_after = 0
+
+  def report(self):
+    '''Returns a one line summary'''
+    return ('reachable from {}: kept {} classes, pruned {} classes and {} '
+        'free functions, {} of {} entry points kept'.format(
+        ', '.join(self.roots), len(self.kept_classes),
+        len(self.pruned_classes), len(self.pruned_functions),
+        self.entries_after, self.entries_before))
+
+  def details(self):
+    '''Returns the summary followed by the kept and pruned names, one per
+    line'''
+    lines = [self.report()]
+    lines += ['kept class '+name for name in self.kept_classes]
+    lines += ['pruned class '+name for name in self.pruned_classes]
+    lines += ['pruned function '+name for name in self.pruned_functions]
+    return '\n'.join(lines)+'\n'
+
+def shake_bindings(binding_module, root_names, symbol_index):
+  '''Returns (BindingModule, ShakeReport) where the BindingModule keeps only
+  the entries of the classes reachable from the classes root_names through
+  the types in their public signatures, and the vector types those entries
+  return. Type names are resolved with symbol_index, the 
+  gb_symbol_index.SymbolIndex of the tree binding_module was lowered from.
+  Entries keep their C names and overload indices, so the wrappers
+  that remain do not change'''
+  report = ShakeReport()
+  report.entries_before = len(binding_module.entries)
+  class_entries = dict() #qualified name -> entries of the class
+  for entry in binding_module.entries:
+    if (entry.outer_class != ''):
+      if entry.scope not in class_entries:
+        class_entries[entry.scope] = []
+      class_entries[entry.scope].append(entry)
+  report.roots = find_root_classes(root_names, class_entries)
+  #breadth-first search over referenced classes
+  reachable = set(report.roots)
+  pending = list(report.roots)
+  while (len(pending) > 0):
+    for entry in class_entries[pending.pop(0)]:
+      for class_name in get_referenced_classes(entry, class_entries, 
+          symbol_index):
+        if class_name not in reachable:
+          reachable.add(class_name)
+          pending.append(class_name)
+  #keep entries in order
+  shaken_module = gb_binding_ir.BindingModule()
+  vector_cpp_types = set()
+  for entry in binding_module.entries:
+    if (entry.outer_class == ''):
+      report.pruned_functions.append(entry.c_name)
+    elif entry.scope in reachable:
+      shaken_module.entries.append(entry)
+      if (entry.result.marshal in ('vector','set')):
+        vector_cpp_types.add(entry.result.cpp_type)
+  shaken_module.vector_types = [vector_type for vector_type
+      in binding_module.vector_types if vector_type[0] in vector_cpp_types]
+  for class_name in class_entries:
+    if class_name in reachable:
+      report.kept_classes.append(class_name)
+    else:
+      report.pruned_classes.append(class_name)
+  report.entries_after = len(shaken_module.entries)
+  return (shaken_module, report)
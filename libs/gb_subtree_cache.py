@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#implements a cache of parsed declarations shared between headers
+from gb_utils import *
+import gb_cpp_parser
+import gb_parser
+import hashlib
+import os
+import pickle
+
+#constants
+SUBTREE_CACHE_VERSION = 1
+
+def get_source_hash():
+  '''Returns sha256 digest of the parser sources, which determine the subtree
+  parsed from given tokens'''
+  hasher = hashlib.sha256()
+  for module in (gb_parser, gb_cpp_parser):
+    with open(module.__file__, 'rb') as module_file:
+      hasher.update(module_file.read())
+  return hasher.digest()
+
+class SubtreeCache:
+  '''Cache of the tokens parsed from a declaration statement, keyed by a hash
+  of the statement's tokens, the rule of the enclosing class or namespace,
+  and which of the tokens are known types. May be shared by the parsers of
+  several headers and saved to a file between runs'''
+
+  def __init__(self, filename=None):
+    '''If filename is not None, entries are loaded from and saved to it'''
+    self.filename = filename
+    self.entries = dict() #key -> tuple of member tokens
+    self.hits = 0
+    self.misses = 0
+    self.source_hash = get_source_hash()
+    if (filename != None):
+      self.load()
+
+  def get_key(self, rule, tokens, type_flags):
+    '''Returns key of statement tokens parsed by rule, where type_flags holds
+    whether each token is a known type'''
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(rule.encode('utf-8'))
+    hasher.update(b'\x00')
+    hasher.update('\x00'.join(tokens).encode('utf-8'))
+    hasher.update(b'\x00')
+    hasher.update(bytes(type_flags))
+    return hasher.digest()
+
+  def get(self, key):
+    '''Returns tuple of member tokens stored under key or None'''
+    members = self.entries.get(key)
+    if (members == None):
+      self.misses += 1
+    else:
+      self.hits += 1
+    return members
+
+  def store(self, key, members):
+    '''Stores tuple of member tokens under key'''
+    self.entries[key] = members
+
+  def hit_rate(self):
+    '''Returns fraction of lookups that were hits'''
+    if (self.hits+self.misses == 0):
+      return 0.0
+    return self.hits/(self.hits+self.misses)
+
+  def report(self):
+    '''Returns a one line summary of cache use'''
+    return ('subtree cache: {} lookups, {} hits ({:.1f}%), {} entries'.format(
+        self.hits+self.misses, self.hits, 100.0*self.hit_rate(),
+        len(self.entries)))
+
+  def load(self):
+    '''Loads entries from filename, ignoring a missing, corrupted, or stale
+    file'''
+    if not os.path.exists(self.filename):
+      return
+    try:
+      with open(self.filename, 'rb') as cache_file:
+        (version, source_hash, entries) = pickle.load(cache_file)
+    except Exception as exc:
+      debug('ignoring subtree cache '+self.filename+': '+str(exc))
+      return
+    if (version != SUBTREE_CACHE_VERSION or source_hash != self.source_hash):
+      debug('ignoring stale subtree cache '+self.filename)
+      return
+    self.entries.update(entries)
+
+  def save(self):
+    '''Writes entries to filename'''
+    temp_filename = self.filename+'.tmp'+str(os.getpid())
+    with open(temp_filename, 'wb') as cache_file:
+      pickle.dump((SUBTREE_CACHE_VERSION, self.source_hash, self.entries),
+          cache_file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, self.filename)
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+#implements a persistent SQLite database of the declarations in C++ headers
+from gb_utils import *
+from gb_cpp_parser import TokenType
+import gb_lexer
+import gb_parallel
+import gb_subtree_cache
+import gb_type_scanner
+import gb_visitor
+import hashlib
+import multiprocessing
+import sqlite3
+
+#constants
+SYMBOL_DB_VERSION = 1
+schema_statements = (
+    '''CREATE TABLE IF NOT EXISTS metadata (
+      key TEXT PRIMARY KEY,
+      value BLOB)''',
+    '''CREATE TABLE IF NOT EXISTS headers (
+      id INTEGER PRIMARY KEY,
+      filename TEXT UNIQUE NOT NULL,
+      content_hash TEXT NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS header_types (
+      header_id INTEGER NOT NULL REFERENCES headers(id) ON DELETE CASCADE,
+      type_name TEXT NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS declarations (
+      id INTEGER PRIMARY KEY,
+      header_id INTEGER NOT NULL REFERENCES headers(id) ON DELETE CASCADE,
+      qualified_name TEXT NOT NULL,
+      name TEXT NOT NULL,
+      kind TEXT NOT NULL,
+      scope TEXT NOT NULL,
+      access TEXT NOT NULL,
+      span_start INTEGER,
+      span_end INTEGER,
+      type TEXT,
+      signature TEXT NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS type_refs (
+      declaration_id INTEGER NOT NULL
+          REFERENCES declarations(id) ON DELETE CASCADE,
+      type_name TEXT NOT NULL,
+      role TEXT NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS bases (
+      declaration_id INTEGER NOT NULL
+          REFERENCES declarations(id) ON DELETE CASCADE,
+      parent_name TEXT NOT NULL,
+      access TEXT NOT NULL)''',
+    '''CREATE INDEX IF NOT EXISTS header_types_header
+        ON header_types(header_id)''',
+    '''CREATE INDEX IF NOT EXISTS declarations_qualified_name
+        ON declarations(qualified_name)''',
+    '''CREATE INDEX IF NOT EXISTS declarations_scope
+        ON declarations(scope, kind)''',
+    '''CREATE INDEX IF NOT EXISTS declarations_header
+        ON declarations(header_id)''',
+    '''CREATE INDEX IF NOT EXISTS type_refs_type_name
+        ON type_refs(type_name)''',
+    '''CREATE INDEX IF NOT EXISTS type_refs_declaration
+        ON type_refs(declaration_id)''',
+    '''CREATE INDEX IF NOT EXISTS bases_parent_name ON bases(parent_name)''',
+    '''CREATE INDEX IF NOT EXISTS bases_declaration
+        ON bases(declaration_id)''')
+dropped_tables = ('bases','type_refs','declarations','header_types','headers',
+    'metadata')
+
+def get_type_name(type_token):
+  '''Returns C++ spelling of a type token, ex. const std::vector<int>*'''
+  if (type_token.base_type == 'pointer'):
+    type_name = get_type_name(type_token.templates[0])+'*'
+    if (type_token.cv_qualifier != ''):
+      type_name += ' '+type_token.cv_qualifier
+    return type_name
+  type_name = ''
+  if (type_token.cv_qualifier != ''):
+    type_name += type_token.cv_qualifier+' '
+  if (type_token.signed == 'unsigned'):
+    type_name += 'unsigned '
+  type_name += type_token.base_type
+  if (len(type_token.templates) > 0):
+    type_name += ('<'+', '.join([get_type_name(template)
+        for template in type_token.templates])+'>')
+  if (len(type_token.argtypes) > 0):
+    type_name += ('('+', '.join([get_type_name(argtype)
+        for argtype in type_token.argtypes])+')')
+  return type_name
+
+def add_type_refs(type_refs, type_token, role):
+  '''Appends (type name, role) for each type named in type_token'''
+  if (type_token.token_type != TokenType.cpp_type):
+    return
+  if (type_token.base_type != 'pointer'):
+    type_refs.append((type_token.base_type, role))
+  for subtype in list(type_token.templates)+list(type_token.argtypes):
+    add_type_refs(type_refs, subtype, role)
+
+def get_file_hash(filename):
+  '''Returns sha256 hex digest of the contents of filename'''
+  with open(filename, 'rb') as header_file:
+    return hashlib.sha256(header_file.read()).hexdigest()
+
+class Declaration:
+  '''Row of the declarations table to be inserted'''
+  __slots__ = ('qualified_name','name','kind','scope','access','span',
+      'type_name','signature','type_refs','bases')
+
+  def __init__(self):
+    self.qualified_name = ''
+    self.name = ''
+    self.kind = ''
+    self.scope = '' #qualified name of enclosing class or namespace
+    self.access = '' #access if a class member
+    self.span = (None, None) #token span in header
+    self.type_name = None #declared type of function or variable
+    self.signature = ''
+    self.type_refs = [] #(type name, role)
+    self.bases = [] #(parent name, access)
+
+class DeclarationCollector(gb_visitor.Visitor):
+  '''Visitor listing the declarations of a header as Declaration objects'''
+
+  def __init__(self):
+    self.declarations = []
+    self.scope_starts = [] #header index of first token of enclosing scopes
+
+  def add_declaration(self, kind, token, context):
+    declaration = Declaration()
+    declaration.name = token.name
+    declaration.kind = kind
+    declaration.scope = '::'.join([scope[0] for scope in context.hierarchy])
+    declaration.qualified_name = '::'.join([scope[0] for scope
+        in context.hierarchy]+[token.name])
+    declaration.access = context.access
+    if (token.span != None):
+      declaration.span = (self.scope_starts[-1]+token.span[0],
+          self.scope_starts[-1]+token.span[1])
+    self.declarations.append(declaration)
+    return declaration
+
+  def push_scope(self, kind, token, context):
+    if (len(context.parents) == 0):
+      self.scope_starts.append(0)
+      return
+    declaration = self.add_declaration(kind, token, context)
+    self.scope_starts.append(declaration.span[0] or 0)
+    return declaration
+
+  def visit_namespace(self, token, context):
+    declaration = self.push_scope('namespace', token, context)
+    if (declaration != None):
+      declaration.signature = 'namespace '+token.name
+
+  def leave_namespace(self, token, context):
+    self.scope_starts.pop()
+
+  def visit_class(self, token, context):
+    declaration = self.push_scope('class', token, context)
+    if (declaration != None):
+      declaration.signature = 'class '+token.name
+      for parent_idx in range(len(token.parents)):
+        access = 'private'
+        if (parent_idx < len(token.parents_access)):
+          access = token.parents_access[parent_idx]
+        declaration.bases.append((token.parents[parent_idx], access))
+        declaration.type_refs.append((token.parents[parent_idx], 'base'))
+      if (len(declaration.bases) > 0):
+        declaration.signature += (' : '+', '.join([base[1]+' '+base[0]
+            for base in declaration.bases]))
+
+  def leave_class(self, token, context):
+    self.scope_starts.pop()
+
+  def visit_function(self, token, context):
+    declaration = self.add_declaration('function', token, context)
+    arg_types = []
+    if (token.function_type.token_type == TokenType.cpp_type):
+      declaration.type_name = get_type_name(token.function_type)
+      add_type_refs(declaration.type_refs, token.function_type, 'return')
+    for arg in token.args:
+      arg_types.append(get_type_name(arg.variable_type))
+      add_type_refs(declaration.type_refs, arg.variable_type, 'argument')
+    declaration.signature = (str(declaration.type_name)+' '+token.name+'('
+        +', '.join(arg_types)+')')
+    if (token.is_default):
+      declaration.signature += ' = default'
+    return False
+
+  def visit_variable(self, token, context):
+    declaration = self.add_declaration('variable', token, context)
+    declaration.type_name = get_type_name(token.variable_type)
+    add_type_refs(declaration.type_refs, token.variable_type, 'variable')
+    declaration.signature = declaration.type_name+' '+token.name
+    return False
+
+  def visit_enum(self, token, context):
+    declaration = self.add_declaration('enum', token, context)
+    declaration.signature = 'enum '
+    if (token.is_enum_class):
+      declaration.signature += 'class '
+    declaration.signature += token.name+' {'+', '.join(token.enums)+'}'
+    return False
+
+  def visit_opaque(self, token, context):
+    return False
+
+class SymbolDatabase:
+  '''SQLite database of the declarations, types, signatures, access, and
+  spans of a set of headers. Headers are reparsed only when their contents
+  change, and queries read the database without parsing any header'''
+
+  def __init__(self, filename):
+    '''Opens or creates the database filename, which may be :memory:'''
+    self.connection = sqlite3.connect(filename)
+    self.connection.row_factory = sqlite3.Row
+    self.connection.execute('PRAGMA foreign_keys = ON')
+    self.create_schema()
+
+  def close(self):
+    self.connection.close()
+
+  def create_schema(self):
+    '''Creates tables, clearing a database from another version or
+    parser'''
+    source_hash = gb_subtree_cache.get_source_hash()
+    with self.connection:
+      for statement in schema_statements:
+        self.connection.execute(statement)
+      version = self.get_metadata('version')
+      if (version != None and (version != SYMBOL_DB_VERSION
+          or self.get_metadata('source_hash') != source_hash)):
+        debug('clearing stale symbol database')
+        for table in dropped_tables:
+          self.connection.execute('DROP TABLE '+table)
+        for statement in schema_statements:
+          self.connection.execute(statement)
+      self.set_metadata('version', SYMBOL_DB_VERSION)
+      self.set_metadata('source_hash', source_hash)
+
+  def get_metadata(self, key):
+    row = self.connection.execute('SELECT value FROM metadata WHERE key = ?',
+        (key,)).fetchone()
+    if (row == None):
+      return None
+    return row[0]
+
+  def set_metadata(self, key, value):
+    self.connection.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?)',
+        (key, value))
+
+  #---------------------------------------------------------------------------
+  #                                 updating
+  #---------------------------------------------------------------------------
+
+  def get_signatures(self, header_id):
+    '''Returns set of (qualified name, signature) declared in a header'''
+    return set([(row[0], row[1]) for row in self.connection.execute(
+        'SELECT qualified_name, signature FROM declarations '
+        'WHERE header_id = ?', (header_id,))])
+
+  def get_header_id(self, filename):
+    row = self.connection.execute('SELECT id FROM headers WHERE filename = ?',
+        (filename,)).fetchone()
+    if (row == None):
+      return None
+    return row[0]
+
+  def store_header(self, filename, content_hash, header_types, global_token):
+    '''Replaces the rows of a header with the declarations in global_token.
+    Returns qualified names whose signatures were added, removed, or
+    changed'''
+    old_signatures = set()
+    header_id = self.get_header_id(filename)
+    if (header_id != None):
+      old_signatures = self.get_signatures(header_id)
+      self.connection.execute('DELETE FROM headers WHERE id = ?',
+          (header_id,))
+    header_id = self.connection.execute('INSERT INTO headers '
+        '(filename, content_hash) VALUES (?, ?)',
+        (filename, content_hash)).lastrowid
+    self.connection.executemany('INSERT INTO header_types VALUES (?, ?)',
+        [(header_id, type_name) for type_name in header_types])
+    collector = DeclarationCollector()
+    collector.walk(global_token)
+    for declaration in collector.declarations:
+      declaration_id = self.connection.execute('INSERT INTO declarations '
+          '(header_id, qualified_name, name, kind, scope, access, span_start,'
+          ' span_end, type, signature) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+          (header_id, declaration.qualified_name, declaration.name,
+          declaration.kind, declaration.scope, declaration.access,
+          declaration.span[0], declaration.span[1], declaration.type_name,
+          declaration.signature)).lastrowid
+      self.connection.executemany('INSERT INTO type_refs VALUES (?, ?, ?)',
+          [(declaration_id, type_ref[0], type_ref[1])
+          for type_ref in declaration.type_refs])
+      self.connection.executemany('INSERT INTO bases VALUES (?, ?, ?)',
+          [(declaration_id, base[0], base[1]) for base in declaration.bases])
+    new_signatures = set([(declaration.qualified_name, declaration.signature)
+        for declaration in collector.declarations])
+    changed = set([signature[0] for signature
+        in old_signatures ^ new_signatures])
+    return changed
+
+  def update_headers(self, filenames, type_list=None, jobs=1):
+    '''Brings the database up to date with headers in filenames, removing
+    other headers. Only headers whose contents changed are lexed and parsed,
+    using the types declared by all headers and type_list. If the declared
+    types change, every header is reparsed since they may parse differently.
+    A header that does not parse completely is stored without its content 
+    hash, so it is parsed again on the next update. Returns sorted list of 
+    qualified names whose signatures changed'''
+    if (type_list == None):
+      type_list = []
+    stored_hashes = dict([(row[0], row[1]) for row in self.connection.execute(
+        'SELECT filename, content_hash FROM headers')])
+    old_types = self.get_declared_types()
+    changed_files = []
+    content_hashes = dict()
+    for filename in filenames:
+      content_hashes[filename] = get_file_hash(filename)
+      if (stored_hashes.get(filename) != content_hashes[filename]):
+        changed_files.append(filename)
+    removed_files = [filename for filename in stored_hashes
+        if filename not in content_hashes]
+    changed = set()
+    with self.connection:
+      for filename in removed_files:
+        changed |= self.remove_header(filename)
+      header_tokens = dict()
+      header_types = dict()
+      for filename in changed_files:
+        header_tokens[filename] = gb_lexer.tokenize_file_cpp(filename)
+        header_types[filename] = gb_type_scanner.scan_types(
+            header_tokens[filename])
+        self.connection.execute('DELETE FROM header_types WHERE header_id = '
+            '(SELECT id FROM headers WHERE filename = ?)', (filename,))
+      all_types = self.get_declared_types()
+      for filename in changed_files:
+        for type_name in header_types[filename]:
+          if type_name not in all_types:
+            all_types.append(type_name)
+      if (set(all_types) != set(old_types)):
+        #declared types changed, reparse every header
+        for filename in filenames:
+          if filename not in header_tokens:
+            header_tokens[filename] = gb_lexer.tokenize_file_cpp(filename)
+            header_types[filename] = gb_type_scanner.scan_types(
+                header_tokens[filename])
+        changed_files = list(filenames)
+      token_lists = [header_tokens[filename] for filename in changed_files]
+      if (jobs <= 1 or len(changed_files) <= 1):
+        parse_results = [gb_parallel.parse_chunk(tokens, type_list+all_types)
+            for tokens in token_lists]
+      else:
+        with multiprocessing.Pool(min(jobs, len(changed_files)),
+            initializer=gb_parallel.init_worker,
+            initargs=(type_list+all_types,)) as pool:
+          parse_results = pool.map(gb_parallel.parse_chunk_worker,
+              token_lists, chunksize=1)
+      for file_idx in range(len(changed_files)):
+        filename = changed_files[file_idx]
+        (global_token, complete) = parse_results[file_idx]
+        content_hash = content_hashes[filename]
+        if not complete:
+          error('unable to parse all of '+filename)
+          content_hash = ''
+        changed |= self.store_header(filename, content_hash,
+            header_types[filename], global_token)
+    return sorted(changed)
+
+  def remove_header(self, filename):
+    '''Removes a header and its declarations, returns set of removed
+    qualified names'''
+    header_id = self.get_header_id(filename)
+    if (header_id == None):
+      return set()
+    removed = set([signature[0] for signature
+        in self.get_signatures(header_id)])
+    self.connection.execute('DELETE FROM headers WHERE id = ?', (header_id,))
+    return removed
+
+  #---------------------------------------------------------------------------
+  #                                  queries
+  #---------------------------------------------------------------------------
+
+  def get_headers(self):
+    '''Returns list of stored header filenames'''
+    return [row[0] for row in self.connection.execute(
+        'SELECT filename FROM headers ORDER BY filename')]
+
+  def get_declared_types(self):
+    '''Returns list of type names declared by the stored headers'''
+    type_names = []
+    known_names = set()
+    for row in self.connection.execute('SELECT type_name FROM header_types '
+        'ORDER BY header_id, rowid'):
+      if row[0] not in known_names:
+        known_names.add(row[0])
+        type_names.append(row[0])
+    return type_names
+
+  def get_declarations(self, qualified_name):
+    '''Returns rows of the declarations named qualified_name, ex. the
+    overloads of a function, joined with the filename of their header'''
+    return self.connection.execute('SELECT declarations.*, headers.filename '
+        'FROM declarations JOIN headers ON headers.id = header_id '
+        'WHERE qualified_name = ? ORDER BY declarations.id',
+        (qualified_name,)).fetchall()
+
+  def get_members(self, scope, kind=None):
+    '''Returns rows of the declarations in the class or namespace scope,
+    optionally only those of kind, in source order'''
+    if (kind == None):
+      return self.connection.execute('SELECT * FROM declarations '
+          'WHERE scope = ? ORDER BY id', (scope,)).fetchall()
+    return self.connection.execute('SELECT * FROM declarations '
+        'WHERE scope = ? AND kind = ? ORDER BY id', (scope, kind)).fetchall()
+
+  def iter_declarations(self, kind=None):
+    '''Yields rows of all declarations, optionally only those of kind,
+    without reading them all into memory'''
+    if (kind == None):
+      cursor = self.connection.execute('SELECT * FROM declarations '
+          'ORDER BY id')
+    else:
+      cursor = self.connection.execute('SELECT * FROM declarations '
+          'WHERE kind = ? ORDER BY id', (kind,))
+    for row in cursor:
+      yield row
+
+  def get_type_users(self, type_name):
+    '''Returns rows of the declarations whose signatures refer to
+    type_name'''
+    return self.connection.execute('SELECT DISTINCT declarations.* '
+        'FROM type_refs JOIN declarations ON declarations.id = declaration_id '
+        'WHERE type_name = ? ORDER BY declarations.id',
+        (type_name,)).fetchall()
+
+  def get_classes_using(self, type_name):
+    '''Returns sorted qualified names of classes that inherit from
+    type_name or have members whose signatures refer to it'''
+    return [row[0] for row in self.connection.execute(
+        'SELECT DISTINCT CASE WHEN declarations.kind = \'class\' '
+        'THEN declarations.qualified_name ELSE declarations.scope END AS name '
+        'FROM type_refs JOIN declarations ON declarations.id = declaration_id '
+        'WHERE type_name = ? AND (declarations.kind = \'class\' '
+        'OR declarations.scope IN (SELECT qualified_name FROM declarations '
+        'WHERE kind = \'class\')) ORDER BY name', (type_name,))]
+
+  def get_subclasses(self, parent_name):
+    '''Returns sorted qualified names of classes deriving directly from
+    parent_name as it is spelled in their base class list'''
+    return [row[0] for row in self.connection.execute(
+        'SELECT DISTINCT qualified_name FROM bases JOIN declarations '
+        'ON declarations.id = declaration_id WHERE parent_name = ? '
+        'ORDER BY qualified_name', (parent_name,))]
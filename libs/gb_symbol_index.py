@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+#implements an index of the declarations in a parsed token tree by name
+from gb_utils import *
+import gb_visitor
+import re
+
+#constants
+name_regex = re.compile(r'[a-zA-Z_]\w*(?:::[a-zA-Z_]\w*)*')
+
+def get_qualified_name(hierarchy, name):
+  '''Returns name qualified by the (name, kind) scopes in hierarchy'''
+  return '::'.join([scope[0] for scope in hierarchy]+[name])
+
+class ClassSymbols:
+  '''Members of a class grouped by kind and by name, and the classes it
+  inherits from or is inherited by'''
+  __slots__ = ('token','qualified_name','members','overloads','parents',
+      'children')
+
+  def __init__(self, token, qualified_name):
+    self.token = token
+    self.qualified_name = qualified_name
+    self.members = dict() #kind -> list of (token, access) in source order
+    self.overloads = dict() #kind -> name -> list of (token, access)
+    self.parents = [] #(qualified name, access) of base classes
+    self.children = [] #qualified names of derived classes
+
+  def add_member(self, kind, token, access):
+    '''Adds member token with access'''
+    if kind not in self.members:
+      self.members[kind] = []
+      self.overloads[kind] = dict()
+    self.members[kind].append((token, access))
+    overloads = self.overloads[kind]
+    if token.name not in overloads:
+      overloads[token.name] = []
+    overloads[token.name].append((token, access))
+
+  def get_members(self, kind):
+    '''Returns list of (token, access) of members of kind'''
+    return self.members.get(kind, [])
+
+  def get_overloads(self, name, kind='function'):
+    '''Returns list of (token, access) of members of kind named name'''
+    return self.overloads.get(kind, dict()).get(name, [])
+
+class SymbolIndex:
+  '''Index of the declarations in a token tree by fully qualified name, ex.
+  PlotOptTypes::BottomType or NamedFunc::Name. Names are qualified by the
+  enclosing namespaces and classes, excluding the top-level token'''
+
+  def __init__(self, token=None):
+    '''If token is not None, indexes the tree with top-level token'''
+    self.symbols = dict() #qualified name -> list of tokens
+    self.classes = dict() #qualified name -> ClassSymbols
+    self.qualified_types = dict() #(type, scope) -> result of qualify_type
+    if (token != None):
+      self.add_tree(token)
+
+  def add_tree(self, token):
+    '''Indexes the tree with top-level token'''
+    SymbolIndexBuilder(self).walk(token)
+    self.resolve_parents()
+    self.qualified_types.clear()
+
+  def add_symbol(self, qualified_name, token):
+    if qualified_name not in self.symbols:
+      self.symbols[qualified_name] = []
+    self.symbols[qualified_name].append(token)
+
+  def get(self, qualified_name):
+    '''Returns first token declared with qualified_name or None'''
+    tokens = self.symbols.get(qualified_name)
+    if (tokens == None):
+      return None
+    return tokens[0]
+
+  def get_all(self, qualified_name):
+    '''Returns list of tokens declared with qualified_name, ex. the overloads
+    of a function'''
+    return self.symbols.get(qualified_name, [])
+
+  def get_class(self, qualified_name):
+    '''Returns ClassSymbols of the class qualified_name or None'''
+    return self.classes.get(qualified_name)
+
+  def resolve_class(self, name, scope_name):
+    '''Returns qualified name of class name as referenced from the class or
+    namespace scope_name, or name if it is not an indexed class'''
+    scopes = []
+    if (scope_name != ''):
+      scopes = scope_name.split('::')
+    for scope_idx in range(len(scopes), -1, -1):
+      qualified_name = '::'.join(scopes[:scope_idx]+[name])
+      if qualified_name in self.classes:
+        return qualified_name
+    return name
+
+  def qualify_type(self, type_string, scope_name):
+    '''Returns C++ type type_string with the indexed class names in it
+    qualified as referenced from the class or namespace scope_name'''
+    key = (type_string, scope_name)
+    if key not in self.qualified_types:
+      self.qualified_types[key] = name_regex.sub(lambda match: 
+          self.resolve_class(match.group(0), scope_name), type_string)
+    return self.qualified_types[key]
+
+  def resolve_parents(self):
+    '''Records inheritance edges between indexed classes'''
+    for class_symbols in self.classes.values():
+      class_symbols.parents = []
+    for class_symbols in self.classes.values():
+      token = class_symbols.token
+      scope_name = class_symbols.qualified_name.rpartition('::')[0]
+      for parent_idx in range(len(token.parents)):
+        parent_name = self.resolve_class(token.parents[parent_idx],
+            scope_name)
+        access = 'private'
+        if (parent_idx < len(token.parents_access)):
+          access = token.parents_access[parent_idx]
+        class_symbols.parents.append((parent_name, access))
+        if parent_name in self.classes:
+          children = self.classes[parent_name].children
+          if class_symbols.qualified_name not in children:
+            children.append(class_symbols.qualified_name)
+
+  def get_ancestors(self, qualified_name):
+    '''Returns qualified names of the classes that class qualified_name
+    inherits from, directly or indirectly, nearest first'''
+    ancestors = []
+    pending = [qualified_name]
+    while (len(pending) > 0):
+      class_symbols = self.classes.get(pending.pop(0))
+      if (class_symbols == None):
+        continue
+      for (parent_name, access) in class_symbols.parents:
+        if parent_name not in ancestors:
+          ancestors.append(parent_name)
+          pending.append(parent_name)
+    return ancestors
+
+class SymbolIndexBuilder(gb_visitor.Visitor):
+  '''Visitor that adds declarations to a SymbolIndex'''
+
+  def __init__(self, symbol_index):
+    self.symbol_index = symbol_index
+
+  def add_declaration(self, kind, token, context):
+    '''Adds token to the index and to the members of its class, if any'''
+    qualified_name = get_qualified_name(context.hierarchy, token.name)
+    self.symbol_index.add_symbol(qualified_name, token)
+    if (len(context.hierarchy) > 0 and context.hierarchy[-1][1] == 'class'):
+      class_name = get_qualified_name(context.hierarchy[:-1],
+          context.hierarchy[-1][0])
+      self.symbol_index.classes[class_name].add_member(kind, token,
+          context.access)
+    return qualified_name
+
+  def visit_namespace(self, token, context):
+    if (len(context.parents) > 0):
+      self.add_declaration('namespace', token, context)
+
+  def visit_class(self, token, context):
+    qualified_name = self.add_declaration('class', token, context)
+    class_symbols = self.symbol_index.classes.get(qualified_name)
+    if (class_symbols == None or len(class_symbols.token.members) == 0):
+      #keep definition rather than forward declaration
+      self.symbol_index.classes[qualified_name] = ClassSymbols(token,
+          qualified_name)
+
+  def visit_function(self, token, context):
+    self.add_declaration('function', token, context)
+    return False
+
+  def visit_variable(self, token, context):
+    self.add_declaration('variable', token, context)
+    return False
+
+  def visit_enum(self, token, context):
+    self.add_declaration('enum', token, context)
+    return False
+
+  def visit_opaque(self, token, context):
+    return False
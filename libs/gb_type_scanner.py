@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#implements a linear pre-scan of C++ tokens for declared type names
+from gb_utils import *
+import gb_lexer
+import re
+
+#constants
+name_regex = re.compile(r'[a-zA-Z_]\w*(?:::[a-zA-Z_]\w*)*')
+class_keywords = frozenset(('class','struct','union'))
+#tokens that can follow the name in a class definition or declaration
+class_name_followers = frozenset((';','{',':','final'))
+
+def is_name(token):
+  '''Returns true if token is a (possibly qualified) identifier'''
+  return (name_regex.fullmatch(token) != None)
+
+def skip_angle_brackets(tokens, token_idx):
+  '''Returns index after the > matching the < at token_idx'''
+  depth = 0
+  while token_idx < len(tokens):
+    if (tokens[token_idx] == '<'):
+      depth += 1
+    elif (tokens[token_idx] == '>'):
+      depth -= 1
+      if (depth == 0):
+        return token_idx+1
+    elif (tokens[token_idx] == '>>'):
+      depth -= 2
+      if (depth <= 0):
+        return token_idx+1
+    elif (tokens[token_idx] in ('{',';')):
+      return token_idx
+    token_idx += 1
+  return token_idx
+
+def typedef_name(tokens, start_idx, end_idx):
+  '''Returns name declared by typedef spanning tokens[start_idx:end_idx],
+  handling function pointer typedefs of the form (*name)'''
+  for token_idx in range(start_idx, end_idx-2):
+    if (tokens[token_idx] == '(' and tokens[token_idx+1] == '*'
+        and is_name(tokens[token_idx+2])):
+      return tokens[token_idx+2]
+  paren_depth = 0
+  last_name = ''
+  for token_idx in range(start_idx, end_idx):
+    token = tokens[token_idx]
+    if (token == '(' or token == '['):
+      paren_depth += 1
+    elif (token == ')' or token == ']'):
+      paren_depth -= 1
+    elif (paren_depth == 0 and is_name(token)):
+      last_name = token
+  return last_name
+
+def find_closing_brace(tokens, token_idx):
+  '''Returns index of the } closing the { at token_idx, or len(tokens)'''
+  depth = 0
+  while token_idx < len(tokens):
+    if (tokens[token_idx] == '{'):
+      depth += 1
+    elif (tokens[token_idx] == '}'):
+      depth -= 1
+      if (depth == 0):
+        return token_idx
+    token_idx += 1
+  return token_idx
+
+def scan_types(tokens):
+  '''Makes a single pass over C++ tokens and returns a list of type names
+  declared by class, struct, union, enum, using alias, and typedef
+  declarations, including typedef struct { ... } name. Names nested in 
+  namespaces or classes are returned only fully qualified, ex. 
+  ns::Outer::Inner, as they are visible outside their scopes; CppParser makes
+  them visible unqualified inside the scopes with TypeRegistry.use_namespace
+  '''
+  type_names = []
+  known_names = set()
+  scope_stack = [] #(name or '', brace depth at which the scope closes)
+  brace_depth = 0
+  pending_scope = '' #name of class/namespace whose { is expected next
+  token_idx = 0
+
+  def add_name(name):
+    enclosing = [scope[0] for scope in scope_stack if scope[0] != '']
+    qualified_name = '::'.join(enclosing+[name])
+    if qualified_name not in known_names:
+      known_names.add(qualified_name)
+      type_names.append(qualified_name)
+
+  while token_idx < len(tokens):
+    token = tokens[token_idx]
+    next_token = string_at_or_empty(tokens, token_idx+1)
+    if (token == 'template' and next_token == '<'):
+      #template parameters like class T are not types outside the template
+      token_idx = skip_angle_brackets(tokens, token_idx+1)
+      continue
+    elif (token == '{'):
+      brace_depth += 1
+      scope_stack.append((pending_scope, brace_depth))
+      pending_scope = ''
+    elif (token == '}'):
+      if (len(scope_stack) > 0 and scope_stack[-1][1] == brace_depth):
+        scope_stack.pop()
+      brace_depth -= 1
+    elif (token == ';'):
+      pending_scope = ''
+    elif (token == 'namespace' and is_name(next_token)):
+      if (string_at_or_empty(tokens, token_idx+2) == '{'):
+        pending_scope = next_token
+      token_idx += 2
+      continue
+    elif (token == 'enum'):
+      name_idx = token_idx+1
+      if (string_at_or_empty(tokens, name_idx) in class_keywords):
+        name_idx += 1
+      if (is_name(string_at_or_empty(tokens, name_idx))):
+        add_name(tokens[name_idx])
+      token_idx = name_idx+1
+      continue
+    elif (token in class_keywords and is_name(next_token)):
+      if (string_at_or_empty(tokens, token_idx-1) != 'friend' and
+          string_at_or_empty(tokens, token_idx+2) in class_name_followers):
+        add_name(next_token)
+        if (string_at_or_empty(tokens, token_idx+2) != ';'):
+          pending_scope = next_token
+      token_idx += 2
+      continue
+    elif (token == 'using' and is_name(next_token)
+        and next_token != 'namespace'
+        and string_at_or_empty(tokens, token_idx+2) == '='):
+      add_name(next_token)
+      token_idx += 3
+      continue
+    elif (token == 'typedef'):
+      end_idx = token_idx+1
+      while (end_idx < len(tokens) and tokens[end_idx] != ';'
+          and tokens[end_idx] != '{'):
+        end_idx += 1
+      if (end_idx < len(tokens) and tokens[end_idx] == ';'):
+        name = typedef_name(tokens, token_idx+1, end_idx)
+        if (name != ''):
+          add_name(name)
+        token_idx = end_idx
+        continue
+      if (end_idx < len(tokens)):
+        #typedef of a class definition, the name follows its body, which is
+        #then scanned as usual
+        name_idx = find_closing_brace(tokens, end_idx)+1
+        name_end_idx = name_idx
+        while (name_end_idx < len(tokens) and tokens[name_end_idx] != ';'):
+          name_end_idx += 1
+        name = typedef_name(tokens, name_idx, name_end_idx)
+        if (name != ''):
+          add_name(name)
+    token_idx += 1
+  return type_names
+
+def scan_header_types(filenames):
+  '''Tokenizes each header in filenames and returns the type names declared
+  across all of them, so that types can be registered before any header is
+  parsed'''
+  type_names = []
+  known_names = set()
+  for filename in filenames:
+    for type_name in scan_types(gb_lexer.tokenize_file_cpp(filename)):
+      if type_name not in known_names:
+        known_names.add(type_name)
+        type_names.append(type_name)
+  return type_names
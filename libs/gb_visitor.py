@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+#implements visitors over token trees and a walker running several at once
+from gb_utils import *
+import gb_cpp_parser
+
+#constants
+#(attribute holding subtokens, attribute holding their access) for each kind
+#of token, see get_kind
+child_slots = {'class' : (('members','members_access'),), 
+    'namespace' : (('members',None),),
+    'function' : (('function_type',None),('args',None)),
+    'variable' : (('variable_type',None),('default',None)),
+    'type' : (('templates',None),('argtypes',None)), 
+    'expression' : (('subexpression',None),)}
+
+def get_kind(token_type):
+  '''Returns kind of tokens of token_type used to name visitor methods, the
+  TokenType name without the cpp_ prefix, ex. class'''
+  if token_type.name.startswith('cpp_'):
+    return token_type.name[4:]
+  return token_type.name
+
+class WalkContext:
+  '''Position of the token being visited in the tree'''
+  __slots__ = ('parents','hierarchy','access')
+
+  def __init__(self):
+    self.parents = [] #tokens enclosing the current token, from the root
+    self.hierarchy = [] #(name, kind) of enclosing classes and namespaces,
+                        #excluding the root
+    self.access = '' #access of the current token if it is a class member
+
+class Visitor:
+  '''Base class for visitors. Subclasses define visit_<kind>(token, context)
+  and leave_<kind>(token, context) methods for the kinds of token they handle,
+  ex. visit_function, where context is the WalkContext. visit_token and
+  leave_token handle kinds without their own method. If a visit method returns
+  False, the token's subtokens and leave method are skipped for this visitor.
+  Subtokens of kinds without a visit method are visited'''
+
+  def walk(self, token):
+    '''Visits tree with top-level token'''
+    walk(token, [self])
+
+class FusedVisitor:
+  '''Runs several visitors over a tree in a single traversal. Each visitor
+  sees the tokens in the same order as if it were run alone'''
+
+  def __init__(self, visitors):
+    self.visitors = list(visitors)
+    self.dispatch = dict() #token class -> (kind, methods), see get_methods
+
+  def get_methods(self, token):
+    '''Returns (kind, tuple of (visitor index, visit method, leave method)) 
+    for tokens of the class of token, methods are None if a visitor does not
+    handle them'''
+    dispatch_entry = self.dispatch.get(token.__class__)
+    if (dispatch_entry == None):
+      kind = get_kind(token.token_type)
+      methods = []
+      for visitor_idx in range(len(self.visitors)):
+        visitor = self.visitors[visitor_idx]
+        visit = getattr(visitor, 'visit_'+kind, None)
+        if (visit == None):
+          visit = getattr(visitor, 'visit_token', None)
+        leave = getattr(visitor, 'leave_'+kind, None)
+        if (leave == None):
+          leave = getattr(visitor, 'leave_token', None)
+        methods.append((visitor_idx, visit, leave))
+      dispatch_entry = (kind, tuple(methods))
+      self.dispatch[token.__class__] = dispatch_entry
+    return dispatch_entry
+
+  def walk(self, root):
+    '''Visits tree with top-level token root iteratively in depth-first order.
+    Subtrees are skipped once every visitor has returned False for them'''
+    context = WalkContext()
+    #stack of (token, access, indices of visitors skipping it, leaving)
+    stack = [(root, '', frozenset(), False)]
+    while (len(stack) > 0):
+      (token, access, skipped, leaving) = stack.pop()
+      (kind, methods) = self.get_methods(token)
+      if leaving:
+        context.parents.pop()
+        if (kind in ('class','namespace') and len(context.parents) > 0):
+          context.hierarchy.pop()
+        context.access = access
+        for (visitor_idx, visit, leave) in methods:
+          if (leave != None and visitor_idx not in skipped):
+            leave(token, context)
+        continue
+      context.access = access
+      newly_skipped = []
+      for (visitor_idx, visit, leave) in methods:
+        if (visit != None and visitor_idx not in skipped):
+          if (visit(token, context) == False):
+            newly_skipped.append(visitor_idx)
+      child_skipped = skipped
+      if (len(newly_skipped) > 0):
+        if (len(skipped)+len(newly_skipped) == len(self.visitors)):
+          continue
+        child_skipped = skipped.union(newly_skipped)
+      stack.append((token, access, child_skipped, True))
+      if (kind in ('class','namespace') and len(context.parents) > 0):
+        context.hierarchy.append((token.name, kind))
+      context.parents.append(token)
+      children = []
+      for (slot, access_slot) in child_slots.get(kind, ()):
+        subtokens = getattr(token, slot, ())
+        if not isinstance(subtokens, (list, tuple)):
+          if (subtokens.token_type == gb_cpp_parser.TokenType.unparsed):
+            #placeholder for absent subtoken
+            continue
+          subtokens = (subtokens,)
+        subtokens_access = None
+        if (access_slot != None):
+          subtokens_access = getattr(token, access_slot)
+        for subtoken_idx in range(len(subtokens)):
+          subtoken = subtokens[subtoken_idx]
+          subtoken_access = ''
+          if (subtokens_access != None):
+            subtoken_access = subtokens_access[subtoken_idx]
+          children.append((subtoken, subtoken_access, child_skipped, False))
+      children.reverse()
+      stack += children
+
+def walk(root, visitors):
+  '''Visits tree with top-level token root with each of visitors in a single
+  traversal'''
+  FusedVisitor(visitors).walk(root)
+
+class StatisticsVisitor(Visitor):
+  '''Counts the declarations in a tree'''
+
+  def __init__(self):
+    self.counts = dict() #token type -> number of tokens
+    self.public_functions = 0
+    self.function_args = 0
+    self.max_depth = 0
+
+  def visit_token(self, token, context):
+    self.counts[token.token_type] = self.counts.get(token.token_type, 0)+1
+    self.max_depth = max(self.max_depth, len(context.hierarchy))
+
+  def visit_function(self, token, context):
+    self.visit_token(token, context)
+    if (context.access in ('','public')):
+      self.public_functions += 1
+    self.function_args += len(token.args)
+    return False
+
+  def visit_variable(self, token, context):
+    self.visit_token(token, context)
+    return False
+
+  def report(self):
+    '''Returns a one line summary of the counts'''
+    kind_counts = sorted([(get_kind(token_type), self.counts[token_type]) 
+        for token_type in self.counts])
+    return ('declarations: '+', '.join([str(count)+' '+kind
+        for (kind, count) in kind_counts])+'; {} public functions, {} '
+        'arguments, max depth {}'.format(self.public_functions,
+        self.function_args, self.max_depth))
+
+class TokenPrinter(Visitor):
+  '''Visitor that prints the structure of a token tree'''
+
+  def print_access(self, context):
+    if (context.access != ''):
+      print(context.access,end=' ')
+
+  def print_separator(self, context):
+    if (len(context.parents) > 0):
+      print(', ')
+
+  def visit_class(self, token, context):
+    self.print_access(context)
+    print('class '+token.name)
+
+  def leave_class(self, token, context):
+    print('] (end class '+token.name+')')
+    self.print_separator(context)
+
+  def visit_namespace(self, token, context):
+    print('namespace '+token.name)
+    print('members: [')
+
+  def leave_namespace(self, token, context):
+    print('] (end namespace '+token.name+')')
+    self.print_separator(context)
+
+  def visit_enum(self, token, context):
+    self.print_access(context)
+    print('enum ', end='')
+    if (token.is_enum_class):
+      print('class ',end='')
+    print('[', end='')
+    for enum in token.enums:
+      print(','+enum)
+    print(']')
+    self.print_separator(context)
+    return False
+
+  def visit_function(self, token, context):
+    self.print_access(context)
+    print('function '+token.name)
+    print('type: ',end='')
+    if (token.function_type.token_type == gb_cpp_parser.TokenType.cpp_type):
+      print(gb_cpp_parser.get_type_string(token.function_type),end='')
+    print(', args: [')
+    for arg in token.args:
+      print(gb_cpp_parser.get_variable_string(arg)+', ',end='')
+    print(']')
+    self.print_separator(context)
+    return False
+
+  def visit_variable(self, token, context):
+    self.print_access(context)
+    print(gb_cpp_parser.get_variable_string(token),end='')
+    self.print_separator(context)
+    return False
+
+  def visit_type(self, token, context):
+    print(gb_cpp_parser.get_type_string(token),end='')
+    return False
+
+  def visit_expression(self, token, context):
+    print(gb_cpp_parser.get_expression_string(token),end='')
+    return False
+
+  def visit_opaque(self, token, context):
+    self.print_access(context)
+    print('opaque '+str(token.span),end='')
+    self.print_separator(context)
+    return False
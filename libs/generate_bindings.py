@@ -1,30 +1,29 @@
 #!/usr/bin/env python3
 #script to automatically generate ctypes python bindings for draw_pico
-import enum
+from gb_utils import *
+from gb_cpp_parser import ExpressionType, TokenType, make_type, operator_names
+import argparse
+import functools
+import gb_binding_ir
+import gb_build
+import gb_emitter
+import gb_output
+import gb_parallel
+import gb_reachability
+import gb_symbol_index
+import gb_visitor
+import keyword
+import os
 import re
+import zlib
 
 #constants
-debug_mode = True
-
-#lexing
-token_chars_multi = ['++','--','<=','>=','==','!=','&&','||','<<','>>','+=',
-    '-=','*=','/=','%=','->','<<=','>>=','&=','|=','^=','...','::','//']
-token_chars = ['+','-','*','/','%','<','>','!','&','|','~','^','=','?',':',
-    '(',')','[',']','=',',','"','\'','{','}',';','.','\\','#']
-digits = ['0','1','2','3','4','5','6','7','8','9']
-
-#parsing
-c_types = ['bool','char','short','int','long','long long','float','double',
-    'void',]
 std_types = ['std::size_t','std::string','std::map','std::vector','std::set',
     'std::unordered_map']
 otherlib_types = [] #root, etc.
 drawpico_types = ['Axis','NamedFunc','PlotOpt','PlotOptTypes::BottomType',
     'PlotOptTypes::YAxisType','PlotOptTypes::TitleType',
     'PlotOptTypes::StackType','PlotOptTypes::OverflowType']
-all_types = c_types+std_types+otherlib_types+drawpico_types
-type_prefix_tokens = ['const','volatile','unsigned','signed','restrict',
-    'volatile','static','register','extern','thread_local','mutable']
 
 #wrapping, everything else used as pointer and casted to void*
 wrapper_c_types = {'void':'void', 'bool':'int', 'char':'char', 
@@ -45,1193 +44,17 @@ python_types = {'bool':'bool', 'char':'str',
     'unsigned short':'int', 'unsigned int':'int', 
     'unsigned long':'int', 'unsigned long long':'int',
     'std::set':'list', 'std::vector':'list'}
-operator_names = {'operator+':'__add__','operator-':'__sub__',
-    'operator*':'__mul__','operator/':'__truediv__','operator%':'__mod__',
-    'operator^':'__xor__','operator&':'__and__','operator|':'__or__',
-    'operator!':'__invert__','operator,':'operatorcomma',
-    'operator=':'operatorequals','operator<':'__lt__','operator>':'__gt__',
-    'operator<=':'__le__','operator>=':'__ge__',
-    'operator++':'operatorplusplus','operator--':'operatorminusminus',
-    'operator<<':'__lshift__','operator>>':'__rshift__','operator==':'__eq__',
-    'operator!=':'__ne__','operator&&':'__and__','operator||':'__or__',
-    'operator+=':'__iadd__','operator-=':'__isub__','operator*=':'__imul__',
-    'operator/=':'__idiv__','operator%=':'__imod__','operator^=':'__ixor__',
-    'operator&=':'__iand__','operator|=':'__ior__','operator<<=':'__ilshift__',
-    'operator>>=':'__irshift__','operator[]':'operatorsquarebrackets',
-    'operator()':'operatorparentheses','operator->':'operatorminusgreater',
-    'operator->*':'operatorminusgreaterasterisk'}
-
-#-----------------------------------------------------------------------------
-#                                  utilities
-#-----------------------------------------------------------------------------
-def list_at_or_empty(target_list, idx):
-  '''Returns element of target_list at index idx or []'''
-  if idx > 0 and idx < len(target_list):
-    return list_[idx]
-  return []
-
-def string_at_or_empty(string, idx):
-  '''Returns char of string at index idx or empty string'''
-  if idx > 0 and idx < len(string):
-    return string[idx]
-  return ''
-
-def debug(message):
-  if (debug_mode==True):
-    print('DEBUG: ',end='')
-    print(message)
-
-def error(message):
-  print('ERROR: ',end='')
-  print(message)
+#C++ names of the operators named by the parser, ex. operator+ for __add__
+cpp_operator_names = dict([(name, 'operator'+symbol) 
+    for (symbol, name) in operator_names.items()])
 
 #-----------------------------------------------------------------------------
-#                                    lexer
+#                             wrapper generation
 #-----------------------------------------------------------------------------
+#type mapping functions are memoized on the type token, so they must only be
+#passed canonical types from gb_cpp_parser.make_type or intern_type
 
-def compile_regex_list(regex_list):
-  regex = '('
-  for token_idx in range(len(regex_list)):
-    if (token_idx != 0):
-      regex += '|'
-    regex += '(?:'+regex_list[token_idx]+')'
-  regex += ')'
-  return re.compile(regex)
-
-#define regex constant
-cpp_regex_list = [
-    r'//.*\n', #line comment
-    r'/\*[^\*]*(?:\*[^/][^\*]*)*\*/', #bulk comment
-    r'#.*\n', #preprocessor directive
-    r'"(?:[^"\\]*)(?:\\.[^"\\]*)*"', #string literal
-    '\'(?:[^\\\\]|\\\\.)\'', #char literal
-    r'\d+(?:\.\d*)?(?:e(?:\+\-)?\d+)?', #numeric literal
-    r'\+\+',r'--',r'<=',r'>=',r'==',r'!=',r'&&',r'\|\|',r'<<',r'>>',
-    r'\+=',r'-=',r'\*=',r'/=',r'%=',r'->',r'<<=',r'>>=',r'&=',r'\|=',r'\^=',
-    r'\.\.\.',r'//',r'\+',r'-',r'\*',r'/',r'%',r'<',r'>',r'!',r'&',r'\|',
-    r'~',r'\^',r'=',r'\?',r':',r'\(',r'\)',r'\[',r'\]',r'\{',r'\}',r'=',
-    r',',r'"','\'',r';',r'\.',r'\\',r'#', #special character(s)
-    r'[a-zA-Z_]\w*(?:::[a-zA-Z_]\w*)*'#name
-    ]
-cpp_regex = compile_regex_list(cpp_regex_list)
-
-def tokenize_file_cpp(filename):
-  '''Read file, split content into C++ tokens, and return list of tokens, omitting comments and preprocessor directives'''
-  header_file = open(filename,'r')
-  tokens = re.findall(cpp_regex, header_file.read())
-  header_file.close()
-  token_idx = 0
-  token_remove_list = []
-  while token_idx < len(tokens):
-    if tokens[token_idx][0] == '#':
-      token_remove_list.append(token_idx)
-    elif len(tokens[token_idx]) > 1:
-      if tokens[token_idx][0:2] == '//':
-        token_remove_list.append(token_idx)
-      elif tokens[token_idx][0:2] == '/*':
-        token_remove_list.append(token_idx)
-    token_idx += 1
-  token_remove_list.reverse()
-  for token_remove_idx in token_remove_list:
-    tokens.pop(token_remove_idx)
-  return tokens
-
-#def tokenize_line(string):
-#  '''Lexer that returns C++ tokenized list from string'''
-#  string = string.replace('\n','')
-#  tokenized_string = []
-#  running_string = ''
-#  char_idx = 0
-#  in_char_literal = False
-#  in_string_literal = False
-#  while char_idx < len(string):
-#    char = string[char_idx]
-#    if (char==' ' and not in_char_literal and not in_string_literal):
-#      #end of a token, append to token list
-#      if (running_string != ''):
-#        tokenized_string.append(running_string)
-#        running_string = ''
-#    elif char in token_chars:
-#      if in_char_literal:
-#        if (char=='\''):
-#          is_escaped = False
-#          if (len(running_string)==2):
-#            if (running_string[-1]=='\\'):
-#              #char is '\'', not the end
-#              is_escaped = True
-#          if not is_escaped:
-#            running_string += char
-#            tokenized_string.append(running_string)
-#            running_string = ''
-#            in_char_literal = False
-#      elif in_string_literal:
-#        if (char=='\"'):
-#          is_escaped = False
-#          str_idx = 0
-#          while str_idx < len(running_string):
-#            if (running_string[str_idx] == '\\'):
-#              if (str_idx == len(running_string)-1):
-#                is_escaped = True
-#              str_idx += 2
-#            str_idx += 1
-#          if not is_escaped:
-#            running_string += char
-#            tokenized_string.append(running_string)
-#            running_string = ''
-#            in_string_literal = False
-#      else:
-#        found_multichar_token = False
-#        if (char_idx!=(len(string)-2)):
-#          if (string[char_idx:char_idx+3] in token_chars_multi):
-#            tokenized_string.append(running_string)
-#            tokenized_string.append(string[char_idx:char_idx+3])
-#            running_string = ''
-#            char_idx += 2
-#            found_multichar_token = True
-#        if (not found_multichar_token and (char_idx!=(len(string)-1))):
-#          if (string[char_idx:char_idx+2] in token_chars_multi):
-#            if (string[char_idx:char_idx+2] == '::'):
-#              running_string += '::'
-#              char_idx += 1
-#              found_multichar_token = True
-#            elif (string[char_idx:char_idx+2] == '//'):
-#              tokenized_string.append(running_string)
-#              running_string = ''
-#              found_multichar_token = True
-#              char_idx = len(string) #skip rest
-#            else:
-#              tokenized_string.append(running_string)
-#              tokenized_string.append(string[char_idx:char_idx+2])
-#              running_string = ''
-#              char_idx += 1
-#              found_multichar_token = True
-#        if not found_multichar_token:
-#          if (char=='\''):
-#            tokenized_string.append(running_string)
-#            running_string = char
-#            in_char_literal = True
-#          elif (char=='\"'):
-#            tokenized_string.append(running_string)
-#            running_string = char
-#            in_string_literal = True
-#          else:
-#            tokenized_string.append(running_string)
-#            tokenized_string.append(char)
-#            running_string = ''
-#    else:
-#      running_string += char
-#    char_idx += 1
-#  tokenized_string.append(running_string)
-#  #resolve numeric literals ((-)?\d+(.)?\d+(e(-|+)?d+)?), but leave ambiguous -
-#  #. and - are special tokens, e is not
-#  tokenized_string = [i for i in tokenized_string if i != '']
-#  token_idx = 0
-#  while token_idx < len(tokenized_string):
-#    if tokenized_string[token_idx][0] in digits:
-#      if (list_at_or_empty(tokenized_string, token_idx+1)=='.'):
-#        two_tokens_ahead = list_at_or_empty(tokenized_string, token_idx+2)
-#        if (len(two_tokens_ahead)>0):
-#          if (two_tokens_ahead[0] in digits):
-#            if (tokenized_string[token_idx+2][-1]=='e'):
-#              #to have been split, the next token must be - or +
-#              tokenized_string = (tokenized_string[0:token_idx] + 
-#                  [''.join(tokenized_string[token_idx:token_idx+5])] + 
-#                  tokenized_string[token_idx+5:])
-#            else: #not scientific
-#              tokenized_string = (tokenized_string[0:token_idx] + 
-#                  [''.join(tokenized_string[token_idx:token_idx+3])] + 
-#                  tokenized_string[token_idx+3:])
-#          else: #token two ahead isn't numeric
-#            tokenized_string = (tokenized_string[0:token_idx] + 
-#                [tokenized_string[token_idx]+ tokenized_string[token_idx+1]] + 
-#                tokenized_string[token_idx+2:])
-#        else: #no token two tokens ahead
-#          tokenized_string = (tokenized_string[0:token_idx] + 
-#              [tokenized_string[token_idx]+ tokenized_string[token_idx+1]] + 
-#              tokenized_string[token_idx+2:])
-#    token_idx += 1
-#  return tokenized_string
-#
-#def tokenize_file(filename):
-#  #all_tokens = []
-#  #with open(filename) as header_file:
-#  #  for line in header_file:
-#  #    if (line[0]=='#'):
-#  #      #skip preprocessor lines
-#  #      continue
-#  #    tokenized_line = tokenize_line(line)
-#  #    all_tokens += tokenized_line
-#  #debug(all_tokens)
-#  #return all_tokens
-#  header_file = open(filename,'r')
-#  tokens = tokenize_cpp(header_file.read())
-#  header_file.close()
-#  return tokens
-
-#-----------------------------------------------------------------------------
-#                                 parser
-#-----------------------------------------------------------------------------
-class TokenType(enum.Enum):
-  unparsed = 0
-  cpp_type = 1
-  cpp_class = 2
-  cpp_namespace = 3
-  cpp_function = 4
-  cpp_variable = 5
-  cpp_expression = 6
-  cpp_enum = 7
-
-class ExpressionType(enum.Enum):
-  unimplemented = 0
-  string_literal = 1
-  initializer_list = 2
-  numeric_literal = 3
-  char_literal = 4
-
-class Token:
-  def __init__(self):
-    self.token_type = TokenType.unparsed
-
-class ClassToken(Token):
-  def __init__(self):
-    self.name = ''
-    self.parents = []
-    self.parents_access = []
-    self.members = [] #list of tokens
-    self.members_access = []
-    self.token_type = TokenType.cpp_class
-    self.current_access = 'public'
-
-class FunctionToken(Token):
-  def __init__(self):
-    self.name = ''
-    self.function_type = Token() #type token
-    self.args = [] #list of variable tokens
-    self.is_default = False
-    self.token_type = TokenType.cpp_function
-
-class NamespaceToken(Token):
-  def __init__(self):
-    self.name = ''
-    self.members = [] #list of tokens
-    self.token_type = TokenType.cpp_namespace
-
-class TypeToken(Token):
-  def __init__(self):
-    self.base_type = ''
-    self.signed = ''
-    self.cv_qualifier = ''
-    self.templates = [] #list of type tokens
-    self.token_type = TokenType.cpp_type
-
-class VariableToken(Token):
-  def __init__(self):
-    self.name = ''
-    self.variable_type = Token() #type token
-    self.default = Token() #expression token
-    self.token_type = TokenType.cpp_variable
-
-class ExpressionToken(Token):
-  def __init__(self):
-    self.subexpressions = [] #list of expression tokens
-    self.literal_value = ''
-    self.expression_type = ExpressionType.unimplemented
-    self.token_type = TokenType.cpp_expression
-
-class EnumToken(Token):
-  def __init__(self):
-    self.name = ''
-    self.enums = []
-    self.enum_values = []
-    self.is_enum_class = False
-    self.token_type = TokenType.cpp_enum
-
-#for debugging
-def traverse_token(token):
-  '''Debugging function that traverses a token tree with top-level token and 
-  prints structure'''
-  if (token.token_type == TokenType.cpp_class):
-    print('class '+token.name)
-    subtoken_idx = 0
-    for subtoken in token.members:
-      print(token.members_access[subtoken_idx],end='')
-      traverse_token(subtoken)
-      print(', ')
-      subtoken_idx += 1
-    print('] (end class '+token.name+')')
-  elif (token.token_type == TokenType.cpp_function):
-    print('function '+token.name)
-    print('type: ',end='')
-    traverse_token(token.function_type)
-    print(', args: [')
-    for subtoken in token.args:
-      traverse_token(subtoken)
-      print(', ',end='')
-    print(']')
-  elif (token.token_type == TokenType.cpp_namespace):
-    print('namespace '+token.name)
-    print('members: [')
-    for subtoken in token.members:
-      traverse_token(subtoken)
-      print(', ')
-    print('] (end namespace '+token.name+')')
-  elif (token.token_type == TokenType.cpp_type):
-    if (token.signed == 'unsigned'):
-      print('unsigned ',end='')
-    print(token.base_type, end='')
-    if len(token.templates)>0:
-      print('<',end='')
-      for subtoken in token.templates:
-        traverse_token(subtoken)
-        print(',',end='')
-      print('>',end='')
-  elif (token.token_type == TokenType.cpp_variable):
-    print('variable ',end='')
-    traverse_token(token.variable_type)
-    print(' '+token.name,end='')
-    if token.default.token_type == TokenType.cpp_expression:
-      print(' = ',end='')
-      traverse_token(token.default)
-  elif (token.token_type == TokenType.cpp_expression):
-    print(token.literal_value+'[',end='')
-    for subtoken in token.subexpression:
-      traverse_token(token.subexpression)
-    print(']',end='')
-  else:
-    print('{unknown token}',end='')
-
-class Parser:
-  '''Class implementing skeleton of a basic parser'''
-
-  def __init__(self, tokens):
-    '''Initializes parser from tokens'''
-    self.tokens = tokens
-    self.position = 0
-
-  def eval_token_regex_string(self, regex_string):
-    '''Parses a token regex string. Space is treated as a token delimiter 
-    unless escaped. <> are special characters that indicate a method should
-    be called and the token at this location should be passed to the method. 
-    [] are special characters that indicate another token regex should be
-    inserted at this spot.
-    Returns a python list of tuples representing the regex'''
-    split_string = regex_string.split(' ')
-    return eval_token_regex_split_string(split_string)
-
-  def eval_token_regex_split_string(self, split_string):
-    '''Same as eval_token_regex_string but after str.split is called'''
-    regex_list = []
-    token_idx = 0
-    buffer_or = False
-    while token_idx < len(split_string):
-      if (split_string[token_idx]=='('):
-        #beginning of block
-        token_idx_2 = token_idx
-        while split_string[token_idx_2] != ')':
-          if (token_idx_2 == len(split_string)-1):
-            error('Unmatched parentheses in parser regex')
-          token_idx_2 += 1
-        regex_list.append(
-            ('block',eval_token_regex_split_string[token_idx+1,token_idx_2]))
-        token_idx = token_idx_2
-      elif (split_string[token_idx]=='?'):
-        #optional
-        regex_list = regex_list[:-1] + [('optional',[regex_list[-1]])]
-      elif (split_string[token_idx]=='*'):
-        #any
-        regex_list = regex_list[:-1] + [('any',[regex_list[-1]])]
-      elif (split_string[token_idx]=='+'):
-        #express one or more as 1 + any
-        regex_list = regex_list[] + [('any',[regex_list[-1]])]
-      elif (split_string[token_idx]=='|'):
-        #buffer or, continue from here since buffered or checks at end
-        #after next token (group), or will be inserted
-        buffer_or = True
-        token_idx += 1
-        continue 
-      elif (string_at_or_empty(split_string[token_idx],0) == '<'):
-        #method call
-        method_string = split_string[token_idx]
-        regex_list.append(('methodcall',method_string[1:-1]))
-      elif (string_at_or_empty(split_string[token_idx],0) == '['):
-        #subtoken
-        method_string = split_string[token_idx]
-        colon_idx = method_string.index(':')
-        regex_list.append(('subtoken',method_string[1:colon_idx],method_string[colon_idx+1:-1]))
-      else:
-        #fixed name
-        #add tuple ('fixedname', name)
-        string_idx = 0
-        name_string = split_string[token_idx]
-        while string_idx < range(len(name_string)):
-          if (name_string[string_idx]=='\\'):
-            name_string = (name_string[0:string_idx]
-                +name_string[string_idx+1:])
-            string_idx += 1
-          string_idx += 1
-        regex_list.append(('fixedname',name_string))
-      #if or is buffered, combine last two tokens
-      if (buffer_or):
-        regex_list = regex_list[:-2] + [('or',[regex_list[:-2]],[regex_list[:-1]])]
-        buffer_or = False
-      token_idx += 1
-    return regex_list
-
-  def get_regex_by_token_type(token_type):
-    '''method to get a regex list from a name of a token type. To be extended
-    in derived classes'''
-    error('Invalid token type received.')
-    return []
-
-  def make_token_by_type(token_type):
-    '''method to make a python token object from a name of a token type. To be 
-    extended in derived classes'''
-    error('Invalid token type received.')
-    return None
-
-  def eval_parser(self, regex_list, py_token=None):
-    '''Evaluates tokens starting from current position, attempting to interpret
-    them according to regex_list. If py_token is not none, any method calls
-    encountered will be applied to that token.
-    Returns 2 values, a status that is 1 if regex successfully matches, -1 if it
-    fails, and tuple of (a list of setmethod calls, a list of setmethod values)
-    '''
-    #parser_regex = eval_token_regex_string('')
-    #check if parser regex matches 
-    original_pos = self.position
-    params_to_set = []
-    values_to_set = []
-    regex_pos = 0
-    while (regex_pos < len(regex_list)):
-      current_regex = regex_list[regex_pos]
-      if (current_regex[0]=='fixedname'):
-        #assert token matches string
-        if (self.tokens[self.position] != current_regex[1]):
-          self.position = original_pos
-          return -1, ([], [])
-        else:
-          regex_pos += 1
-          self.position += 1
-      elif (current_regex[0]=='methodcall'):
-        #set py_token parameters based on token if we get to the end
-        params_to_set.append(current_regex[1])
-        values_to_set.append(self.tokens[token_pos])
-        regex_pos += 1
-        self.position += 1
-      elif (current_regex[0]=='block'):
-        #recurse one time
-        status, params_inner = self.eval_parser(self, current_regex[1])
-        if (status == -1):
-          self.position = original_pos
-          return -1, ([], [])
-        params_to_set += params_inner[0]
-        values_to_set += params_inner[1]
-        regex_pos += 1
-      elif (current_regex[0]=='subtoken'):
-        #recurse one time
-        subtoken_regex = self.get_regex_by_token_type(current_regex[2])
-        new_token = self.make_token_by_type(current_regex[2])
-        status, ntparams = self.eval_parser(self, subtoken_regex, new_token)
-        if (status != -1):
-          self.position = original_pos
-          return -1, ([], [])
-        params_to_set += params_inner[current_regex[1]]
-        values_to_set += params_inner[new_token]
-        regex_pos += 1
-      elif (current_regex[0]=='optional'):
-        #attempt to recurse one time
-        status, params_inner = self.eval_parser(self, current_regex[1])
-        if (status != -1):
-          params_to_set += params_inner[0]
-          values_to_set += params_inner[1]
-        regex_pos += 1
-      elif (current_regex[0]=='any'):
-        #attempt to recurse until fail
-        status = 1
-        while (status != -1):
-          status, params_inner = self.eval_parser(self, current_regex[1])
-          if (status != -1):
-            params_to_set += params_inner[0]
-            values_to_set += params_inner[1]
-        regex_pos += 1
-      elif (current_regex[0]=='or'):
-        #try two possible expressions
-        status, params_inner = self.eval_parser(self, current_regex[1])
-        if (status == -1):
-          status, params_inner = self.eval_parser(self, current_regex[2])
-          if (status == -1):
-            self.position = original_pos
-            return -1, ([], [])
-        params_to_set += params_inner[0]
-        values_to_set += params_inner[1]
-        regex_pos += 1
-      else:
-        error('Unknown parser regex type encountered')
-        regex_pos += 1
-    #set parameters
-    if (py_token != None):
-      param_idx = 0
-      while (param_idx < len(params_to_set)):
-        valid = self.set_parameters(py_token, params_to_set[param_idx], 
-            values_to_set[param_idx])
-        if not valid:
-          self.position = original_position
-          return -1, ([], [])
-        param_idx += 1
-    return 1, (params_to_set, values_to_set)
-
-class CppParser(Parser):
-  '''Class implementing a basic C++ parser'''
-
-  def set_parameters(self, py_token, param_name, param_value):
-    '''Set parameter of token and return true, or return false if param_value
-    incompatible with param_name'''
-    if (param_name == 'accessmodifier'):
-      py_token.current_access = param_value
-      return True
-    elif (param_name == 'arg'):
-      py_token.args.append(param_value)
-      return True
-    elif (param_name == 'charliteral'):
-      if (re.fullmatch('\'.*\'',param_value) != None):
-        py_token.literalvalue = param_value
-        py_token.expression_type = ExpressionType.char_literal
-        return True
-      return False
-    elif (param_name == 'constructor'):
-      py_token.name = '__init__'
-      py_token.function_type = param_value
-      return True
-    elif (param_name == 'clmember'):
-      py_token.members.append(param_value)
-      py_token.members_access.append(py_token.current_access)
-      return True
-    elif (param_name == 'cvqualifier'):
-      if (param_value == 'const' or param_value == 'volatile'):
-        py_token.cv_qualifier = param_value
-        return True
-      return False
-    elif (param_name == 'default'):
-      py_token.default = param_value
-      return True
-    elif (param_name == 'destructor'):
-      py_token.name = '__del__'
-      py_token.function_type = 'void'
-      return True
-    elif (param_name == 'enum'):
-      py_token.enums.append(param_value)
-      py_token.enum_values.append('')
-      return True
-    elif (param_name == 'enumdefault'):
-      py_token.enum_values[-1] = param_value
-      return True
-    elif (param_name == 'functionbody'):
-      if (param_value != ';'):
-        return True
-      return False
-    elif (param_name == 'functiondefault'):
-      if (param_value == 'default' or param_value == 'delete'):
-        py_token.is_default = True
-        return True
-      return False
-    elif (param_name == 'functiontypequalifier'):
-      if (param_value == 'inline' or param_value == 'virtual' or 
-          param_value == 'explicit' or param_value == 'friend' or
-          param_value == 'constexpr'):
-        return True
-      return False
-    elif (param_name == 'functiontype'):
-      py_token.function_type = param_value
-      return True
-    elif (param_name == 'initlist'):
-      py_token.subtokens.append(param_value)
-      py_token.expression_type = ExpressionType.initializer_list
-      return True
-    elif (param_name == 'isenumclass'):
-      py_token.is_enum_class = True
-      return True
-    elif (param_name == 'longtypename'):
-      if (param_value == 'int'):
-        py_token.base_type = 'long'
-        return True
-      elif (param_value == 'long'):
-        py_token.base_type = 'long long'
-        return True
-      elif (param_value == 'double'):
-        py_token.base_type = 'long double'
-        return True
-      return False
-    elif (param_name == 'member'):
-      py_token.mambers.append(param_value)
-      return True
-    elif (param_name == 'name'):
-      py_token.name = param_value
-      return True
-    elif (param_name == 'numericliteral'):
-      if (re.fullmatch(r'\d+(?:\.\d*)?(?:e(?:\+\-)?\d+)?',param_value) != None):
-        py_token.literalvalue = param_value
-        py_token.expression_type = ExpressionType.numeric_literal
-        return True
-      return False
-    elif (param_name == 'parentaccess'):
-      py_token.parents_access.append(param_value)
-      return True
-    elif (param_name == 'parent'):
-      py_token.parents.append(param_value)
-      return True
-    elif (param_name == 'passqualifier'):
-      if (param_value == '&' or param_value == '&&'):
-        return True
-      return False
-    elif (param_name == 'pointer'):
-      if (param_value == '*'):
-        new_py_token = TypeToken()
-        new_py_token.base_type = 'pointer'
-        new_py_token.templates = [py_token]
-        py_token = new_py_token
-        return True
-      return False
-    elif (param_name == 'signedqualifier'):
-      if (param_value == 'signed'):
-        return True
-      if (param_value == 'unsigned'):
-        py_token.signed = 'unsigned'
-        return True
-      return False
-    elif (param_name == 'shorttypename'):
-      if (param_value == 'int'):
-        py_token.base_type = 'short'
-        return True
-      return False
-    elif (param_name == 'storagequalifier'):
-      if (param_value == 'static' or param_value == 'thread_local' or
-          param_value == 'extern' or param_value == 'mutable'):
-        return True
-      return False
-    elif (param_name == 'stringliteral'):
-      if (re.fullmatch(r'".*"',param_value) != None):
-        py_token.literalvalue = param_value
-        py_token.expression_type = ExpressionType.string_literal
-        return True
-      return False
-    elif (param_name == 'template'):
-      py_token.templates.append(param_value)
-      return True
-    elif (param_name == 'typename'):
-      if (param_value in all_types):
-        py_token.base_type = param_value
-        return True
-      return False
-    elif (param_name == 'variabletype'):
-      py_token.variable_type = param_value
-      return True
-    else:
-      error('unknown parameter name '+param_name)
- 
-  def make_token_by_type(self, token_type):
-    '''Returns a new token of token_type'''
-    if (token_type == 'class'):
-      return ClassToken()
-    else if (token_type == 'enum'):
-      return EnumToken()
-    elif (token_type == 'expression'):
-      return ExpressionToken()
-    elif (token_type == 'function'):
-      return FunctionToken()
-    elif (token_type == 'namespace'):
-      return NamespaceToken()
-    elif (token_type == 'variable'):
-      return VariableToken()
-    elif (token_type == 'type'):
-      return TypeToken()
-    error('Invalid token type received')
-    return Token()
-
-  def get_regex_by_token_type(self, token_type):
-    '''method to get a regex list to interpret a C++ object from a name of a 
-    token type.'''
-    if (token_type == 'class'):
-      return self.eval_token_regex_string(r'class <name> ( : <parentaccess> '
-          r'<parent> ( , <parentaccess> <parent> ) * ) ? \{ ( ( '
-          r'<accessmodifier> : ) | ( [clmember:class] ; ) | ( '
-          r'[clmember:function] ; ) | '
-          r'( [clmember:variable] ; ) | ( [clmember:enum] ; ) ) * \}')
-    elif (token_type == 'enum'):
-      return self.eval_token_regex_string(r'enum ( : <isenumclass> ) ? <name> \{ '
-          r'<enum> ( = <enumdefault> ) ? ( , <enum> ? ( = <enumdefault> ) ) * '
-          r'\}')
-    elif (token_type == 'expression'):
-      return self.eval_token_regex_string(r'<stringliteral> | <charliteral> | '
-          r'<numericliteral> | ( \{ [initlist:expression] ? ( , '
-          r'[initlist:expression] ) * \} )')
-    elif (token_type == 'function'):
-      return self.eval_token_regex_string(r'( [functiontype:type] <name> ) | '
-          r'[constructor:type] | ( ~ [destructor:type] ) \( '
-          r'[arg:variable] ( , [arg:variable] ) * \) <funcconst> ? ( = '
-          r'<functiondefault> ) ? ( \{ <functionbody> * \} ) ?')
-    elif (token_type == 'namespace'):
-      return self.eval_token_regex_string(r'namespace <name> { ( '
-          r'[member:namespace] | ( [member:class] ; ) | ( [member:function] ; ) '
-          r'( [member:variable] ; ) | ( [member:enum] ; ) ) * }')
-    elif (token_type == 'type'):
-      return self.eval_token_regex_string(r'( <cvqualifier> | '
-          r'<storagequalifier> | <signedqualifier> | <functiontypequalifier> '
-          r') * (short <shorttypename> | long <longtypename> | <typename>) '
-          r'\< [template:type] ( , [template:type] ) * \> <pointer> * '
-          r'<passqualifier> ?')
-    elif (token_type == 'variable'):
-      return self.eval_token_regex_string(r'[variabletype:type] <name> ( = '
-          '[default:expression] | \( [default:expression] \) )')
-    error('Invalid token type received.')
-    return []
-
-  def eval(self):
-    global_token = NamespaceToken
-    global_token.Name = 'Global'
-    global_regex = self.eval_token_regex_string(r'( '
-          r'[member:namespace] | ( [member:class] ; ) | ( [member:function] ; ) '
-          r'( [member:variable] ; ) | ( [member:enum] ; ) ) *')
-    Parser.eval_parser(self, global_regex, global_token)
-    return global_token
-
-
-#class Parser:
-#  '''Class implementing basic C++ parser'''
-#
-#  def __init__(self, tokens):
-#    '''Initializes parser from tokens'''
-#    self.tokens = tokens
-#    self.position = 0
-#
-#  def get_token(self):
-#    '''returns current token'''
-#    return self.tokens[self.position]
-#
-#  def next_token(self, skip=1):
-#    '''continues to a subsequent token'''
-#    self.position += skip
-#
-#  def get_next_token(self):
-#    '''continues to next token and returns it'''
-#    self.position += 1
-#    return self.tokens[self.position]
-#
-#  def get_tokens_until(self, target):
-#    '''return a list of tokens from the current token up to and including the 
-#    first token matching target'''
-#    token_list = []
-#    while (self.get_token() != target):
-#      token_list.append(self.get_token())
-#      self.next_token()
-#    token_list.append(self.get_token())
-#    self.next_token()
-#    return token_list
-#
-#  def end_of_tokens(self):
-#    '''true if the end of tokens has been reached'''
-#    return (self.position >= len(self.tokens))
-#  
-#  def eval(self):
-#    '''Returns parsed tree from tokens'''
-#    debug('eval, current token is '+self.get_token())
-#    namespace_token = NamespaceToken()
-#    namespace_token.name = 'global'
-#    while not self.end_of_tokens():
-#      member_namespace = self.eval_namespace()
-#      if (member_namespace != None):
-#        namespace_token.members.append(member_namepsace)
-#      else:
-#        member_class = self.eval_class()
-#        if (member_class != None):
-#          namespace_token.members.append(member_class)
-#        else:
-#          member_varfunc = self.eval_member()
-#          if (member_varfunc != None):
-#            namespace_token.members.append(member_varfunc)
-#          else:
-#            member_enum = self.eval_enum()
-#            if (member_enum != None):
-#              namespace_token.members.append(member_enum)
-#    return namespace_token
-#
-#  def eval_namespace(self):
-#    '''namespace identifier { namespace body }'''
-#    debug('eval_namespace, current token is '+self.get_token())
-#    if (self.get_token()=='namespace'):
-#      namespace_token = NamespaceToken()
-#      namespace_token.name = self.get_next_token()
-#      self.next_token() #{
-#      while (self.get_token() != '}'):
-#        member_namespace = self.eval_namespace()
-#        if (member_namespace != None):
-#          namespace_token.members.append(member_namepsace)
-#        member_class = self.eval_class()
-#        if (member_class != None):
-#          namespace_token.members.append(member_class)
-#        member_varfunc = self.eval_member()
-#        if (member_varfunc != None):
-#          namespace_token.members.append(member_varfunc)
-#        member_enum = self.eval_enum()
-#        if (member_enum != None):
-#          namespace_token.members.append(member_enum)
-#      self.next_token() #}
-#      return namespace_token
-#    return None
-#
-#  def eval_enum(self):
-#    '''enum (class)? identifier { (identifier (= literal)?,)+ }'''
-#    if (self.get_token()=='enum'):
-#      enum_tokens = self.get_tokens_until(';')
-#      enum_string = ' '.join(enum_tokens)
-#      enum_match = re.fullmatch((r'enum(?: class)? ([a-zA-Z_]\w*) \{ ([a-zA-Z'
-#          r'_]\w*)(?: = (\d*))?(?: , ([a-zA-Z_]\w*)(?: = (\d*)))* ) ;'),
-#          enum_string)
-#      if (enum_match):
-#        enum_match_groups = enum_match.groups()
-#        match_idx = 0
-#        grp_len = len(enum_match_groups)
-#        while (match_idx < grp_len):
-#          if (match_idx == 0):
-#            enum_token.name = enum_match_groups[match_idx]
-#          elif enum_match_groups[match_idx].isdigit():
-#            enum_token.enum_values[grp_len] = enum_match_groups[match_idx]
-#          else:
-#            enum_token.enums.append(enum_match_groups[match_idx])
-#            enum_token.enum_values.append('')
-#          match_idx += 1
-#      else:
-#        debug('ERROR, no regex match for enum: '+enum_string)
-#        exit()
-#      #enum_token = EnumToken()
-#      #debug('1 enum in token: '+self.get_token()) #TODO debug
-#      #exit()
-#      #self.next_token()
-#      #if (self.get_token()=='class'):
-#      #  self.next_token()
-#      #enum_token.name = self.get_token()
-#      #self.next_token()
-#      #self.next_token() #{
-#      #while (self.get_token() != '}'):
-#      #  if (self.get_token()==','):
-#      #    self.next_token()
-#      #  debug('enum in token: '+self.get_token())
-#      #  exit()
-#      #  enum_token.enums.append(self.get_token())
-#      #  self.next_token()
-#      #  if (self.get_token()=='='):
-#      #    self.next_token()
-#      #    if (self.get_token()=='-'):
-#      #      self.next_token()
-#      #      enum_token.enum_values.push_back('-'+self.get_token())
-#      #  elif (self.get_token()[0] in digits):
-#      #    enum_token.enum_values.push_back(self.get_token())
-#      #  else:
-#      #    enum_token.enum_values.push_back('')
-#      #self.next_token() #}
-#      #self.next_token() #;
-#      return enum_token
-#    return None
-#
-#  def eval_class(self):
-#    '''class identifier : (access identifier, )* { classbody };'''
-#    debug('eval_class, current token is '+self.get_token())
-#    if (self.get_token()=='class'):
-#      class_token = ClassToken()
-#      class_token.name = self.get_next_token()
-#      members = [] 
-#      members_access = []
-#      current_access = 0
-#      self.next_token()
-#      while (self.get_token()!='{'):
-#        class_token.parents_access.append(self.get_token())
-#        class_token.parents.append(self.get_next_token())
-#        self.next_token()
-#        if (self.get_token()==','):
-#          self.next_token()
-#      self.next_token() #{, now inside class body
-#      while (self.get_token()!='}'):
-#        if (self.get_token()=='public'):
-#          current_access = self.get_token()
-#          self.next_token(2)
-#        elif (self.get_token()=='protected'):
-#          current_access = self.get_token()
-#          self.next_token(2)
-#        elif (self.get_token()=='private'):
-#          current_access = self.get_token()
-#          self.next_token(2)
-#        else:
-#          member_class = self.eval_class()
-#          if (member_class != None):
-#            members.append(member_class)
-#            members_access.append(current_access)
-#          member_varfunc = self.eval_member()
-#          if (member_varfunc != None):
-#            members.append(member_varfunc)
-#            members_access.append(current_access)
-#          member_enum = self.eval_enum()
-#          if (member_enum != None):
-#            members.append(member_enum)
-#            members_access.append(current_access)
-#      self.next_token(2) #} ;
-#      class_token.members = members
-#      class_token_access.members = members_access
-#      return class_token
-#    return None
-#
-#  def eval_expression(self, current_token=None):
-#    '''continue until }, ,, or ;'''
-#    debug('eval_expression, current token is '+self.get_token())
-#    if (self.get_token() == ',' or self.get_token() == ';' or 
-#        self.get_token() == '}' or self.get_token() == ')'):
-#      return current_token
-#    else:
-#      if (self.get_token()[0]=='\"' and self.get_token()[-1]=='\"'):
-#        expression_token = ExpressionToken()
-#        expression_token.expression_type = ExpressionType.string_literal
-#        expression_token.literal_value = self.get_token()
-#        self.next_token()
-#        return self.eval_expression(expression_token)
-#      elif (self.get_token()[0]=='\'' and self.get_token()[-1]=='\''):
-#        expression_token = ExpressionToken()
-#        expression_token.expression_type = ExpressionType.char_literal
-#        expression_token.literal_value = self.get_token()
-#        self.next_token()
-#        return self.eval_expression(expression_token)
-#      elif (self.get_token()[0] in digits):
-#        if (current_token != None):
-#          if (current_token.expression_type == ExpressionType.numeric_literal):
-#            if (current_token.literal_value=='-'):
-#              current_token.literal_value = '-'+self.get_token()
-#              return self.eval_expression(current_token)
-#        expression_token = ExpressionToken()
-#        expression_token.expression_type = ExpressionType.numeric_literal
-#        expression_token.literal_value = self.get_token()
-#        self.next_token()
-#        return self.eval_expression(expression_token)
-#      elif (self.get_token() == '-'):
-#        if (current_token==None): #must be unary
-#          expression_token = ExpressionToken()
-#          expression_token.expression_type = ExpressionType.numeric_literal
-#          expression_token.literal_value = self.get_token()
-#          self.next_token()
-#        #TODO: implement binary subtraction
-#        expression_token = ExpressionToken()
-#        expression_token.literal_value = self.get_token()
-#        while (not (self.get_token() == ',' or self.get_token() == ';')):
-#          self.next_token()
-#        return expression_token
-#      elif (self.get_token() == '{'):
-#        expression_token = ExpressionToken()
-#        expression_token.expression_type = ExpressionType.initializer_list
-#        self.next_token()
-#        while (self.get_token() != '}'):
-#          if (sefl.get_token()!=','):
-#            expression_token.subexpressions.append(self.eval_expression())
-#          else:
-#            coming_token = self.next_token()
-#        self.next_token() #}
-#        return self.eval_expression(expression_token)
-#      else:
-#        #bad/unimplemented expression
-#        expression_token = ExpressionToken()
-#        expression_token.literal_value = self.get_token()
-#        while (not (self.get_token() == ',' or self.get_token() == ';')):
-#          self.next_token()
-#        return expression_token
-#
-#  def eval_function(self, function_name, function_type):
-#    '''type+ identifier( (type identifier+ (= expression)+, )* ) const+ 
-#    (= (default|delete)) (;|{functionbody}) '''
-#    debug('eval_function, current token is '+self.get_token())
-#    #eval_member handles up until the open parentheses
-#    function_token = FunctionToken()
-#    function_token.name = function_name
-#    function_token.function_type = function_type
-#    self.next_token() #(
-#    while (self.get_token() != ')'):
-#      arg_token = VariableToken()
-#      arg_token.variable_type = self.eval_type()
-#      if (arg_token.variable_type == None):
-#        #error(' in function '+function_name+': bad argument type')
-#        #assume this is a parentheses initializer for a variable
-#        self.position -= 1 #back to (
-#        return self.eval_variable(funciton_name, function_type)
-#      if (self.get_token() != '=' and self.get_token() != ',' 
-#          and self.get_token() != ')'):
-#        arg_token.name = self.get_token()
-#        self.next_token()
-#      if (self.get_token() == '='):
-#        self.next_token()
-#        arg_token.variable_default = self.eval_expression()
-#      function_token.args.append(arg_token)
-#      if (self.get_token() != ',' and self.get_token() != ')'):
-#        error('parsing function '+function_name+': expected "," but got '
-#            + self.get_token())
-#      if (self.get_token() == ','):
-#        self.next_token() 
-#    self.next_token() #)
-#    while (self.get_token() != '{' and self.get_token() != ';'):
-#      if (self.get_token()=='const'):
-#        self.next_token()
-#      elif (self.get_token()=='='):
-#        default_str = self.get_next_token()
-#        if (default_str == 'default' or default_str == 'delete'):
-#          function_token.is_default = True
-#          self.next_token() #default/delete
-#        else:
-#          error('expected default or delete, but got '+self.get_token())
-#          self.next_token()
-#      else:
-#        error('parsing function '+function_name
-#            +', unexpected postfix '+self.get_token())
-#        self.next_token()
-#    if (self.get_token() == '{'): 
-#      bracket_count = 0
-#      self.next_token()
-#      while (not (self.get_token() == '}' and bracket_count == 0)):
-#        if (self.get_token() == '{'):
-#          bracket_count += 1
-#        elif (self.get_token() == '}'):
-#          bracket_count -= 1
-#        self.next_token()
-#      self.next_token() #}
-#    else:
-#      self.next_token() #;
-#    return function_token
-#
-#  def eval_variable(self, variable_name, variable_type):
-#    '''type name (= expression)+; 
-#    eval_member handles up until name'''
-#    debug('eval_variable, current token is '+self.get_token())
-#    variable_token = VariableToken()
-#    variable_token.name = variable_name
-#    variable_token.variable_type = variable_type
-#    while (self.get_token() != ';'):
-#      if (self.get_token() == '='):
-#        self.next_token() #=
-#        variable_token.default = self.eval_expression()
-#      elif (self.get_token() == '('):
-#        self.next_token() #(
-#        variable_token.default = self.eval_expression()
-#        self.next_token() #)
-#      else:
-#        error('unexpected token '+self.get_token()+' in variable')
-#        self.next_token()
-#    self.next_token()
-#    return variable_token
-#
-#  def eval_member(self):
-#    '''function or variable (outside function) type+ identifier...'''
-#    debug('eval_member, current token is '+self.get_token())
-#    member_type = self.eval_type()
-#    if (member_type != None):
-#      member_name = self.get_token()
-#      if (member_name=='('):
-#        #constructor
-#        member_name = '__init__'
-#        return self.eval_function(member_name, member_type)
-#      elif (member_name=='operator'):
-#        member_name += self.get_next_token()
-#        self.next_token() #operator symbol
-#        return self.eval_function(member_name, member_type)
-#      else:
-#        self.next_token()
-#        if (self.get_token()=='('):
-#          return self.eval_function(member_name, member_type)
-#        else:
-#          return self.eval_variable(member_name, member_type)
-#    else:
-#      if (self.get_token()=='~'):
-#        #destructor
-#        member_type = TypeToken()
-#        member_type.base_type = 'void'
-#        member_name = '__del__'
-#        self.next_token() #~
-#        self.next_token() #class name
-#        return self.eval_function(member_name, member_type)
-#    return None
-#
-#  def eval_type(self, current_type_token=None):
-#    '''(cv_qualifier)+ (storage_qualifier)+ (unsigned|signed|long|short)+ 
-#    typename(<typename>)+ (*)* (&|&&)+ '''
-#    debug(' eval_type, current token is '+self.get_token())
-#    if self.get_token() in type_prefix_tokens:
-#      if (current_type_token==None):
-#        current_type_token = TypeToken()
-#      prefix = self.get_token()
-#      #don't need all the cv and storage class for now
-#      if (prefix=='unsigned'):
-#        current_type_token.signed = 'unsigned'
-#      elif (prefix=='signed'):
-#        current_type_token.signed = ''
-#      elif (prefix=='const'):
-#        current_type_token.cv_qualifier = 'const'
-#      self.next_token() 
-#      return self.eval_type(current_type_token) 
-#    if self.get_token() in all_types:
-#      if (current_type_token==None):
-#        current_type_token = TypeToken()
-#      type_name = self.get_token()
-#      if (current_type_token.base_type == 'long'):
-#        if (type_name=='long'):
-#          current_type_token.base_type = 'long long'
-#          self.next_token() 
-#          return self.eval_type(current_type_token) 
-#        elif (type_name=='double'):
-#          current_type_token.base_type = 'double'
-#          self.next_token() 
-#          return self.eval_type(current_type_token) 
-#        elif (type_name=='int'):
-#          self.next_token() 
-#          return self.eval_type(current_type_token) 
-#        else:
-#          current_type_token.base_type = type_name
-#          self.next_token() 
-#          return self.eval_type(current_type_token) 
-#      elif (current_type_token.base_type == 'short'):
-#        if (type_name=='int'):
-#          self.next_token() 
-#          return self.eval_type(current_type_token) 
-#        else:
-#          current_type_token.base_type = type_name
-#          self.next_token() 
-#          return self.eval_type(current_type_token) 
-#      current_type_token.base_type = type_name
-#      self.next_token() 
-#      return self.eval_type(current_type_token) 
-#    if (current_type_token!=None):
-#      if (self.get_token() == '*'):
-#        new_type_token = TypeToken()
-#        new_type_token.base_type = 'pointer'
-#        new_type_token.templates = [current_type_token]
-#        self.next_token() 
-#        return self.eval_type(new_type_token) 
-#      if (self.get_token() == '&'):
-#        self.next_token() 
-#        return self.eval_type(current_type_token) 
-#      if (self.get_token() == '&&'):
-#        self.next_token() 
-#        return self.eval_type(current_type_token) 
-#      if (self.get_token() == '<'):
-#        self.next_token()
-#        template_type_token = self.eval_type()
-#        current_type_token.templates.append(template_type_token)
-#        template_div_token = self.get_token()
-#        while (template_div_token==','):
-#          self.next_token()
-#          template_type_token = self.eval_type()
-#          current_type_token.templates.append(template_type_token)
-#          template_div_token = self.get_next_token()
-#        if (template_div_token != '>'):
-#          error('parsing type: expected ">" but got '+template_div_token)
-#        self.next_token() #> 
-#        return self.eval_type(current_type_token)
-#    return current_type_token
-
-##-----------------------------------------------------------------------------
-##                            wrapper generation
-##-----------------------------------------------------------------------------
-
+@functools.lru_cache(maxsize=None)
 def get_cpp_type(type_token):
   type_string = ''
   if (type_token.base_type=='pointer'):
@@ -1247,13 +70,13 @@ def get_cpp_type(type_token):
     type_string += type_token.base_type
     if (len(type_token.templates)>0):
       type_string += '<'
-      first_template = False
+      first_template = True
       for template_token in type_token.templates:
         if first_template:
           first_template = False
         else:
           type_string += ', '
-        type_string += type_from_token(template_token)
+        type_string += get_cpp_type(template_token)
       type_string += '>'
   return type_string
 
@@ -1266,11 +89,17 @@ def get_py_type(type_token):
   else:
     return 'None'
 
+def get_fundamental_name(type_token):
+  '''returns name of type_token without templates or cv-qualifiers, 
+  including unsigned, as used in wrapper_c_types'''
+  if (type_token.signed == 'unsigned'):
+    return 'unsigned '+type_token.base_type
+  return type_token.base_type
+
+@functools.lru_cache(maxsize=None)
 def get_c_type(type_token):
   if len(type_token.templates)==0:
-    base_type = type_token.base_type
-    if (type_token.signed == 'unsigned'):
-      base_type += 'unsigned '
+    base_type = get_fundamental_name(type_token)
     if (base_type in wrapper_c_types):
       return wrapper_c_types[base_type]
     else:
@@ -1278,16 +107,18 @@ def get_c_type(type_token):
   else:
     base_type = type_token.base_type
     if (base_type == 'pointer'):
-      if (type_token.templates[0].base_type=='char'):
+      pointee_type = get_fundamental_name(type_token.templates[0])
+      if (pointee_type=='char'):
         if (type_token.cv_qualifier=='const'):
           return 'const char*'
         return 'char*'
-      elif (type_token.templates[0].base_type in wrapper_c_types):
-        return wrapper_c_types[type_token.templates[0].base_type]+'*'
+      elif (wrapper_c_types.get(pointee_type) == pointee_type):
+        return pointee_type+'*'
+      else:
+        #pointers to types converted to another C type stay opaque
+        return 'void*'
     elif (base_type == 'std::set' or base_type == 'std::vector'):
-      base_type = type_token.templates[0].base_type
-      if (type_token.templates[0].signed == 'unsigned'):
-        base_type += 'unsigned '
+      base_type = get_fundamental_name(type_token.templates[0])
       if (base_type in wrapper_c_types):
         return wrapper_c_types[base_type]+'*'
       else:
@@ -1295,29 +126,30 @@ def get_c_type(type_token):
     else:
       return 'void*'
 
+@functools.lru_cache(maxsize=None)
 def get_pyc_type(type_token):
   if len(type_token.templates)==0:
-    base_type = type_token.base_type
-    if (type_token.signed == 'unsigned'):
-      base_type += 'unsigned '
-    if (base_type in wrapper_c_types):
+    base_type = get_fundamental_name(type_token)
+    if (base_type == 'void'):
+      #ctypes uses None for no return value
+      return 'None'
+    elif (base_type in wrapper_c_types):
       return 'ctypes.'+wrapper_py_types[wrapper_c_types[base_type]]
     else:
       return 'ctypes.c_void_p'
   else:
     base_type = type_token.base_type
     if (base_type == 'pointer'):
-      if (type_token.templates[0].base_type=='char'):
+      pointee_type = get_fundamental_name(type_token.templates[0])
+      if (pointee_type=='char'):
         return 'ctypes.c_char_p'
-      elif (type_token.templates[0].base_type in wrapper_c_types):
-        return ('ctypes.POINTER(ctypes.'+wrapper_py_types[wrapper_c_types[
-            type_token.templates[0].base_type]]+')')
+      elif (wrapper_c_types.get(pointee_type) == pointee_type 
+          and pointee_type != 'void'):
+        return ('ctypes.POINTER(ctypes.'+wrapper_py_types[pointee_type]+')')
       else:
         return 'ctypes.c_void_p'
     elif (base_type == 'std::set' or base_type == 'std::vector'):
-      base_type = type_token.templates[0].base_type
-      if (type_token.templates[0].signed == 'unsigned'):
-        base_type += 'unsigned '
+      base_type = get_fundamental_name(type_token.templates[0])
       if (base_type in wrapper_c_types):
         return ('ctypes.POINTER(ctypes.'+wrapper_py_types[
             wrapper_c_types[base_type]]+')')
@@ -1326,631 +158,863 @@ def get_pyc_type(type_token):
     else:
       return 'ctypes.c_void_p'
 
-def clean_operators(string):
-  if string in operator_names:
-    return operator_names[string]
-  return string
+def get_cpp_function_name(entry):
+  '''returns name entry calls its C++ function by, qualified by its scope 
+  for free functions'''
+  name = cpp_operator_names.get(entry.name, entry.name)
+  if (entry.kind == 'function' and entry.scope != ''):
+    return entry.scope+'::'+name
+  return name
+
+def get_arg_name(arg, arg_idx):
+  '''returns name of argument arg_idx in the wrappers, arg followed by its 
+  index if it is unnamed, with _ appended if it is a Python keyword'''
+  if (arg.name == ''):
+    return 'arg'+str(arg_idx)
+  if keyword.iskeyword(arg.name):
+    return arg.name+'_'
+  return arg.name
+
+def is_wrapped(function_token, access):
+  '''returns true if a wrapper is written for function_token declared with 
+  access'''
+  return (access in ('','public') and (not function_token.is_default) 
+      and function_token.name != '__assign__')
+
+def get_c_function_name(function_name, used_function_names):
+  '''returns function_name, numbered if it is already in used_function_names,
+  and adds it to used_function_names'''
+  next_number = 1
+  temp_function_name = function_name
+  while temp_function_name in used_function_names:
+    next_number += 1
+    temp_function_name = function_name+str(next_number)
+  used_function_names.add(temp_function_name)
+  return temp_function_name
+
+def get_outer_class(hierarchy):
+  '''returns qualified name of the outermost class in hierarchy, or empty 
+  string if there is none'''
+  for scope_idx in range(len(hierarchy)):
+    if (hierarchy[scope_idx][1] == 'class'):
+      return gb_symbol_index.get_qualified_name(hierarchy[:scope_idx],
+          hierarchy[scope_idx][0])
+  return ''
 
-def write_c_wrappers(token, vector_type_wrappers=set(), 
-    parent_hierarchy=[], used_function_names=set()):
-  '''function that recurses through tokens and writes c function wrappers'''
-  ret_string = ''
-  if (token.token_type == TokenType.cpp_namespace):
-    if (token.name != 'global'):
-      parent_hierarchy.append((token.name, 'namespace'))
-    for member_token in token.members:
-      ret_string += write_c_wrappers(member_token, vector_type_wrappers, 
-          parent_hierarchy, used_function_names)
-    if (token.name != 'global'):
-      parent_hierarchy.pop()
-  elif (token.token_type == TokenType.cpp_class):
-    parent_hierarchy.append((token.name, 'class'))
-    ret_string += write_c_pointer_constructor(parent_hierarchy, 
-        used_function_names)
-    ret_string += '\n'
-    member_idx = 0
-    for member_token in token.members:
-      if (token.members_access[member_idx] == 'public'):
-        ret_string += write_c_wrappers(member_token, vector_type_wrappers,
-            parent_hierarchy, used_function_names)
-      member_idx += 1
-    parent_hierarchy.pop()
-  elif (token.token_type == TokenType.cpp_function):
-    if ((not token.is_default) and (not token.name=='operator=')):
-      ret_string += write_c_function_wrapper(token, vector_type_wrappers,
-          parent_hierarchy, used_function_names)
-      ret_string += '\n'
-  elif (token.token_type == TokenType.cpp_variable):
+def lower_value(type_token, name='', default=None, is_result=False):
+  '''returns ValuePlan for argument name or the return value, if is_result,
+  of type type_token'''
+  plan = gb_binding_ir.ValuePlan(name)
+  plan.cpp_type = get_cpp_type(type_token)
+  plan.c_type = get_c_type(type_token)
+  plan.pyc_type = get_pyc_type(type_token)
+  plan.py_type = get_py_type(type_token)
+  plan.default = default
+  wrapped_type = type_token
+  if (type_token.base_type == 'std::vector' or 
+      type_token.base_type == 'std::set'):
+    plan.marshal = type_token.base_type[5:]
+    wrapped_type = type_token.templates[0]
+    plan.cpp_type = get_cpp_type(wrapped_type)
+    plan.element_pyc_type = get_pyc_type(wrapped_type)
+  elif (type_token.base_type == 'pointer'):
+    plan.marshal = 'pointer'
+  elif is_result and type_token.base_type == 'std::string':
+    plan.marshal = 'string'
+  elif is_result and type_token.base_type == 'void':
+    plan.marshal = 'void'
+  elif (type_token.base_type not in wrapper_c_types):
+    plan.marshal = 'object'
+  if (wrapped_type.base_type in drawpico_types):
+    plan.wrapper_class = wrapped_type.base_type
+  return plan
+
+class BindingLowerer(gb_visitor.Visitor):
+  '''Visitor that lowers public classes and functions to a flat 
+  BindingModule, resolving names, types, and overloads once for all 
+  emitters. Overloads are looked up in symbol_index, a 
+  gb_symbol_index.SymbolIndex of the tree'''
+
+  def __init__(self, symbol_index):
+    self.symbol_index = symbol_index
+    self.binding_module = gb_binding_ir.BindingModule()
+    self.vector_type_wrappers = dict() #qualified C++ type -> type token of
+                                       #vector elements needing wrappers
+    self.used_function_names = set()
+
+  def visit_class(self, token, context):
+    if (context.access not in ('','public')):
+      return False
+    scope = gb_symbol_index.get_qualified_name(context.hierarchy, token.name)
+    entry = gb_binding_ir.BindingEntry('pointer_constructor', 
+        get_c_function_name(''.join([parent[0] for parent 
+        in context.hierarchy])+token.name+'__init__', 
+        self.used_function_names), '__init__', scope,
+        get_outer_class(context.hierarchy+[(token.name, 'class')]), 
+        context.access)
+    entry.args.append(lower_value(make_type('pointer', 
+        templates=(make_type(token.name),)), 'ptr'))
+    entry.result = lower_value(make_type(token.name), is_result=True)
+    self.qualify_types(entry)
+    self.binding_module.entries.append(entry)
+
+  def visit_function(self, token, context):
+    if is_wrapped(token, context.access):
+      self.binding_module.entries.append(self.lower_function(token, 
+          context))
+    return False
+
+  def visit_variable(self, token, context):
     #variable wrapper one day?
-    pass
-  return ret_string
+    return False
+
+  def visit_enum(self, token, context):
+    return False
+
+  def lower_function(self, function_token, context):
+    '''returns BindingEntry for function_token'''
+    is_member = (len(context.hierarchy) > 0 
+        and context.hierarchy[-1][1] == 'class')
+    hierarchy_name = ''.join([parent[0] for parent in context.hierarchy])
+    kind = 'function'
+    if (function_token.name == '__init__'):
+      kind = 'constructor'
+    elif (function_token.name == '__del__'):
+      kind = 'destructor'
+    elif is_member:
+      kind = 'method'
+    elif (hierarchy_name == ''):
+      #so the wrapper does not overload the function it calls
+      hierarchy_name = 'Global'
+    entry = gb_binding_ir.BindingEntry(kind, get_c_function_name(
+        hierarchy_name+function_token.name, self.used_function_names), 
+        function_token.name, 
+        '::'.join([parent[0] for parent in context.hierarchy]),
+        get_outer_class(context.hierarchy), context.access)
+    if is_member:
+      #number public overloads, constructors are always overloaded and come
+      #after the pointer constructor
+      overloads = [member for (member, access) in self.symbol_index.get_class(
+          entry.scope).get_overloads(function_token.name) 
+          if is_wrapped(member, access)]
+      if (len(overloads) > 1 or kind == 'constructor'):
+        entry.overload_index = overloads.index(function_token)+1
+        if (kind == 'constructor'):
+          entry.overload_index += 1
+    entry.result = lower_value(function_token.function_type, is_result=True)
+    for arg_idx in range(len(function_token.args)):
+      arg = function_token.args[arg_idx]
+      default = None
+      if (arg.default.token_type == TokenType.cpp_expression):
+        default = expression_to_python(arg.default)
+      entry.args.append(lower_value(arg.variable_type, 
+          get_arg_name(arg, arg_idx), default))
+    self.qualify_types(entry)
+    if (entry.result.marshal in ('vector','set')):
+      self.vector_type_wrappers[entry.result.cpp_type] = (
+          function_token.function_type.templates[0])
+    return entry
+
+  def qualify_types(self, entry):
+    '''qualifies the class names in the C++ types of entry, since wrappers 
+    are written outside its scope'''
+    for plan in entry.args+[entry.result]:
+      plan.cpp_type = self.symbol_index.qualify_type(plan.cpp_type, 
+          entry.scope)
+
+  def get_binding_module(self):
+    '''returns the BindingModule lowered so far'''
+    self.binding_module.vector_types = [(cpp_type, get_c_type(type_token))
+        for (cpp_type, type_token) 
+        in get_vector_wrapper_types(self.vector_type_wrappers)]
+    return self.binding_module
+
+def lower_bindings(token, symbol_index):
+  '''Lowers tree with top-level token, indexed in symbol_index, to a 
+  BindingModule in a single traversal that also counts declarations, 
+  returns (BindingModule, StatisticsVisitor)'''
+  lowerer = BindingLowerer(symbol_index)
+  statistics = gb_visitor.StatisticsVisitor()
+  gb_visitor.walk(token, [lowerer, statistics])
+  return (lowerer.get_binding_module(), statistics)
+
+def get_exported_names(binding_module):
+  '''Returns sorted names of the C functions written for binding_module, 
+  which are the entry points of the library'''
+  return sorted(['SuppressRootWarnings']+[entry.c_name for entry 
+      in binding_module.entries]
+      +get_vector_wrapper_names(binding_module.vector_types))
+
+def write_c_wrappers(emitter, binding_module):
+  '''writes C function wrappers for the entries of binding_module to 
+  emitter'''
+  for entry in binding_module.entries:
+    write_c_function_wrapper(emitter, entry)
+    emitter.write('\n')
 
 def expression_to_python(expression_token):
-  if (expression_token.expression_type == ExpressionType.numeric_literal):
-    return '='+expression_token.literal_value
-  elif (expression_token.expression_type == ExpressionType.char_literal):
-    return '=\''+expression_token.literal_value+'\''
-  elif (expression_token.expression_type == ExpressionType.string_literal):
-    return '=\''+expression_token.literal_value+'\''
+  '''returns Python expression for C++ default argument expression_token.
+  Literals are kept as written, with their quotes, and expressions that
+  cannot be translated become None'''
+  if (expression_token.expression_type in (ExpressionType.numeric_literal,
+      ExpressionType.char_literal, ExpressionType.string_literal)):
+    return expression_token.literal_value
   elif (expression_token.expression_type == ExpressionType.initializer_list):
-    bracket_inner = ''
-    first = True
-    for subexpression_token in expression_token.subexpressions:
-      if first:
-        first = False
-      else:
-        bracket_inner += ','
-      bracket_inner += expression_to_python(subexpression_token)
-    return '=['+bracket_inner+']'
-  return ''
-
-def write_py_wrappers(token, parent_hierarchy=[], used_function_names=set()):
-  '''function that recurses through tokens and writes Python wrappers'''
-  #make two passes, the first is for marking overloads/duplicates
-  ret_string = ''
-  if (token.token_type == TokenType.cpp_namespace):
-    if (token.name != 'global'):
-      parent_hierarchy.append((token.name, 'namespace'))
-    for member_token in token.members:
-      ret_string += write_py_wrappers(member_token, parent_hierarchy)
-    if (token.name != 'global'):
-      parent_hierarchy.pop()
-  elif (token.token_type == TokenType.cpp_class):
-    parent_hierarchy.append((token.name, 'class'))
-    #write overloaded functions
-    all_function_name_set = set()
-    all_function_name_set.add('__init__') #always ol constructor
-    ovl_function_name_set = set()
-    overloaded_functions = dict()
-    overload_number = dict()
-    member_idx = 0
-    for function_token in token.members:
-      if (token.members_access[member_idx] == 'public'):
-        if function_token.token_type == TokenType.cpp_function:
-          if not function_token.is_default:
-            if function_token.name in all_function_name_set:
-              ovl_function_name_set.add(function_token.name)
-            else:
-              all_function_name_set.add(function_token.name)
-      member_idx += 1
-    member_idx = 0
-    for function_token in token.members:
-      if (token.members_access[member_idx] == 'public'):
-        if function_token.token_type == TokenType.cpp_function:
-          if not function_token.is_default:
-            fn_name = function_token.name
-            if fn_name in ovl_function_name_set:
-              if fn_name in overloaded_functions:
-                overloaded_functions[fn_name].append(function_token)
-              else:
-                overloaded_functions[fn_name] = [function_token]
-      member_idx += 1
-    for ol_name in overloaded_functions:
-      overload_number[ol_name] = 1
-    #write ctypes type assignments
-    pointer_init_token = FunctionToken()
-    pointer_init_token.name = '__init__'
-    pointer_init_token.function_type = TypeToken()
-    pointer_init_token.function_type.base_type = token.name
-    pointer_init_token.args.append(VariableToken())
-    pointer_init_token.args[0].name = 'ptr'
-    pointer_init_token.args[0].variable_type = TypeToken()
-    pointer_init_token.args[0].variable_type.base_type = 'pointer'
-    pointer_init_token.args[0].variable_type.templates.append(TypeToken())
-    pointer_init_token.args[0].variable_type.templates[0].base_type = token.name
-    overload_number['__init__'] = 2
-    ret_string += write_ctypes_types(pointer_init_token, parent_hierarchy, 0)
-    member_idx = 0
-    for function_token in token.members:
-      if (token.members_access[member_idx] == 'public'):
-        if function_token.token_type == TokenType.cpp_function:
-          if (function_token.is_default == False):
-            duplicate_number = 0
-            if function_token.name in overload_number:
-              duplicate_number = overload_number[function_token.name]
-              overload_number[function_token.name] += 1
-            ret_string += write_ctypes_types(function_token, parent_hierarchy, 
-            duplicate_number)
-      member_idx += 1
-    #class header
-    ret_string += 'class '+token.name+':\n'
-    #write overload disambiguators
-    for ol_name, ol_functions in overloaded_functions.items():
-      ret_string += write_overload_py_wrapper(ol_functions, parent_hierarchy)
-      ret_string += '\n'
-      overload_number[ol_name] = 1
-    overload_number['__init__'] = 2
-    #write normal functions
-    member_idx = 0
-    for function_token in token.members:
-      if (token.members_access[member_idx] == 'public'):
-        if function_token.token_type == TokenType.cpp_function:
-          if not function_token.is_default:
-            duplicate_number = 0
-            if function_token.name in overload_number:
-              duplicate_number = overload_number[function_token.name]
-              overload_number[function_token.name] += 1
-            ret_string += write_py_function_wrapper(function_token, 
-                parent_hierarchy, duplicate_number)
-            ret_string += '\n'
-      member_idx += 1
-    ret_string += '\n'
-    parent_hierarchy.pop()
-  #elif (token.token_type == TokenType.cpp_function):
-  #  if ((not token.is_default) and (not token.name=='operator=')):
-  #    ret_string += write_c_function_wrapper(token, vector_type_wrappers,
-  #        parent_hierarchy, used_function_names)
-  #    ret_string += '\n'
-  #elif (token.token_type == TokenType.cpp_variable):
-  #  #variable wrapper one day?
-  #  pass
-  return ret_string
-
-def write_ctypes_types(function_token, parent_hierarchy, duplicate_number):
-  hierarchy_name = ''
-  parent_name = ''
-  if (len(parent_hierarchy)>0):
-    if (parent_hierarchy[-1][1]=='class'):
-      parent_name = parent_hierarchy[-1][0]
-    for hierarch in parent_hierarchy:
-      hierarchy_name += hierarch[0]
-  c_function_name = hierarchy_name+clean_operators(function_token.name)
-  num_str = ''
-  if (duplicate_number>1):
-    num_str = str(duplicate_number)
-  output_string = ('drawpico_bindings.'+c_function_name+num_str+'.argtypes = [')
+    return ('['+','.join([expression_to_python(subexpression_token) 
+        for subexpression_token in expression_token.subexpression])+']')
+  return 'None'
+
+def write_py_wrappers(emitter, binding_module):
+  '''writes Python wrapper classes for the classes of binding_module not 
+  nested in other classes to emitter'''
+  for class_bindings in binding_module.get_classes().values():
+    write_py_class_wrapper(emitter, class_bindings)
+
+def write_wrappers(binding_module, cpp_emitter, py_emitter, 
+    pch_filename=None):
+  '''Writes C++ and Python wrapper files for binding_module to cpp_emitter
+  and py_emitter. If pch_filename is given, the C++ file includes only that
+  header'''
+  output_cpp_file_header(cpp_emitter, True, pch_filename)
+  write_c_wrappers(cpp_emitter, binding_module)
+  write_vector_type_wrappers(cpp_emitter, binding_module.vector_types)
+  output_cpp_file_tailer(cpp_emitter)
+  output_py_file_header(py_emitter)
+  write_py_wrappers(py_emitter, binding_module)
+
+def get_shard_group(entry):
+  '''returns name of the group of entry for sharding, its class outside 
+  other classes or, for free functions, its namespace'''
+  if (entry.outer_class != ''):
+    return 'class '+entry.outer_class
+  return 'namespace '+entry.scope
+
+def assign_shards(group_sizes, shard_count, shard_by):
+  '''Returns dict of group name to shard index for groups with sizes in 
+  dict group_sizes. If shard_by is class, shards are chosen by a hash of 
+  the group name, so a group stays in its shard as others change. If 
+  shard_by is size, groups are balanced by size, largest first'''
+  shards = dict()
+  if (shard_by == 'class'):
+    for group_name in group_sizes:
+      shards[group_name] = zlib.crc32(group_name.encode('utf-8'))%shard_count
+  elif (shard_by == 'size'):
+    shard_sizes = [0]*shard_count
+    for group_name in sorted(group_sizes, 
+        key=lambda group_name: (-group_sizes[group_name], group_name)):
+      shard_idx = shard_sizes.index(min(shard_sizes))
+      shards[group_name] = shard_idx
+      shard_sizes[shard_idx] += group_sizes[group_name]
+  else:
+    error('unknown shard_by '+shard_by)
+  return shards
+
+def write_sharded_wrappers(binding_module, cpp_emitters, py_emitter, 
+    shard_by='class', pch_filename=None):
+  '''Like write_wrappers, but splits the C++ wrappers between the C++ files 
+  written to cpp_emitters so they can be compiled in parallel. Wrappers are
+  grouped as in get_shard_group, and groups are assigned to shards as in 
+  assign_shards. Every shard gets the includes and an extern "C" block, 
+  while functions defined once, like vector wrappers, are written to the 
+  first shard'''
+  groups = dict() #group name -> Emitter, in order
+  for entry in binding_module.entries:
+    group_name = get_shard_group(entry)
+    if group_name not in groups:
+      groups[group_name] = gb_emitter.Emitter()
+    write_c_function_wrapper(groups[group_name], entry)
+    groups[group_name].write('\n')
+  shards = assign_shards(dict([(group_name, groups[group_name].size)
+      for group_name in groups]), len(cpp_emitters), shard_by)
+  for shard_idx in range(len(cpp_emitters)):
+    output_cpp_file_header(cpp_emitters[shard_idx], (shard_idx == 0),
+        pch_filename)
+    for group_name in groups:
+      if (shards[group_name] == shard_idx):
+        cpp_emitters[shard_idx].write(*groups[group_name].chunks)
+    if (shard_idx == 0):
+      write_vector_type_wrappers(cpp_emitters[shard_idx], 
+          binding_module.vector_types)
+    output_cpp_file_tailer(cpp_emitters[shard_idx])
+  output_py_file_header(py_emitter)
+  write_py_wrappers(py_emitter, binding_module)
+
+def get_shard_filename(filename, shard_idx):
+  '''Returns name of shard shard_idx of C++ file filename, ex. 
+  drawpicoc_2.cxx for drawpicoc.cxx'''
+  (root, extension) = os.path.splitext(filename)
+  return root+'_'+str(shard_idx)+extension
+
+def get_cpp_filenames(cpp_filename, shard_count):
+  '''Returns names of the C++ files written by write_binding_files'''
+  if (shard_count > 1):
+    return [get_shard_filename(cpp_filename, shard_idx)
+        for shard_idx in range(shard_count)]
+  return [cpp_filename]
+
+def get_pch_filename(cpp_filename):
+  '''Returns name of the precompiled header source for C++ file 
+  cpp_filename, ex. drawpicoc_pch.hpp for drawpicoc.cxx'''
+  return os.path.splitext(cpp_filename)[0]+'_pch.hpp'
+
+def write_binding_files(token, cpp_filename, py_filename, shard_count=1,
+    shard_by='class', manifest_filename=None, header_filenames=None, 
+    stamp_filename=None, pch=False, version_script_filename=None, 
+    ir_filename=None, root_classes=None, shake_report_filename=None):
+  '''Writes wrapper files for tree with top-level token, split into
+  shard_count C++ files named as in get_shard_filename if shard_count is
+  greater than one. Files whose contents are unchanged are left untouched,
+  and their digests are recorded in the manifest manifest_filename if
+  given. If header_filenames is given, a depfile named after each file 
+  with .d appended lists the headers and generator modules it depends on. 
+  If stamp_filename is given, it is touched on every run and gets a depfile
+  too, so make, which unlike ninja with restat cannot see that an untouched
+  file was brought up to date, has a target that is. If pch, the includes
+  are written to a header named as in get_pch_filename, which is included 
+  by each C++ file. If version_script_filename is given, a linker version
+  script exporting only the C functions written is written to it, see
+  gb_build.output_version_script. If ir_filename is given, the binding IR
+  is saved to it. If root_classes is given, only the classes reachable from
+  them are wrapped, see gb_reachability.shake_bindings, and the kept and
+  pruned names are written to shake_report_filename if given. Returns 
+  (StatisticsVisitor, list of changed files)'''
+  symbol_index = gb_symbol_index.SymbolIndex(token)
+  (binding_module, statistics) = lower_bindings(token, symbol_index)
+  shake_report = None
+  if (root_classes != None):
+    (binding_module, shake_report) = gb_reachability.shake_bindings(
+        binding_module, root_classes, symbol_index)
+    debug(shake_report.report())
+  manifest = gb_output.Manifest(manifest_filename)
+  cpp_filenames = get_cpp_filenames(cpp_filename, shard_count)
+  output_files = [gb_output.OutputFile(filename, manifest)
+      for filename in cpp_filenames+[py_filename]]
+  pch_filename = None
+  if pch:
+    pch_filename = os.path.basename(get_pch_filename(cpp_filename))
+  try:
+    cpp_emitters = [gb_emitter.Emitter(output_file)
+        for output_file in output_files[:-1]]
+    py_emitter = gb_emitter.Emitter(output_files[-1])
+    if (shard_count > 1):
+      write_sharded_wrappers(binding_module, cpp_emitters, py_emitter,
+          shard_by, pch_filename)
+    else:
+      write_wrappers(binding_module, cpp_emitters[0], py_emitter, 
+          pch_filename)
+    if pch:
+      output_files.append(gb_output.OutputFile(
+          get_pch_filename(cpp_filename), manifest))
+      output_pch_header(gb_emitter.Emitter(output_files[-1]))
+    if (version_script_filename != None):
+      output_files.append(gb_output.OutputFile(version_script_filename, 
+          manifest))
+      gb_build.output_version_script(output_files[-1], 
+          get_exported_names(binding_module))
+    if (shake_report != None and shake_report_filename != None):
+      output_files.append(gb_output.OutputFile(shake_report_filename, 
+          manifest))
+      output_files[-1].write(shake_report.details())
+  except:
+    for output_file in output_files:
+      output_file.discard()
+    raise
+  changed_files = [output_file.filename for output_file in output_files
+      if output_file.close()]
+  targets = [output_file.filename for output_file in output_files]
+  if (ir_filename != None):
+    if gb_binding_ir.save(binding_module, ir_filename, manifest):
+      changed_files.append(ir_filename)
+    targets.append(ir_filename)
+  if (header_filenames != None):
+    dependencies = list(header_filenames)+gb_output.get_generator_sources()
+    if (stamp_filename != None):
+      targets.append(stamp_filename)
+    for target in targets:
+      if gb_output.write_depfile(target+'.d', target, dependencies, 
+          manifest):
+        changed_files.append(target+'.d')
+  if (stamp_filename != None):
+    with open(stamp_filename, 'a'):
+      os.utime(stamp_filename)
+  manifest.save()
+  return (statistics, changed_files)
+
+def write_ctypes_types(emitter, entry):
+  '''writes ctypes argument and return types of entry to emitter'''
+  emitter.write('drawpico_bindings.'+entry.c_name+'.argtypes = [')
   first_arg = True
-  for arg in function_token.args:
+  if (entry.kind in ('method','destructor')):
+    emitter.write('ctypes.c_void_p')
+    first_arg = False
+  for arg in entry.args:
     if first_arg:
       first_arg = False
     else:
-      output_string += ', '
-    output_string += get_pyc_type(arg.variable_type)
-    if (arg.variable_type.base_type=='std::vector' or
-        arg.variable_type.base_type=='std::set'):
-      output_string += ', ctypes.c_uint'
-  output_string += ']\n'
-  output_string += ('drawpico_bindings.'+c_function_name+num_str+'.restype = ')
-  output_string += (get_pyc_type(function_token.function_type)+'\n')
-  return output_string
-
-def write_overload_py_wrapper(function_tokens, parent_hierarchy):
-  '''returns Python function to disambiguate between overloaded functions'''
-  is_constructor = (function_tokens[0].name=='__init__')
-  output_string = '  def '+function_tokens[0].name+'('
-  parent_name = ''
-  hierarchy_name = ''
-  if (len(parent_hierarchy)>0):
-    if (parent_hierarchy[-1][1]=='class'):
-      parent_name = parent_hierarchy[-1][0]
-    for hierarch in parent_hierarchy:
-      hierarchy_name += hierarch[0]
-  if (parent_name != ''):
-    output_string += 'self, '
-  output_string += '*args):\n' 
+      emitter.write(', ')
+    emitter.write(arg.pyc_type)
+    if (arg.marshal in ('vector','set')):
+      emitter.write(', ctypes.c_uint')
+  emitter.write(']\n')
+  emitter.write('drawpico_bindings.'+entry.c_name+'.restype = ',
+      entry.result.pyc_type+'\n')
+
+def write_py_class_wrapper(emitter, class_bindings):
+  '''writes Python wrapper class for gb_binding_ir.ClassBindings 
+  class_bindings to emitter'''
+  pointer_entry = class_bindings.pointer_constructor
+  #write ctypes type assignments
+  write_ctypes_types(emitter, pointer_entry)
+  for entry in class_bindings.entries:
+    write_ctypes_types(emitter, entry)
+  #class header
+  emitter.write('class '+pointer_entry.scope.rpartition('::')[2]+':\n')
+  if (len(class_bindings.entries) == 0):
+    emitter.write('  pass\n')
+  #write overload disambiguators
+  for ol_entries in class_bindings.overloads.values():
+    write_overload_py_wrapper(emitter, ol_entries, pointer_entry)
+    emitter.write('\n')
+  #write normal functions
+  for entry in class_bindings.entries:
+    write_py_function_wrapper(emitter, entry)
+    emitter.write('\n')
+  emitter.write('\n')
+
+def write_overload_py_wrapper(emitter, entries, pointer_entry):
+  '''writes Python function to disambiguate between overloaded functions'''
+  is_constructor = (entries[0].kind=='constructor')
+  emitter.write('  def '+entries[0].name+'(self, *args):\n')
   function_index = 1
   if is_constructor:
-    output_string += '    if(check_function_signature([(1,ctypes.c_void_p)],'
-    output_string += '*args)):\n'
-    output_string += '      self.wrapped_pointer_ = drawpico_bindings.'
-    output_string += (hierarchy_name+'__init__(args[0])\n')
-    output_string += '      return\n'
-    output_string += '    if(check_function_signature([(1,'+parent_name+')],'
-    output_string += '*args)):\n'
-    output_string += '      self.wrapped_pointer_ = drawpico_bindings.'
-    output_string += (hierarchy_name+'__init__(args[0].wrapped_pointer_)\n')
-    output_string += '      return\n'
+    emitter.write('    if(check_function_signature([(1,ctypes.c_void_p)],',
+        '*args)):\n',
+        '      self.wrapped_pointer_ = drawpico_bindings.',
+        pointer_entry.c_name+'(args[0])\n',
+        '      return\n',
+        '    if(check_function_signature([(1,',
+        pointer_entry.scope.rpartition('::')[2]+')],',
+        '*args)):\n',
+        '      self.wrapped_pointer_ = drawpico_bindings.',
+        pointer_entry.c_name+'(args[0].wrapped_pointer_)\n',
+        '      return\n')
     function_index += 1
-  for function_token in function_tokens:
-    output_string += '    if(check_function_signature(['
+  for entry in entries:
+    emitter.write('    if(check_function_signature([')
     first_arg = True
-    for arg in function_token.args:
+    for arg in entry.args:
       if first_arg:
         first_arg = False
       else:
-        output_string += ','
-      output_string += '('
-      if (arg.default.token_type != TokenType.cpp_expression):
-        output_string += '1,'
+        emitter.write(',')
+      emitter.write('(')
+      if (arg.default == None):
+        emitter.write('1,')
       else:
-        output_string += '0,'
-      output_string += get_py_type(arg.variable_type)
-      output_string += ')'
-    output_string += '],*args)):\n'
-    output_string += ('      return self.'+function_token.name)
-    output_string += (str(function_index)+'(*args)\n')
+        emitter.write('0,')
+      emitter.write(arg.py_type, ')')
+    emitter.write('],*args)):\n',
+        '      return self.'+entry.name,
+        str(function_index)+'(*args)\n')
     function_index += 1
-  output_string += '    raise AttributeError(\'Invalid arguments\')\n'
-  return output_string
-
-def write_py_function_wrapper(function_token, parent_hierarchy, 
-    duplicate_number):
-  '''returns Python function wrapper string to write to C wrapper file'''
-  is_constructor = (function_token.name=='__init__')
-  is_destructor = (function_token.name=='__del__')
-  parent_class_name = ''
-  hierarchy_name = ''
-  if len(parent_hierarchy)>0:
-    if (parent_hierarchy[-1][1]=='class'):
-      for hierarch in parent_hierarchy[:-1]:
-        parent_class_name = parent_hierarchy[-1][0]
-    for hierarch in parent_hierarchy:
-      hierarchy_name += hierarch[0]
-  #write things that don't depend on arguments
-  declare_string = ''
-  casting_string = ''
-  return_string = ''
-  return_string_end = '\n'
-  declare_string = '  def '+clean_operators(function_token.name)
-  function_name_idx = ''
-  if (duplicate_number>0):
-    declare_string += str(duplicate_number)
-  if (duplicate_number>1):
-    function_name_idx = str(duplicate_number)
-  declare_string += '('
-  is_char_p = False
+  emitter.write('    raise AttributeError(\'Invalid arguments\')\n')
+
+def write_py_function_wrapper(emitter, entry):
+  '''writes Python function wrapper for entry to emitter'''
+  is_constructor = (entry.kind=='constructor')
+  result = entry.result
+  #the wrapper is built as lists of strings for the declaration, argument 
+  #casting, the call, and the statements after the call, written in order
+  declare_strings = ['  def '+entry.name]
+  casting_strings = []
+  return_strings = []
+  if (entry.overload_index>0):
+    declare_strings.append(str(entry.overload_index))
+  declare_strings.append('(self')
   #handle casting of result
-  if (function_token.function_type.base_type == 'std::vector' or
-    function_token.function_type.base_type == 'std::set'):
-    drawpico_wrap_begin = ''
-    drawpico_wrap_end = ''
-    if (function_token.function_type.templates[0].base_type in drawpico_types):
-      drawpico_wrap_begin = function_token.function_type.templates[0].base_type
-      drawpico_wrap_begin += '('
-      drawpico_wrap_end = ')'
-    return_string = '    return_vec = drawpico_bindings.'
-    return_string += (hierarchy_name+clean_operators(function_token.name))
-    return_string += (function_name_idx+'(')
-    cleaned_type = clean_cpp_type(get_cpp_type(
-        function_token.function_type.templates[0]))
-    return_string_end = '    return return_list\n'
-    return_string_end = ('    drawpico_bindings.StdVector'+cleaned_type
-        +'Delete(return_vec)\n'+return_string_end)
-    return_string_end = ('      return_list.append'
-        +'('+drawpico_wrap_begin+'drawpico_bindings.StdVector'+cleaned_type
-        +'At(i)'+drawpico_wrap_end+')\n'
-        +return_string_end)
-    return_string_end = ('    for i in range(drawpico_bindings.StdVector'
-        +cleaned_type+'Len(return_vec))\n'+return_string_end)
-    return_string_end = '    return_list = []\n'+return_string_end
-    return_string_end = ')\n'+return_string_end
+  drawpico_wrap_begin = ''
+  drawpico_wrap_end = ''
+  if (result.wrapper_class != '' and not is_constructor):
+    drawpico_wrap_begin = result.wrapper_class+'('
+    drawpico_wrap_end = ')'
+  if (result.marshal == 'vector' or result.marshal == 'set'):
+    return_strings += ['    return_vec = drawpico_bindings.',
+        entry.c_name+'(']
+    cleaned_type = clean_cpp_type(result.cpp_type)
+    return_end_strings = [')\n',
+        '    return_list = []\n',
+        '    for i in range(drawpico_bindings.StdVector'+cleaned_type
+        +'Len(return_vec)):\n',
+        '      return_list.append('+drawpico_wrap_begin
+        +'drawpico_bindings.StdVector'+cleaned_type+'At(return_vec, i)'
+        +drawpico_wrap_end+')\n',
+        '    drawpico_bindings.StdVector'+cleaned_type+'Delete(return_vec)\n',
+        '    return return_list\n']
   else:
-    return_string = '    '
-    drawpico_wrap_begin = ''
-    drawpico_wrap_end = ''
-    if (function_token.function_type.base_type in drawpico_types):
-      drawpico_wrap_begin = function_token.function_type.base_type
-      drawpico_wrap_begin += '('
-      drawpico_wrap_end = ')'
     if is_constructor:
-      return_string = '    self.wrapped_pointer_ = '
-    elif (function_token.function_type.base_type != 'void'):
-      return_string = '    return '
-    return_string += (drawpico_wrap_begin+'drawpico_bindings.')
-    return_string += (hierarchy_name+function_token.name+function_name_idx+'(')
-    return_string_end = ')'+drawpico_wrap_end+'\n'
+      return_strings.append('    self.wrapped_pointer_ = ')
+    elif (result.marshal != 'void'):
+      return_strings.append('    return ')
+    else:
+      return_strings.append('    ')
+    return_strings += [drawpico_wrap_begin+'drawpico_bindings.',
+        entry.c_name+'(']
+    return_end_strings = [')'+drawpico_wrap_end+'\n']
   first_arg = True
-  if parent_class_name != '':
-    declare_string += 'self'
-    return_string += 'self.wrapped_pointer_'
+  if (entry.kind in ('method','destructor')):
+    return_strings.append('self.wrapped_pointer_')
     first_arg = False
   #now do argument processing
-  for arg in function_token.args:
+  for arg in entry.args:
+    declare_strings.append(', ')
     if first_arg:
       first_arg = False
     else:
-      declare_string += ', '
-      return_string += ', '
-    declare_string += arg.name
-    arg_type = arg.variable_type
-    if arg.default.token_type == TokenType.cpp_expression:
-      declare_string += expression_to_python(arg.default)
+      return_strings.append(', ')
+    declare_strings.append(arg.name)
+    if (arg.default != None):
+      declare_strings.append('='+arg.default)
     #handle casting 
-    if (arg_type.base_type=='std::set' or arg_type.base_type=='std::vector'):
-      template_type = arg_type.templates[0]
+    if (arg.marshal == 'vector' or arg.marshal == 'set'):
       unwrapped_str = ''
-      if (template_type.base_type in drawpico_types):
+      if (arg.wrapper_class != ''):
         unwrapped_str = '_unwrapped_'
-        casting_string += ('    '+arg.name+'_unwrapped_ = [i.wrapped_pointer_') 
-        casting_string += ('for i in '+arg.name+']\n') 
-      casting_string += ('    '+arg.name+'_casted_ = (')
-      casting_string += (get_pyc_type(template_type)+' * len('+arg.name+'))(*')
-      casting_string += (arg.name+unwrapped_str+')\n')
-      return_string += (arg.name+'_casted_, len('+arg.name+')')
-    elif (arg_type.base_type in drawpico_types):
-      casting_string += ('    '+arg.name+'_casted_ = '+arg_type.base_type)
-      casting_string += ('('+arg.name+')\n')
-      return_string += (arg.name+'_casted_')
+        casting_strings += ['    '+arg.name+'_unwrapped_ = [i.wrapped_pointer_',
+            ' for i in '+arg.name+']\n']
+      casting_strings += ['    '+arg.name+'_casted_ = (',
+          arg.element_pyc_type+' * len('+arg.name+'))(*',
+          arg.name+unwrapped_str+')\n']
+      return_strings.append(arg.name+'_casted_, len('+arg.name+')')
+    elif (arg.wrapper_class != ''):
+      return_strings.append(arg.name+'.wrapped_pointer_')
     else: #no casting string needed
-      return_string += arg.name
-  declare_string += ')\n'
-  return (declare_string+casting_string+return_string+return_string_end)
-
-def write_c_function_wrapper(function_token, vector_type_wrappers=set(),
-    parent_hierarchy=[], used_function_names=set()):
-  '''returns C++ function wrapper string to write to C wrapper file'''
-  is_constructor = (function_token.name=='__init__')
-  is_destructor = (function_token.name=='__del__')
-  #get parent class name and hierarchy name, if relevant
-  parent_class_name = ''
-  parent_class_name_short = ''
-  hierarchy_name = ''
-  function_name = ''
-  if len(parent_hierarchy)>0:
-    if (parent_hierarchy[-1][1]=='class'):
-      for hierarch in parent_hierarchy[:-1]:
-        parent_class_name += (hierarch[0]+'::')
-      parent_class_name += parent_hierarchy[-1][0]
-      parent_class_name_short = parent_hierarchy[-1][0]
-    for hierarch in parent_hierarchy[:-1]:
-      hierarchy_name += hierarch[0]
-  #write things that don't depend on arguments
-  declare_string = '  '
-  casting_string = ''
-  return_string = ''
-  return_string_end = '  }\n'
-  c_type = get_c_type(function_token.function_type)
-  if (function_token.function_type.base_type == 'std::string'):
-    return_string = '    return ('
-    return_string_end = ').c_str();\n'+return_string_end
-    declare_string += (c_type+' ')
-  elif (function_token.function_type.base_type == 'std::vector'):
-    declare_string += 'void* '
-    template_type = get_cpp_type(function_token.function_type.templates[0])
-    template_type = template_type.replace('const ','')
-    return_string = '    return static_cast<void*>('
-    return_string += ' new(std::nothrow) std::vector<'
-    return_string += (template_type+'>(')
-    return_string_end = '));\n'+return_string_end
-    vector_type_wrappers.add(function_token.function_type.templates[0])
-  elif (function_token.function_type.base_type == 'std::set'):
-    declare_string += 'void* '
-    template_type = get_cpp_type(function_token.function_type.templates[0])
-    template_type = template_type.replace('const ','')
-    return_string = '    std::set<'+template_type+'> return_set = '
-    return_string_end = ('    return static_cast<void*>(return_vec);\n'
-        +return_string_end)
-    return_string_end = ('    std::copy(return_set.begin(), return_set.end(),' 
-        +'std::back_inserter(*return_vec));\n'+return_string_end)
-    return_string_end = ('    return_vec->reserve(return_set.size());'
-        +return_string_end)
-    return_string_end = ('    std::vector<'+template_type
-        +'>* return_vec = new(std::nothrow) std::vector<'+template_type+'>;\n'
-        +return_string_end)
-    return_string_end = ';\n'+return_string_end
-    vector_type_wrappers.add(function_token.function_type.templates[0])
-  elif (function_token.function_type.base_type != 'void'):
-    declare_string += (c_type+' ')
-    return_string = '    return static_cast<'
-    return_string += c_type
-    return_string += '>('
-    return_string_end = ');\n'+return_string_end
+      return_strings.append(arg.name)
+  declare_strings.append('):\n')
+  emitter.write(*declare_strings)
+  emitter.write(*casting_strings)
+  emitter.write(*return_strings)
+  emitter.write(*return_end_strings)
+
+def write_c_function_wrapper(emitter, entry):
+  '''writes C++ function wrapper for entry to emitter'''
+  if (entry.kind == 'pointer_constructor'):
+    emitter.write('  void* ',
+        entry.c_name+'(void * ptr) {\n',
+        '    return static_cast<void*>(new(std::nothrow) ',
+        entry.scope+'(*static_cast<'+entry.scope+'*>(ptr)));\n',
+        '  }\n')
+    return
+  result = entry.result
+  #the wrapper is built as lists of strings for the declaration, argument 
+  #casting, the call, and the statements closing the call, written in order
+  declare_strings = ['  ']
+  casting_strings = []
+  return_strings = []
+  result_end_strings = [] #statements after the call, depend on return type
+  if (entry.kind == 'constructor'):
+    declare_strings.append('void* ')
+    return_strings.append('    return static_cast<void*>(')
+    result_end_strings.append(');\n')
+  elif (result.marshal == 'string'):
+    return_strings.append('    return (')
+    result_end_strings.append(').c_str();\n')
+    declare_strings.append(result.c_type+' ')
+  elif (result.marshal == 'vector'):
+    declare_strings.append('void* ')
+    template_type = result.cpp_type.replace('const ','')
+    return_strings += ['    return static_cast<void*>(',
+        ' new(std::nothrow) std::vector<', template_type+'>(']
+    result_end_strings.append('));\n')
+  elif (result.marshal == 'set'):
+    declare_strings.append('void* ')
+    template_type = result.cpp_type.replace('const ','')
+    return_strings.append('    std::set<'+template_type+'> return_set = ')
+    result_end_strings += [';\n',
+        '    std::vector<'+template_type+'>* return_vec = '
+        +'new(std::nothrow) std::vector<'+template_type+'>;\n',
+        '    return_vec->reserve(return_set.size());\n',
+        '    std::copy(return_set.begin(), return_set.end(),' 
+        +'std::back_inserter(*return_vec));\n',
+        '    return static_cast<void*>(return_vec);\n']
+  elif (result.marshal == 'pointer'):
+    #C pointers are not const
+    declare_strings.append(result.c_type+' ')
+    if (result.c_type == 'void*'):
+      return_strings.append('    return const_cast<void*>(static_cast<'
+          +'const void*>(')
+      result_end_strings.append('));\n')
+    else:
+      return_strings.append('    return const_cast<'+result.c_type+'>(')
+      result_end_strings.append(');\n')
+  elif (result.marshal == 'object'):
+    #copied, since it may be a temporary
+    declare_strings.append(result.c_type+' ')
+    return_strings += ['    return static_cast<void*>(',
+        'new(std::nothrow) auto(']
+    result_end_strings.append('));\n')
+  elif (result.marshal != 'void'):
+    declare_strings.append(result.c_type+' ')
+    return_strings.append('    return static_cast<'+result.c_type+'>(')
+    result_end_strings.append(');\n')
   else:
-    declare_string += (c_type+' ')
-    return_string_end = ';\n'+return_string_end
-  if is_constructor:
-    return_string += 'new(std::nothrow) '
-    return_string += parent_class_name
-    return_string += '('
-    return_string_end = ')'+return_string_end
-    function_name = hierarchy_name+parent_class_name_short+'__init__'
-  elif is_destructor:
-    return_string = '    delete static_cast<'
-    return_string += parent_class_name
-    return_string += '*>(self);\n'
-    return_string_end = ''
-    function_name = hierarchy_name+parent_class_name_short+'__del__'
+    declare_strings.append(result.c_type+' ')
+    result_end_strings.append(';\n')
+  return_end_strings = [')']+result_end_strings+['  }\n']
+  if (entry.kind == 'constructor'):
+    return_strings.append('new(std::nothrow) '+entry.scope+'(')
+  elif (entry.kind == 'destructor'):
+    return_strings = ['    delete static_cast<'+entry.scope+'*>(self);\n']
+    return_end_strings = ['  }\n']
+  elif (entry.kind == 'method'):
+    return_strings.append('static_cast<'+entry.scope+'*>(self)->'
+        +get_cpp_function_name(entry)+'(')
   else:
-    if parent_class_name_short != '':
-      return_string += 'static_cast<'
-      return_string += parent_class_name
-      return_string += '>(self)->'
-      return_string += function_token.name
-      return_string += '('
-      return_string_end = ')'+return_string_end
-      function_name = (hierarchy_name+parent_class_name_short
-          +clean_operators(function_token.name))
-    else:
-      return_string += (function_token.name+'(')
-      return_string_end = ')'+return_string_end
-      function_name = (hierarchy_name+clean_operators(function_token.name))
-  #avoid duplicate function names
-  next_number = 1
-  temp_function_name = function_name
-  while temp_function_name in used_function_names:
-    next_number += 1
-    temp_function_name = function_name+str(next_number)
-  function_name = temp_function_name
-  used_function_names.add(function_name)
-  #
-  declare_string += function_name
-  declare_string += '('
+    return_strings.append(get_cpp_function_name(entry)+'(')
+  declare_strings += [entry.c_name, '(']
   first_arg = True
   first_return_arg = True
-  if parent_class_name_short != '':
-    if not is_constructor:
-      declare_string += 'void* self'
-      first_arg = False
+  if (entry.kind in ('method','destructor')):
+    declare_strings.append('void* self')
+    first_arg = False
   #now do argument processing
-  for arg in function_token.args:
+  for arg in entry.args:
     if first_arg:
       first_arg = False
     else:
-      declare_string += ', '
+      declare_strings.append(', ')
     if first_return_arg:
       first_return_arg = False
     else:
-      return_string += ', '
-    arg_c_type = get_c_type(arg.variable_type)
-    declare_string += (arg_c_type + ' ' + arg.name)
-    arg_type = arg.variable_type
-    if (arg_type.base_type=='std::set' or arg_type.base_type=='std::vector'):
-      declare_string += (', int ' + arg.name + '_len')
-      template_cpp_type = get_cpp_type(arg_type.templates[0])
-      vecset_type = 'vector'
+      return_strings.append(', ')
+    declare_strings.append(arg.c_type + ' ' + arg.name)
+    if (arg.marshal == 'vector' or arg.marshal == 'set'):
+      declare_strings.append(', int ' + arg.name + '_len')
       vecset_add = 'push_back'
-      if (arg_type.base_type=='std::set'):
-        vecset_type = 'set'
+      if (arg.marshal == 'set'):
         vecset_add = 'insert'
-      casting_string += ('    std::'+vecset_type+'<')
-      casting_string += (template_cpp_type+'> '+arg.name+'_'+vecset_type+';\n')
-      casting_string += ('    for (int i_=0; i_<'+arg.name+'_len; i_++) {\n')
-      casting_string += ('      '+arg.name+'_'+vecset_type+'.'+vecset_add+'(')
-      casting_string += (template_cpp_type+'(static_cast<'+template_cpp_type)
-      casting_string += ('*>('+arg.name+')[i_]));\n')
-      casting_string += ('    }\n')
-      return_string += (arg.name+'_'+vecset_type)
-    else: #no casting string needed
-      if arg_type.base_type in wrapper_c_types:
-        return_string += arg.name
+      #elements are passed as an array of their C type, or of void*
+      element_c_type = 'void*'
+      if (arg.c_type != 'void*'):
+        element_c_type = arg.c_type[:-1]
+      element = ('static_cast<'+element_c_type+'*>('+arg.name+')[i_]')
+      if (element_c_type == 'void*'):
+        element = '*static_cast<'+arg.cpp_type+'*>('+element+')'
       else:
-        return_string += 'static_cast<'
-        return_string += get_cpp_type(arg_type).replace('const ','')
-        return_string += ('>('+arg.name+')')
-  declare_string += ') {\n'
-  return (declare_string+casting_string+return_string+return_string_end)
-
-def write_c_pointer_constructor(parent_hierarchy=[], used_function_names=set()):
-  #get parent class name and hierarchy name, if relevant
-  parent_class_name = ''
-  parent_class_name_short = ''
-  hierarchy_name = ''
-  function_name = ''
-  if len(parent_hierarchy)>0:
-    if (parent_hierarchy[-1][1]=='class'):
-      for hierarch in parent_hierarchy[:-1]:
-        parent_class_name += (hierarch[0]+'::')
-      parent_class_name += parent_hierarchy[-1][0]
-      parent_class_name_short = parent_hierarchy[-1][0]
-    for hierarch in parent_hierarchy[:-1]:
-      hierarchy_name += hierarch[0]
-  #
-  function_name = hierarchy_name+parent_class_name_short+'__init__'
-  next_number = 1
-  temp_function_name = function_name
-  while temp_function_name in used_function_names:
-    next_number += 1
-    temp_function_name = function_name+str(next_number)
-  function_name = temp_function_name
-  used_function_names.add(function_name)
-  #
-  output_string = '  void* '
-  output_string += (function_name+'(void * ptr) {\n')
-  output_string += ('    return static_cast<void*>(new(std::nothrow) ')
-  output_string += (parent_class_name+'(*ptr));\n')
-  output_string += '  }\n'
-  return output_string
+        element = 'static_cast<'+arg.cpp_type+'>('+element+')'
+      casting_strings += ['    std::'+arg.marshal+'<',
+          arg.cpp_type+'> '+arg.name+'_'+arg.marshal+';\n',
+          '    for (int i_=0; i_<'+arg.name+'_len; i_++) {\n',
+          '      '+arg.name+'_'+arg.marshal+'.'+vecset_add+'(',
+          element+');\n',
+          '    }\n']
+      return_strings.append(arg.name+'_'+arg.marshal)
+    elif (arg.marshal == 'value'):
+      return_strings.append(arg.name)
+    elif (arg.marshal == 'object'):
+      return_strings.append('*static_cast<'+arg.cpp_type+'*>('+arg.name+')')
+    else:
+      return_strings.append('static_cast<'+arg.cpp_type+'>('+arg.name+')')
+  declare_strings.append(') {\n')
+  emitter.write(*declare_strings)
+  emitter.write(*casting_strings)
+  emitter.write(*return_strings)
+  emitter.write(*return_end_strings)
 
 def clean_cpp_type(string):
-  return (string.replace('< ','').replace('> ','').replace(' ','')
-      .replace('*','Ptr'))
-
-def write_vector_type_wrappers(vector_type_wrappers):
-  '''write C wrapper for vectors'''
-  output_string = ''
-  for type_token in vector_type_wrappers:
-    c_type = get_c_type(type_token)
-    cpp_type = get_cpp_type(type_token)
+  '''returns C++ type string as part of an identifier'''
+  return re.sub(r'\W', '', string.replace('*','Ptr'))
+
+def get_vector_wrapper_types(vector_type_wrappers):
+  '''Returns list of (C++ type, type token) in dict vector_type_wrappers of
+  C++ type to type token, ordered by C++ type so output does not depend on 
+  the order functions were lowered in'''
+  return [(cpp_type, vector_type_wrappers[cpp_type]) 
+      for cpp_type in sorted(vector_type_wrappers)]
+
+def get_vector_wrapper_names(vector_types):
+  '''Returns names of the functions written by write_vector_type_wrappers'''
+  return ['StdVector'+clean_cpp_type(cpp_type)+suffix
+      for (cpp_type, c_type) in vector_types
+      for suffix in ('At','Len','Delete')]
+
+def write_vector_type_wrappers(emitter, vector_types):
+  '''write C wrapper for vectors of the (C++ type, C type) element types 
+  vector_types'''
+  for (cpp_type, c_type) in vector_types:
     #at function
-    output_string += '  '+c_type+' StdVector'
-    output_string += clean_cpp_type(cpp_type)
-    output_string += 'At(void* vec_ptr, unsigned int pos) {\n'
-    output_string += ('    return static_cast<'+c_type+'>(')
+    emitter.write('  '+c_type+' StdVector',
+        clean_cpp_type(cpp_type),
+        'At(void* vec_ptr, unsigned int pos) {\n',
+        '    return static_cast<'+c_type+'>(')
     if (c_type == 'void*'):
-      output_string += '&('
-    output_string += ('static_cast<std::vector<'+cpp_type+'>*>(vec_ptr)->at(pos)')
+      emitter.write('&(')
+    emitter.write('static_cast<std::vector<'+cpp_type+'>*>(vec_ptr)->at(pos)')
     if (c_type == 'void*'):
-      output_string += ')'
-    output_string += ');\n  }\n\n'
+      emitter.write(')')
+    elif (cpp_type == 'std::string'):
+      emitter.write('.c_str()')
+    emitter.write(');\n  }\n\n')
     #len function
-    output_string += '  unsigned int StdVector'
-    output_string += clean_cpp_type(cpp_type)
-    output_string += 'Len(void* vec_ptr) {\n'
-    output_string += ('    return (')
-    output_string += ('static_cast<std::vector<'+cpp_type+'>*>(vec_ptr)->size()')
-    output_string += ');\n  }\n\n'
+    emitter.write('  unsigned int StdVector',
+        clean_cpp_type(cpp_type),
+        'Len(void* vec_ptr) {\n',
+        '    return (',
+        'static_cast<std::vector<'+cpp_type+'>*>(vec_ptr)->size()',
+        ');\n  }\n\n')
     #delete function
-    output_string += '  void StdVector'
-    output_string += clean_cpp_type(cpp_type)
-    output_string += 'Delete(void* vec_ptr) {\n'
-    output_string += ('    delete (')
-    output_string += ('static_cast<std::vector<'+cpp_type+'>*>(vec_ptr)')
-    output_string += ');\n  }\n\n'
-  return output_string
-
-def output_cpp_file_header():
-  ret_string = ''
-  ret_string += '#include <algorithm>\n'
-  ret_string += '#include <map>\n'
-  ret_string += '#include <memory>\n'
-  ret_string += '#include <new>\n'
-  ret_string += '#include <set>\n'
-  ret_string += '#include <unordered_map>\n'
-  ret_string += '#include <vector>\n\n'
-  ret_string += '#include "TError.h"\n\n'
-  ret_string += '#include "core/axis.hpp"\n'
-  ret_string += '#include "core/named_func.hpp"\n\n'
-  ret_string += 'extern "C"\n{\n'
-  ret_string += '  void SuppressRootWarnings() {\n'
-  ret_string += '    gErrorIgnoreLevel = 6000;\n'
-  ret_string += '  }\n\n'
-  return ret_string
-
-def output_cpp_file_tailer():
-  return '}'
-
-def output_py_file_header():
-  ret_string = ''
-  ret_string += '#ctypes drawpico bindings\n'
-  ret_string += '#import ROOT #causes strange errors\n'
-  ret_string += 'import ctypes\n\n'
-  ret_string += 'drawpico_bindings = ctypes.cdll.LoadLibrary('
-  ret_string += '\'libDrawPicoC.so\')\n'
-  ret_string += 'drawpico_bindings.SuppressRootWarnings()\n\n'
-  ret_string += 'def check_function_signature(arg_signature, *args):\n'
-  ret_string += '  \'\'\'returns true if *args can match arg_signature\'\'\'\n'
-  ret_string += '  for arg_idx in range(len(arg_signature)):\n'
-  ret_string += '    if arg_idx > len(args):\n'
-  ret_string += '      if arg_signature[arg_idx][0]==0: #optional\n'
-  ret_string += '        continue\n'
-  ret_string += '    if (arg_signature[arg_idx][1]==None):\n'
-  ret_string += '      continue\n'
-  ret_string += '    if (arg_signature[arg_idx][1]==int):\n'
-  ret_string += '      if (type(args[arg_idx])==int\n'
-  ret_string += '          or type(args[arg_idx])==float):\n'
-  ret_string += '        continue\n'
-  ret_string += '      else:\n'
-  ret_string += '        return False\n'
-  ret_string += '    elif (arg_signature[arg_idx][1]==float):\n'
-  ret_string += '      if (type(args[arg_idx])==int\n'
-  ret_string += '          or type(args[arg_idx])==float):\n'
-  ret_string += '        continue\n'
-  ret_string += '      else:\n'
-  ret_string += '        return False\n'
-  ret_string += '    else:\n'
-  ret_string += '      if (type(args[arg_idx])==arg_signature[arg_idx][1]):\n'
-  ret_string += '        continue\n'
-  ret_string += '      else:\n'
-  ret_string += '        return False\n'
-  ret_string += '  return True\n\n'
-  return ret_string
+    emitter.write('  void StdVector',
+        clean_cpp_type(cpp_type),
+        'Delete(void* vec_ptr) {\n',
+        '    delete (',
+        'static_cast<std::vector<'+cpp_type+'>*>(vec_ptr)',
+        ');\n  }\n\n')
+
+def output_cpp_includes(emitter):
+  '''writes includes needed by the C wrappers'''
+  emitter.write('#include <algorithm>\n',
+      '#include <iterator>\n',
+      '#include <map>\n',
+      '#include <memory>\n',
+      '#include <new>\n',
+      '#include <set>\n',
+      '#include <string>\n',
+      '#include <unordered_map>\n',
+      '#include <vector>\n\n',
+      '#include "TError.h"\n\n',
+      '#include "core/axis.hpp"\n',
+      '#include "core/named_func.hpp"\n\n')
+
+def output_pch_header(emitter):
+  '''writes header with the includes of the C wrappers, to be compiled once
+  into a precompiled header. Has no include guard, which g++ warns about in
+  a header compiled on its own, since it is included once per file'''
+  output_cpp_includes(emitter)
+
+def output_cpp_file_header(emitter, define_common=True, pch_filename=None):
+  '''writes includes and opens extern "C" block. If pch_filename is given, 
+  only that header is included, see output_pch_header. If define_common, 
+  also writes functions that must be defined in only one file of the 
+  library'''
+  if (pch_filename != None):
+    emitter.write('#include "'+pch_filename+'"\n\n')
+  else:
+    output_cpp_includes(emitter)
+  emitter.write('extern "C"\n{\n')
+  if define_common:
+    emitter.write('  void SuppressRootWarnings() {\n',
+        '    gErrorIgnoreLevel = 6000;\n',
+        '  }\n\n')
+
+def output_cpp_file_tailer(emitter):
+  emitter.write('}')
+
+def output_py_file_header(emitter):
+  emitter.write('#ctypes drawpico bindings\n',
+      '#import ROOT #causes strange errors\n',
+      'import ctypes\n\n',
+      'drawpico_bindings = ctypes.cdll.LoadLibrary(',
+      '\'libDrawPicoC.so\')\n',
+      'drawpico_bindings.SuppressRootWarnings()\n\n',
+      'def check_function_signature(arg_signature, *args):\n',
+      '  \'\'\'returns true if *args can match arg_signature\'\'\'\n',
+      '  for arg_idx in range(len(arg_signature)):\n',
+      '    if arg_idx >= len(args):\n',
+      '      if arg_signature[arg_idx][0]==0: #optional\n',
+      '        continue\n',
+      '      return False\n',
+      '    if (arg_signature[arg_idx][1]==None):\n',
+      '      continue\n',
+      '    if (arg_signature[arg_idx][1]==int):\n',
+      '      if (type(args[arg_idx])==int\n',
+      '          or type(args[arg_idx])==float):\n',
+      '        continue\n',
+      '      else:\n',
+      '        return False\n',
+      '    elif (arg_signature[arg_idx][1]==float):\n',
+      '      if (type(args[arg_idx])==int\n',
+      '          or type(args[arg_idx])==float):\n',
+      '        continue\n',
+      '      else:\n',
+      '        return False\n',
+      '    else:\n',
+      '      if (type(args[arg_idx])==arg_signature[arg_idx][1]):\n',
+      '        continue\n',
+      '      else:\n',
+      '        return False\n',
+      '  return True\n\n')
 
 if __name__ == '__main__':
-  #file_tokens = tokenize_file('inc/core/plot_opt.hpp')
-  #parser = Parser(file_tokens)
-  #tree = parser.eval()
-  #traverse_token(tree)
-  #vector_wrap_types = set()
-  #cpp_output_file = open('example_drawpicoc.cxx','w')
-  #cpp_output_file.write(output_cpp_file_header())
-  #cpp_output_file.write(write_c_wrappers(tree,vector_wrap_types))
-  #cpp_output_file.write(write_vector_type_wrappers(vector_wrap_types))
-  #cpp_output_file.write(output_cpp_file_tailer())
-  #cpp_output_file.close()
-  #py_output_file = open('example___init__.py','w')
-  #py_output_file.write(output_py_file_header())
-  #py_output_file.write(write_py_wrappers(tree))
-  #py_output_file.close()
-  print(tokenize_file_cpp('inc/core/plot_opt.hpp'))
-
-  
+  argument_parser = argparse.ArgumentParser(description=
+      'Generates C++ wrappers and ctypes bindings for C++ headers')
+  argument_parser.add_argument('headers', nargs='+', help='headers to wrap')
+  argument_parser.add_argument('--cpp', default='drawpicoc.cxx',
+      help='C++ wrapper file')
+  argument_parser.add_argument('--py', default='__init__.py',
+      help='Python bindings file')
+  argument_parser.add_argument('--shards', type=int, default=1,
+      help='number of C++ wrapper files')
+  argument_parser.add_argument('--shard-by', choices=('class','size'),
+      default='class', help='how wrappers are assigned to C++ files')
+  argument_parser.add_argument('--manifest', default=None,
+      help='JSON file recording digests of the generated files')
+  argument_parser.add_argument('--depfiles', action='store_true',
+      help='write a .d depfile next to each generated file')
+  argument_parser.add_argument('--stamp', default=None,
+      help='file touched on every run, for make rules')
+  argument_parser.add_argument('--pch', action='store_true',
+      help='write includes to a header to be precompiled, see README.md')
+  argument_parser.add_argument('--compile-commands', default=None,
+      help='JSON file of commands compiling the C++ files')
+  argument_parser.add_argument('--compile', action='store_true',
+      help='run the compile commands')
+  argument_parser.add_argument('--cxx', default='g++', help='C++ compiler')
+  argument_parser.add_argument('--cxxflags', 
+      default='-O2 -fPIC -std=c++17', help='C++ compiler flags, including '
+      'include directories of ROOT and DrawPico')
+  argument_parser.add_argument('--version-script', default=None,
+      help='linker version script exporting only the wrapper functions')
+  argument_parser.add_argument('--library', default='libDrawPicoC.so',
+      help='shared library linked by --compile')
+  argument_parser.add_argument('--ldflags', default='', help='linker flags, '
+      'including ROOT and DrawPico libraries')
+  argument_parser.add_argument('--ir', default=None,
+      help='file the serialized binding IR is saved to')
+  argument_parser.add_argument('--roots', default=None,
+      help='comma-separated classes, only classes reachable from them '
+      'through public signatures are wrapped')
+  argument_parser.add_argument('--shake-report', default=None,
+      help='file listing the classes kept and pruned by --roots')
+  argument_parser.add_argument('--jobs', type=int, default=1,
+      help='number of processes parsing headers or compiling')
+  args = argument_parser.parse_args()
+  tree = gb_parallel.parse_files(args.headers, args.jobs,
+      std_types+otherlib_types+drawpico_types)
+  header_filenames = None
+  if args.depfiles:
+    header_filenames = args.headers
+  root_classes = None
+  if (args.roots != None):
+    root_classes = args.roots.split(',')
+  (statistics, changed_files) = write_binding_files(tree, args.cpp, args.py,
+      args.shards, args.shard_by, args.manifest, header_filenames,
+      args.stamp, args.pch, args.version_script, args.ir, root_classes,
+      args.shake_report)
+  debug(statistics.report())
+  debug('changed files: '+' '.join(changed_files))
+  if (args.compile_commands != None or args.compile):
+    pch_filename = None
+    if args.pch:
+      pch_filename = get_pch_filename(args.cpp)
+    cpp_filenames = get_cpp_filenames(args.cpp, args.shards)
+    commands = gb_build.get_compile_commands(cpp_filenames, pch_filename, 
+        args.cxx, args.cxxflags.split())
+    if (args.compile_commands != None):
+      gb_build.write_compile_commands(args.compile_commands, commands)
+    if args.compile:
+      if not gb_build.run_compile_commands(commands, args.jobs):
+        error('compilation failed')
+      elif (gb_build.run_command(gb_build.get_link_command(
+          [gb_build.get_object_filename(cpp_filename) 
+          for cpp_filename in cpp_filenames], args.library, 
+          args.version_script, args.cxx, args.ldflags.split())) != 0):
+        error('linking failed')